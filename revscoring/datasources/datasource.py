@@ -24,8 +24,5 @@ class Datasource(Dependent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def __hash__(self):
-        return hash('datasource.' + self.name)
-
     def __str__(self):
         return "datasource." + self.name
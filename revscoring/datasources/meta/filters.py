@@ -40,6 +40,18 @@ class filter(Datasource):
         else:
             return [item for item in items if not self.include(item)]
 
+    def process_items(self, items):
+        if not self.inverse:
+            return (item for item in items if self.include(item))
+        else:
+            return (item for item in items if not self.include(item))
+
+    def signature(self):
+        include = self._function_signature(self.include)
+        if include is None:
+            return None
+        return ("filter", include, self.inverse)
+
 
 class regex_matching(filter):
     """
@@ -39,6 +39,15 @@ class map(Datasource):
     def process(self, items):
         return [self.apply(item) for item in items]
 
+    def process_items(self, items):
+        return (self.apply(item) for item in items)
+
+    def signature(self):
+        apply = self._function_signature(self.apply)
+        if apply is None:
+            return None
+        return ("map", apply)
+
 
 class lower_case(map):
     """
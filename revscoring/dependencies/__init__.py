@@ -11,11 +11,38 @@ functions
 context
 +++++++
 .. automodule:: revscoring.dependencies.context
+
+plan
+++++
+.. automodule:: revscoring.dependencies.plan
+
+optimizer
++++++++++
+.. automodule:: revscoring.dependencies.optimizer
+
+store
++++++
+.. automodule:: revscoring.dependencies.store
+
+persistent
+++++++++++
+.. automodule:: revscoring.dependencies.persistent
+
+profiler
+++++++++
+.. automodule:: revscoring.dependencies.profiler
 """
 
 from .context import Context
 from .dependent import Dependent, DependentSet
-from .functions import dig, draw, expand, normalize_context, solve
+from .functions import (compile, dig, draw, expand, normalize_context,
+                        solve, solve_batch)
+from .persistent import PersistentCache
+from .plan import Plan, set_trusted
+from .profiler import Profiler
+from .store import ValueStore
 
-__all__ = [solve, expand, dig, draw, normalize_context, Context, Dependent,
-           DependentSet]
+__all__ = [solve, solve_batch, compile, expand, dig, draw, normalize_context,
+           set_trusted,
+           Context, Dependent, DependentSet, PersistentCache, Plan, Profiler,
+           ValueStore]
@@ -1,8 +1,12 @@
 """
 .. autoclass:: Context
     :members:
+
+.. autoclass:: revscoring.dependencies.context.Expansion
 """
-from .functions import dig, draw, expand, normalize_context, solve
+from collections import ChainMap, OrderedDict
+
+from .functions import compile, dig, draw, expand, normalize_context
 
 
 class Context:
@@ -16,10 +20,32 @@ class Context:
         cache : dict
             A cache of computed values to use for every call to
             :func:`revscoring.dependencies.solve`
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of expensive dependents
+            to consult for every call to :func:`revscoring.dependencies.solve`
+        trusted : `bool` | `None`
+            Solve in trusted (production) mode.  See
+            :func:`~revscoring.dependencies.compile`.
+        validation_rate : `float`
+            The proportion of feature values to validate in trusted mode
+    """
+    MAX_PLANS = 100
+    """
+    The number of compiled plans to keep.  The least recently used plan is
+    dropped first.
+    """
+    MAX_EXPANSIONS = 100
+    """
+    The number of expansions to keep.  The least recently used expansion is
+    dropped first.
     """
 
-    def __init__(self, context=None, cache=None):
+    def __init__(self, context=None, cache=None, persistent_cache=None,
+                 trusted=None, validation_rate=0.0):
         self.cache = cache if cache is not None else {}
+        self.persistent_cache = persistent_cache
+        self.trusted = trusted
+        self.validation_rate = validation_rate
 
         # Make sure context is a dict
         if context is None:
@@ -29,15 +55,121 @@ class Context:
         else:  # else leave context alone
             self.context = context
 
-    def solve(self, dependents, context=None, cache=None, profile=None):
+        # Compiled plans for call-context-free calls to solve()
+        self._plans = OrderedDict()
+        # Expansions for call-context-free calls to expansion()
+        self._expansions = OrderedDict()
+
+    def solve(self, dependents, context=None, cache=None, profile=None,
+              executor=None, persistent_cache=None):
         """
         Solves an iterable of dependents within the context.
 
         See :func:`~revscoring.dependencies.solve` for call
         signature.
         """
-        context, cache = self.update_context_and_cache(context, cache)
-        return solve(dependents, context=context, cache=cache, profile=profile)
+        cache = self.update_cache(cache)
+        if hasattr(dependents, '__iter__'):
+            dependents = tuple(dependents)
+            # Nothing to compile if every value has already been solved
+            if profile is None and all(d in cache for d in dependents):
+                return (cache[d] for d in dependents)
+        elif profile is None and dependents in cache:
+            return cache[dependents]
+
+        plan = self._get_plan(dependents, context)
+        return plan.solve(
+            cache=cache, profile=profile, executor=executor,
+            persistent_cache=persistent_cache or self.persistent_cache)
+
+    def solve_batch(self, dependents, caches, context=None, profile=None,
+                    persistent_cache=None):
+        """
+        Solves an iterable of dependents for a batch of caches within the
+        context.
+
+        See :func:`~revscoring.dependencies.solve_batch` for call signature.
+        """
+        if hasattr(dependents, '__iter__'):
+            dependents = tuple(dependents)
+
+        plan = self._get_plan(dependents, context)
+        return plan.solve_batch(
+            [self.update_cache(cache) for cache in caches], profile=profile,
+            persistent_cache=persistent_cache or self.persistent_cache)
+
+    def compile(self, dependents, context=None, optimize=False,
+                release=False, pin=None, trusted=None, validation_rate=None):
+        """
+        Compiles a :class:`~revscoring.dependencies.Plan` for a dependent or
+        an iterable of dependents within the context.
+
+        See :func:`~revscoring.dependencies.compile` for call signature.
+        """
+        context, _ = self.update_context_and_cache(context, None)
+        if trusted is None:
+            trusted = self.trusted
+        if validation_rate is None:
+            validation_rate = self.validation_rate
+        return compile(dependents, context=context, optimize=optimize,
+                       release=release, pin=pin, trusted=trusted,
+                       validation_rate=validation_rate)
+
+    def _get_plan(self, dependents, context):
+        if not context:
+            # No call-specific context.  We can re-use a compiled plan.
+            plan = self._plans.get(dependents)
+            if plan is None:
+                plan = self.compile(dependents)
+                self._plans[dependents] = plan
+                while len(self._plans) > self.MAX_PLANS:
+                    self._plans.popitem(last=False)
+            else:
+                try:
+                    self._plans.move_to_end(dependents)
+                except KeyError:
+                    pass  # Dropped by another thread
+            return plan
+        else:
+            return self.compile(dependents, context=context)
+
+    def expansion(self, dependents, context=None):
+        """
+        Expands an iterable of dependents within the context.  Expansions are
+        re-used for calls without a call-specific context until the context
+        is updated.
+
+        :Parameters:
+            dependents : :class:`revscoring.Dependent` | `iterable`
+                A dependent or collection of dependents to expand
+            context : `dict` | `iterable`
+                A set of call-specific :class:`revscoring.Dependent` to inject
+
+        :Returns:
+            An :class:`~revscoring.dependencies.context.Expansion`
+        """
+        if hasattr(dependents, '__iter__'):
+            dependents = tuple(dependents)
+        else:
+            dependents = (dependents,)
+
+        if not context:
+            expansion = self._expansions.get(dependents)
+            if expansion is None:
+                expansion = Expansion(self.expand(dependents),
+                                      self.dig(dependents))
+                self._expansions[dependents] = expansion
+                while len(self._expansions) > self.MAX_EXPANSIONS:
+                    self._expansions.popitem(last=False)
+            else:
+                try:
+                    self._expansions.move_to_end(dependents)
+                except KeyError:
+                    pass  # Dropped by another thread
+            return expansion
+        else:
+            return Expansion(self.expand(dependents, context=context),
+                             self.dig(dependents, context=context))
 
     def expand(self, dependents, cache=None, context=None):
         """
@@ -71,11 +203,65 @@ class Context:
     def update(self, context=None, cache=None):
         self.context.update(normalize_context(context or {}))
         self.cache.update(cache or {})
+        self._plans = OrderedDict()
+        self._expansions = OrderedDict()
 
     def update_context_and_cache(self, context, cache):
-        local_context = dict(self.context)
-        local_context.update(normalize_context(context or {}))
+        if context:
+            # A read-through overlay.  The context is not copied.
+            local_context = ChainMap(normalize_context(context), self.context)
+        else:
+            local_context = self.context
 
+        return local_context, self.update_cache(cache)
+
+    def update_cache(self, cache):
         local_cache = cache if cache is not None else {}
-        local_cache.update(self.cache)
-        return local_context, local_cache
+        if len(self.cache) == 0:
+            return local_cache
+        else:
+            # A read-through view.  Values in the context's cache take
+            # precedence and new values are written to `local_cache`.
+            return CacheView(self.cache, local_cache)
+
+    def __getstate__(self):
+        # Compiled plans are cheap to rebuild and expensive to ship to worker
+        # processes.
+        state = dict(self.__dict__)
+        state['_plans'] = OrderedDict()
+        state['_expansions'] = OrderedDict()
+        return state
+
+
+class Expansion:
+    """
+    Represents the expanded dependency tree of a list of dependents.
+
+    :Attributes:
+        dependents : `frozenset` ( :class:`revscoring.Dependent` )
+            All of the dependents in the tree
+        roots : `tuple` ( :class:`revscoring.Dependent` )
+            The root dependents of the tree.  See
+            :func:`~revscoring.dependencies.dig`.
+        names : `list` ( `str` )
+            The names of all of the dependents in the tree
+    """
+    __slots__ = ('dependents', 'roots', 'names')
+
+    def __init__(self, dependents, roots):
+        self.dependents = frozenset(dependents)
+        self.roots = tuple(roots)
+        self.names = [str(dependent) for dependent in self.dependents]
+
+
+class CacheView(ChainMap):
+    """
+    Implements a read-through view of layered caches.  Reads check each cache
+    in order and writes go to the last cache.
+    """
+
+    def __setitem__(self, key, value):
+        self.maps[-1][key] = value
+
+    def __delitem__(self, key):
+        del self.maps[-1][key]
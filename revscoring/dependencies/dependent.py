@@ -8,10 +8,17 @@
 """
 import logging
 import pickle
+import threading
+
+from .store import intern_id
 
 logger = logging.getLogger(__name__)
 
 
+DEPENDENT_ATTRIBUTES = {'name', 'process', 'dependencies', 'process_batch',
+                        'version', 'calls', '_hash', '_id'}
+
+
 def not_implemented(*args, **kwargs):
     raise NotImplementedError("Not implemented.")
 
@@ -28,16 +35,57 @@ class Dependent:
         depends_on : `iterable`
             A collection of :class:`revscoring.Dependent` whose values are
             required by `process`
+        process_batch : func
+            An optional function that takes a `list` of argument `tuple` (one
+            per observation) and returns a `list` of values.  Implement this
+            to vectorize processing when solving many observations at once.
+            See :func:`~revscoring.dependencies.solve_batch`.
+        version : `str` | `int`
+            Declares that the value depends only on the dependencies and the
+            version of `process` so that it can be stored in a
+            :class:`~revscoring.dependencies.PersistentCache`.  Change it
+            whenever `process` changes.
+
+    :Attributes:
+        deferred : `tuple` ( `int` )
+            Indexes of dependencies that should not be solved ahead of time.
+            `process` receives a zero-argument callable in their place that
+            solves the dependency when (and only if) it is called.
+        process_items : `func` | `None`
+            Implemented by dependents that process a single `list` of items
+            into a new `list` (e.g. filters and mappers).  Maps an iterator
+            of items to an iterator of items so that chains of such
+            dependents can be fused into a single streaming pass.
+        aggregate_items : `func` | `None`
+            Implemented by dependents that reduce a single `list` of items to
+            a value (e.g. `len`).  Takes an iterator of items.
     """
+    process_batch = None
+    version = None
+    deferred = ()
+    process_items = None
+    aggregate_items = None
 
     def __init__(self, name, process=None, depends_on=None,
-                 dependencies=None):
+                 dependencies=None, process_batch=None, version=None):
         if not isinstance(name, str):
             raise TypeError("Name {0} is not a str.".format(name))
         self.name = name
         self.process = process or not_implemented
         self.dependencies = dependencies or depends_on or []
+        if process_batch is not None:
+            self.process_batch = process_batch
+        if version is not None:
+            self.version = version
         self.calls = 0
+        self._intern()
+
+    def _intern(self):
+        # The hash and interned id are stable for the life of the dependent,
+        # so we only compute them once.
+        key = str(self)
+        self._hash = hash(key)
+        self._id = intern_id(key)
 
     def _format_name(self, name, args, func_name=None):
         if name is None:
@@ -48,13 +96,86 @@ class Dependent:
         return name
 
     def __call__(self, *args, **kwargs):
-        logger.debug("Executing {0} ({1} calls so far)."
-                     .format(self, self.calls))
+        logger.debug("Executing %s (%s calls so far).", self, self.calls)
         self.calls += 1
         return self.process(*args, **kwargs)
 
+    def call_trusted(self, args, validation_rate=0.0):
+        """
+        Generates a value without call counting or debug logging.  Used when
+        solving in trusted mode.  See
+        :func:`~revscoring.dependencies.set_trusted`.
+        """
+        return self.process(*args)
+
+    def call_batch(self, args_list):
+        """
+        Generates values for a `list` of argument `tuple`.  Uses
+        `process_batch` if it is implemented and falls back on calling the
+        dependent once per `tuple` otherwise.
+        """
+        if self.process_batch is None:
+            return [self(*args) for args in args_list]
+        else:
+            logger.debug("Executing %s for a batch of %s (%s calls so far).",
+                         self, len(args_list), self.calls)
+            self.calls += len(args_list)
+            values = list(self.process_batch(args_list))
+            if len(values) != len(args_list):
+                raise ValueError(
+                    "{0} returned {1} values for {2} argument tuples"
+                    .format(self, len(values), len(args_list)))
+            return values
+
+    def signature(self):
+        """
+        Returns a hashable description of how the dependent processes its
+        dependencies or `None` if it shouldn't be merged with any other
+        dependent.  Dependents with equal signatures and the same
+        dependencies are assumed to generate the same value regardless of
+        their names.  See :func:`~revscoring.dependencies.compile`.
+        """
+        return None
+
+    def _function_signature(self, func):
+        # Methods bound to the dependent itself are identified by class and
+        # by the state of the instance that they might read.  Other bound
+        # methods are identified by the object they're bound to.  Returns
+        # `None` if the function shouldn't be merged.
+        if hasattr(func, "__func__") and hasattr(func, "__self__"):
+            if func.__self__ is self:
+                state = self._state_signature()
+                if state is None:
+                    return None
+                return (func.__func__, self.__class__, state)
+            else:
+                return (func.__func__, func.__self__)
+        else:
+            return func
+
+    def _state_signature(self):
+        # The attributes that subclasses add.  `None` if any is unhashable.
+        state = []
+        for key, value in sorted(vars(self).items()):
+            if key in DEPENDENT_ATTRIBUTES or \
+               getattr(value, "__self__", None) is self:
+                continue
+            elif isinstance(value, Dependent):
+                # Features overload `==`
+                value = str(value)
+            try:
+                hash(value)
+            except TypeError:
+                return None
+            state.append((key, value))
+        return tuple(state)
+
     def __hash__(self):
-        return hash('dependent.' + self.name)
+        try:
+            return self._hash
+        except AttributeError:
+            self._intern()
+            return self._hash
 
     def __eq__(self, other):
         return hash(self) == hash(other)
@@ -68,6 +189,23 @@ class Dependent:
     def __repr__(self):
         return "<" + self.__str__() + ">"
 
+    # Hashes and interned ids are only meaningful within a process
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_hash', None)
+        state.pop('_id', None)
+        return state
+
+    # Unpickling a cyclic graph can hash a dependent before its state is
+    # restored, so the hash is set when the dependent is created.
+    def __reduce_ex__(self, protocol):
+        return (_new_dependent, (self.__class__, str(self)),
+                self.__getstate__())
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._intern()
+
     @classmethod
     def load(cls, f):
         """
@@ -89,33 +227,146 @@ class Dependent:
             return pickle.dump(self, f)
 
 
+def _new_dependent(cls, key):
+    dependent = cls.__new__(cls)
+    dependent._hash = hash(key)
+    return dependent
+
+
 class DependentSet:
     """
     Represents a set of :class:`~revscoring.Dependent`.  This class behaves
     like a :class:`set`.
 
+    Members that are expensive to construct (e.g. whole sub-trees of
+    features) can be registered with :meth:`~revscoring.DependentSet.lazy`.
+    They are constructed on first access or when the set is used as a set.
+
     :Parameters:
         name : `str`
             A base name for the items in the set
     """
+    LAZY_LOCK = threading.RLock()
 
     def __init__(self, name, _dependents=None, _dependent_sets=None):
         self._dependents = _dependents or set()
         self._dependent_sets = _dependent_sets or set()
         self._name = name
+        # attribute name --> function that constructs the member
+        self._lazy = {}
+        # A flattened, frozen index of all members.  Built on demand and
+        # invalidated (along with the indexes of parent sets) when a new
+        # member is registered.
+        self._index = None
+        self._parents = []
+        for dependent_set in self._dependent_sets:
+            dependent_set._parents.append(self)
 
     def __setattr__(self, attr, value):
         super().__setattr__(attr, value)
 
         if isinstance(value, Dependent):
-            logger.log(logging.NOTSET,
-                       "Registering {0} to {1}".format(value, self._name))
+            logger.log(logging.NOTSET, "Registering %s to %s",
+                       value, self._name)
             if value in self._dependents:
                 logger.warn("{0} has already been added to {1}.  Could be "
                             .format(value, self) + "overwritten?")
             self._dependents.add(value)
+            self._invalidate()
         elif isinstance(value, DependentSet):
             self._dependent_sets.add(value)
+            value._parents.append(self)
+            self._invalidate()
+
+    def lazy(self, attr, construct):
+        """
+        Registers a member that will be constructed by calling `construct()`
+        when it is first accessed.
+
+        :Parameters:
+            attr : `str`
+                The attribute name of the member
+            construct : `func`
+                A function that returns a :class:`~revscoring.Dependent` or
+                :class:`~revscoring.DependentSet`
+        """
+        self._lazy[attr] = construct
+        self._invalidate()
+
+    def has_member(self, attr):
+        """
+        Checks whether a member is defined without constructing it.
+        """
+        return attr in self._lazy or hasattr(self, attr)
+
+    def __getattr__(self, attr):
+        # Only called when `attr` isn't found the normal way
+        lazy = self.__dict__.get('_lazy')
+        if lazy is None or attr not in lazy:
+            raise AttributeError("{0!r} has no attribute {1!r}"
+                                 .format(self, attr))
+
+        with self.LAZY_LOCK:
+            if attr in lazy:
+                setattr(self, attr, lazy[attr]())
+                del lazy[attr]
+        return self.__dict__[attr]
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self._lazy))
+
+    def _construct(self):
+        for attr in list(self._lazy):
+            getattr(self, attr)
+
+    # Parent links are rebuilt by the parents themselves.  Lazy members are
+    # constructed so that the set can be pickled.
+    def __getstate__(self):
+        self._construct()
+        state = dict(self.__dict__)
+        state['_index'] = None
+        del state['_parents']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Sets pickled before lazy members and indexes existed
+        self.__dict__.setdefault('_lazy', {})
+        self.__dict__.setdefault('_index', None)
+        self._parents = []
+        for dependent_set in self._dependent_sets:
+            dependent_set._parents.append(self)
+
+    def _invalidate(self):
+        seen = {id(self)}
+        dependent_sets = [self]
+        while len(dependent_sets) > 0:
+            dependent_set = dependent_sets.pop()
+            dependent_set._index = None
+            for parent in dependent_set._parents:
+                if id(parent) not in seen:
+                    seen.add(id(parent))
+                    dependent_sets.append(parent)
+
+    def _get_index(self):
+        if self._index is None:
+            # Sets can refer to each other (e.g. a revision and its diff), so
+            # members are gathered with a walk rather than recursion.
+            dependents = set()
+            seen = {id(self)}
+            dependent_sets = [self]
+            while len(dependent_sets) > 0:
+                dependent_set = dependent_sets.pop()
+                dependent_set._construct()
+                dependents.update(dependent_set._dependents)
+                for sub_set in dependent_set._dependent_sets:
+                    if sub_set._index is not None:
+                        dependents.update(sub_set._index)
+                    elif id(sub_set) not in seen:
+                        seen.add(id(sub_set))
+                        dependent_sets.append(sub_set)
+            self._index = frozenset(dependents)
+        return self._index
 
     # String methods
     def __str__(self):
@@ -135,19 +386,19 @@ class DependentSet:
 
     # Set methods
     def __len__(self):
-        return len(self._dependents.union(*self._dependent_sets))
+        return len(self._get_index())
 
     def __contains__(self, item):
-        return item in self._dependents.union(*self._dependent_sets)
+        return item in self._get_index()
 
     def __iter__(self):
-        return iter(self._dependents.union(*self._dependent_sets))
+        return iter(self._get_index())
 
     def __sub__(self, other):
-        return self._dependents.union(*self._dependent_sets) - other
+        return set(self._get_index() - other)
 
     def __and__(self, other):
-        return self._dependents.union(*self._dependent_sets) & other
+        return set(self._get_index() & other)
 
     def __or__(self, other):
-        return self._dependents.union(*self._dependent_sets) | other
+        return set(self._get_index() | other)
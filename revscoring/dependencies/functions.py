@@ -3,6 +3,11 @@ The following functions provide a set of utilities for working with `Dependent`
 and collections of `Dependent`.
 
 * :func:`~revscoring.dependencies.solve` provides basic dependency solving
+* :func:`~revscoring.dependencies.solve_batch` provides dependency solving
+  for a batch of observations at once
+* :func:`~revscoring.dependencies.compile` provides a reusable
+  :class:`~revscoring.dependencies.Plan` for solving the same dependents
+  many times
 * :func:`~revscoring.dependencies.expand` provides minimal expansion of
   dependency trees
 * :func:`~revscoring.dependencies.dig` provides expansion of "root" dependents
@@ -11,21 +16,23 @@ and collections of `Dependent`.
   tree to the terminal (useful when debugging)
 
 .. autofunction:: revscoring.dependencies.solve
+.. autofunction:: revscoring.dependencies.solve_batch
+.. autofunction:: revscoring.dependencies.compile
 .. autofunction:: revscoring.dependencies.expand
 .. autofunction:: revscoring.dependencies.dig
 .. autofunction:: revscoring.dependencies.draw
 
 """
 import logging
-import time
-import traceback
+from collections.abc import Mapping
 
-from ..errors import CaughtDependencyError, DependencyError, DependencyLoop
+from .plan import Plan
 
 logger = logging.getLogger(__name__)
 
 
-def solve(dependents, context=None, cache=None, profile=None):
+def solve(dependents, context=None, cache=None, profile=None,
+          executor=None, persistent_cache=None):
     """
     Calculates a dependent's value by solving dependencies.
 
@@ -45,6 +52,12 @@ def solve(dependents, context=None, cache=None, profile=None):
             A mapping of :class:`revscoring.Dependent` to `list` of process
             durations for generating the value.  The provided `dict` will be
             modified in-place and new durations will be appended.
+        executor : :class:`concurrent.futures.Executor`
+            An optional thread or process pool to process independent
+            branches of the dependency tree concurrently.
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of dependents that declare
+            a `version`
 
     :Returns:
         The result of executing the dependents with all dependencies resolved.
@@ -52,19 +65,86 @@ def solve(dependents, context=None, cache=None, profile=None):
         collection of dependents is provided, a generator of values will be
         returned
     """
-    cache = cache if cache is not None else {}
-    context = normalize_context(context)
+    return compile(dependents, context=context).solve(
+        cache=cache, profile=profile, executor=executor,
+        persistent_cache=persistent_cache)
 
-    if hasattr(dependents, '__iter__'):
-        # Multiple values -- return a generator
-        return _solve_many(dependents, context=context, cache=cache,
-                           profile=profile)
-    else:
-        # Singular value -- return it's solution
-        dependent = dependents
-        value, _, _ = _solve(dependent, context=context, cache=cache,
-                             profile=profile)
-        return value
+
+def solve_batch(dependents, caches, context=None, profile=None,
+                persistent_cache=None):
+    """
+    Calculates dependents' values for a batch of observations.  Each
+    dependency is processed once for the whole batch so that dependents that
+    implement `process_batch` can vectorize their work.
+
+    :Parameters:
+        dependents : :class:`revscoring.Dependent` | `iterable`
+            A dependent or collection of dependents to solve
+        caches : `iterable` ( `dict` )
+            A cache of previously solved dependencies as
+            :class:`revscoring.Dependent`:`<value>` pairs for each observation
+        context : `dict` | `iterable`
+            A mapping of injected dependency processers to use as context.
+            Can be specified as a set of new
+            :class:`revscoring.Dependent` or a map of
+            :class:`revscoring.Dependent`
+            pairs.
+        profile : `dict`
+            A mapping of :class:`revscoring.Dependent` to `list` of process
+            durations for generating the value.  The provided `dict` will be
+            modified in-place and new durations will be appended.
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of dependents that declare
+            a `version`
+
+    :Returns:
+        A `list` of (error, values) pairs -- one per cache.  `error` is `None`
+        if no error occurred.  If a single dependent is provided, `values` will
+        be its value.
+    """
+    return compile(dependents, context=context).solve_batch(
+        caches, profile=profile, persistent_cache=persistent_cache)
+
+
+def compile(dependents, context=None, optimize=False, release=False,
+            pin=None, trusted=None, validation_rate=0.0):
+    """
+    Compiles a dependent's dependency tree into a flat, topologically sorted
+    :class:`~revscoring.dependencies.Plan` that can be solved against many
+    caches without walking the tree again.
+
+    :Parameters:
+        dependents : :class:`revscoring.Dependent` | `iterable`
+            A dependent or collection of dependents to solve
+        context : `dict` | `iterable`
+            A mapping of injected dependency processers to use as context.
+            Can be specified as a set of new
+            :class:`revscoring.Dependent` or a map of
+            :class:`revscoring.Dependent`
+            pairs.
+        optimize : `bool`
+            Merge equivalent dependents and fuse `list` processing chains.
+            See :mod:`revscoring.dependencies.optimizer`.
+        release : `bool`
+            Drop intermediate values as soon as they are no longer needed to
+            reduce peak memory.  Released values are not written to the
+            cache.
+        pin : `iterable` ( :class:`revscoring.Dependent` )
+            Intermediate dependents whose values should be kept (and cached)
+            when `release` is set
+        trusted : `bool` | `None`
+            Skip call counting, debug logging and feature validation.  If
+            `None`, the default set with
+            :func:`~revscoring.dependencies.set_trusted` is used.
+        validation_rate : `float`
+            The proportion of feature values to validate in trusted mode
+
+    :Returns:
+        A :class:`~revscoring.dependencies.Plan`
+    """
+    return Plan(dependents, normalize_context(context), optimize=optimize,
+                release=release, pin=pin, trusted=trusted,
+                validation_rate=validation_rate)
 
 
 def expand(dependents, context=None, cache=None):
@@ -183,7 +263,7 @@ def normalize_context(context):
     """
     if context is None:
         return {}
-    elif isinstance(context, dict):
+    elif isinstance(context, Mapping):
         return context
     elif hasattr(context, "__iter__"):
         return {d: d for d in context}
@@ -192,84 +272,6 @@ def normalize_context(context):
                         .format(str(context)))
 
 
-def _solve(dependent, context, cache, history=None, profile=None):
-    history = history or set()
-
-    # Check if we've already got a value for this dependency
-    if dependent in cache:
-        return cache[dependent], cache, history
-
-    # Check if a corresponding dependent was injected into the context
-    else:
-
-        # If a dependent is in context here, replace it.
-        if dependent in context:
-            dependent = context[dependent]
-
-        # Check if the dependency is callable.
-        if not callable(dependent):
-            raise RuntimeError("Can't solve dependency " + repr(dependent) +
-                               ".  " + type(dependent).__name__ +
-                               " is not callable.")
-
-        # Check if we're in a loop.
-        elif dependent in history:
-            raise DependencyLoop("Dependency loop detected at " +
-                                 repr(dependent))
-
-        # All is good.  Time to generate a value
-        else:
-            # Add to history so we can detect any loops on the way down.
-            history.add(dependent)
-
-            # Check if we're a dependent with explicit dependencies
-            if hasattr(dependent, "dependencies"):
-                dependencies = dependent.dependencies
-            else:
-                # No dependencies?  OK.  Let's try that.
-                dependencies = []
-
-            # Generate args for process function from dependencies (if any)
-            args = []
-            for dependency in dependencies:
-                value, cache, history = _solve(dependency, context=context,
-                                               cache=cache, history=history,
-                                               profile=profile)
-
-                args.append(value)
-
-            # Generate value
-            try:
-                start = time.time()
-                value = dependent(*args)
-                duration = time.time() - start
-                if profile is not None:
-                    if dependent in profile:
-                        profile[dependent].append(duration)
-                    else:
-                        profile[dependent] = [duration]
-            except DependencyError:
-                raise
-            except Exception as e:
-                message = "Failed to process {0}: {1}".format(dependent, e)
-                tb = traceback.extract_stack()
-                formatted_exception = traceback.format_exc()
-                raise CaughtDependencyError(message, e, tb,
-                                            formatted_exception)
-
-            # Add value to cache
-            cache[dependent] = value
-            return cache[dependent], cache, history
-
-
-def _solve_many(dependents, context, cache, profile=None):
-
-    for dependent in dependents:
-        value, cache, history = _solve(dependent, context=context, cache=cache,
-                                       profile=profile)
-        yield value
-
-
 def _expand(dependent, context, cache):
     if dependent not in cache:
         yield dependent
@@ -0,0 +1,178 @@
+"""
+Implements the rewrites that are applied to a
+:class:`~revscoring.dependencies.Plan` when it is compiled with
+`optimize=True`.
+
+* **Common subexpression elimination** -- Dependents with equal
+  :meth:`~revscoring.Dependent.signature` and the same dependencies are
+  merged, so structurally identical dependents that were constructed under
+  different names are only processed once.
+* **Fusion** -- Chains of dependents that process a single `list` (e.g.
+  :class:`~revscoring.datasources.meta.filters.filter`,
+  :class:`~revscoring.datasources.meta.mappers.map` and
+  :func:`~revscoring.features.meta.aggregators.len`) are fused into a single
+  streaming pass when the intermediate `list` isn't used by anything else.
+
+The values of merged and fused-away dependents are not read from or written to
+the cache.
+
+.. autofunction:: revscoring.dependencies.optimizer.optimize
+"""
+import logging
+from random import random
+
+from .dependent import Dependent
+
+logger = logging.getLogger(__name__)
+
+
+def optimize(steps, outputs, deferred):
+    """
+    Rewrites the steps of a plan.
+
+    :Parameters:
+        steps : `list` ( `tuple` )
+            (key, processor, dependency positions) triples in topological order
+        outputs : `tuple` ( `int` )
+            The positions of the steps that generate the solved dependents
+        deferred : `dict` ( `int` : `frozenset` )
+            Step position --> the argument indexes of deferred dependencies
+
+    :Returns:
+        A tuple of `steps`, `outputs`, `deferred` and a `list` of `str`
+        descriptions of the rewrites
+    """
+    rewrites = []
+
+    # Common subexpression elimination
+    canonical = list(range(len(steps)))
+    seen = {}
+    steps = list(steps)
+    for position, (key, processor, dependencies) in enumerate(steps):
+        dependencies = tuple(canonical[d] for d in dependencies)
+        steps[position] = (key, processor, dependencies)
+
+        signature = _get_signature(processor)
+        if signature is None or position in deferred:
+            continue
+        try:
+            original = seen.setdefault((signature, dependencies), position)
+        except TypeError:
+            continue  # Signature isn't hashable
+        if original != position:
+            canonical[position] = original
+            rewrites.append("merged {0} into {1}".format(
+                processor, steps[original][1]))
+
+    outputs = tuple(canonical[position] for position in outputs)
+    kept = [position for position in range(len(steps))
+            if canonical[position] == position]
+
+    # Fusion of list processing chains
+    consumers = [0] * len(steps)
+    for position in kept:
+        for dependency in steps[position][2]:
+            consumers[dependency] += 1
+    for position in outputs:
+        consumers[position] += 1
+
+    chains = {}
+    for position in kept:
+        _, processor, dependencies = steps[position]
+        if len(dependencies) != 1 or position in deferred or \
+           (getattr(processor, "process_items", None) is None and
+                getattr(processor, "aggregate_items", None) is None):
+            continue
+        dependency = dependencies[0]
+        _, stage, stage_dependencies = steps[dependency]
+        if consumers[dependency] != 1 or len(stage_dependencies) != 1 or \
+           dependency in deferred or \
+           getattr(stage, "process_items", None) is None:
+            continue
+
+        source, stages = chains.pop(
+            dependency, (stage_dependencies[0], ()))
+        chains[position] = (source, stages + (stage,))
+        canonical[dependency] = None
+
+    # Re-number the remaining steps
+    kept = [position for position in kept if canonical[position] is not None]
+    new_positions = {position: i for i, position in enumerate(kept)}
+    new_steps = []
+    new_deferred = {}
+    for position in kept:
+        key, processor, dependencies = steps[position]
+        if position in chains:
+            source, stages = chains[position]
+            processor = Fused(processor, stages)
+            dependencies = (source,)
+            rewrites.append("fused {0} into {1}".format(
+                ", ".join(str(stage) for stage in stages), processor))
+        if position in deferred:
+            new_deferred[new_positions[position]] = deferred[position]
+        new_steps.append(
+            (key, processor, tuple(new_positions[d] for d in dependencies)))
+
+    if len(rewrites) > 0:
+        logger.info("Optimized a plan of {0} steps into {1} steps"
+                    .format(len(steps), len(new_steps)))
+    for rewrite in rewrites:
+        logger.debug(rewrite)
+
+    return (new_steps, tuple(new_positions[p] for p in outputs), new_deferred,
+            rewrites)
+
+
+def _get_signature(processor):
+    if isinstance(processor, Dependent):
+        return processor.signature()
+    else:
+        return None
+
+
+class Fused(Dependent):
+    """
+    Processes a chain of `list` processing dependents in a single streaming
+    pass.  A `Fused` dependent stands in for the last dependent of the chain
+    (`terminal`), so it shares its name and cache key.
+
+    :Parameters:
+        terminal : :class:`revscoring.Dependent`
+            The dependent whose value will be generated
+        stages : `iterable` ( :class:`revscoring.Dependent` )
+            The dependents whose `process_items` precede `terminal` (in order)
+    """
+
+    def __init__(self, terminal, stages):
+        self.terminal = terminal
+        self.stages = tuple(stages)
+        super().__init__(terminal.name, self._process,
+                         depends_on=self.stages[0].dependencies)
+
+    def _process(self, items):
+        value = self._stream(items)
+        if __debug__ and hasattr(self.terminal, "validate"):
+            return self.terminal.validate(value)
+        else:
+            return value
+
+    def call_trusted(self, args, validation_rate=0.0):
+        value = self._stream(*args)
+        if validation_rate > 0 and hasattr(self.terminal, "validate") and \
+           random() < validation_rate:
+            return self.terminal.validate(value)
+        else:
+            return value
+
+    def _stream(self, items):
+        items = iter(items)
+        for stage in self.stages:
+            items = stage.process_items(items)
+
+        if self.terminal.aggregate_items is not None:
+            return self.terminal.aggregate_items(items)
+        else:
+            return list(self.terminal.process_items(items))
+
+    def __str__(self):
+        return str(self.terminal)
@@ -0,0 +1,247 @@
+"""
+.. autoclass:: revscoring.dependencies.PersistentCache
+    :members:
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .store import MISSING
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentCache:
+    """
+    Implements a persistent, content-addressed cache of the values of
+    expensive dependents (e.g. tokenization, parsing and diffing).  Values are
+    stored in a local sqlite file with size-bounded, least-recently-used
+    eviction behind an in-memory LRU tier.
+
+    Only dependents that declare a `version` are cached.  A value is keyed
+    by the dependent's name, its `version` and a hash of the content of its
+    dependencies, so the same text is only processed once across revisions,
+    runs and processes.  Bump a dependent's `version` when its `process`
+    changes.  See :meth:`revscoring.dependencies.Plan.solve`.
+
+    :Parameters:
+        path : `str` | `None`
+            The path of the sqlite file.  If `None`, only the in-memory tier
+            is used.
+        max_size : `int`
+            The maximum number of bytes of values to store on disk
+        memory_size : `int`
+            The maximum number of bytes of values to hold in memory
+
+    Access times of values that are read from disk are written in batches of
+    `TOUCH_BATCH` (and before values are stored or evicted) rather than on
+    every read.
+
+    :Attributes:
+        hits : `int`
+            The number of values that were found on disk
+        memory_hits : `int`
+            The number of values that were found in memory
+        misses : `int`
+            The number of values that were not found
+        writes : `int`
+            The number of values that were stored
+        evictions : `int`
+            The number of values that were evicted from disk
+    """
+
+    TOUCH_BATCH = 100
+    """
+    The number of access times of disk reads to hold before writing them
+    """
+
+    def __init__(self, path=None, max_size=2 ** 30, memory_size=2 ** 26):
+        self.path = path
+        self.max_size = int(max_size)
+        self.memory_size = int(memory_size)
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._open()
+
+    def _open(self):
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.touched = {}  # key --> accessed
+        self.lock = threading.RLock()
+        if self.path is not None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(self.path, timeout=30,
+                                      check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS dependent_value (" +
+                "key BLOB PRIMARY KEY, value BLOB, size INTEGER, " +
+                "accessed REAL)")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS dependent_value_accessed " +
+                "ON dependent_value (accessed)")
+            self.db.commit()
+            self.disk_used = self._query_disk_used()
+        else:
+            self.db = None
+            self.disk_used = 0
+
+    def get(self, key):
+        """
+        Gets a value by key.  Returns
+        :data:`~revscoring.dependencies.store.MISSING` if the value is not
+        cached.
+        """
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return pickle.loads(data)
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT value FROM dependent_value WHERE key = ?",
+                        (key,)).fetchone()
+                    if row is not None:
+                        self.touched[key] = time.time()
+                        if len(self.touched) >= self.TOUCH_BATCH:
+                            self._write_touched()
+                            self.db.commit()
+                        data = bytes(row[0])
+                        value = pickle.loads(data)
+                        self.hits += 1
+                        self._remember(key, data)
+                        return value
+                except (sqlite3.Error, pickle.UnpicklingError) as e:
+                    logger.warning("Failed to read from {0}: {1}"
+                                   .format(self, e))
+
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        """
+        Stores a value by key.
+        """
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug("Can't store a value in {0}: {1}".format(self, e))
+            return
+
+        with self.lock:
+            self.writes += 1
+            self._remember(key, data)
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT size FROM dependent_value WHERE key = ?",
+                        (key,)).fetchone()
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO dependent_value " +
+                        "(key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                        (key, data, len(data), time.time()))
+                    self.touched.pop(key, None)
+                    self._write_touched()
+                    self.db.commit()
+                    # A replaced value no longer takes up space
+                    replaced_size = row[0] if row is not None else 0
+                    self.disk_used += len(data) - replaced_size
+                    if self.disk_used > self.max_size:
+                        self._evict()
+                except sqlite3.Error as e:
+                    logger.warning("Failed to write to {0}: {1}"
+                                   .format(self, e))
+
+    def stats(self):
+        """
+        Returns a `dict` of hit/miss statistics.
+        """
+        lookups = self.hits + self.memory_hits + self.misses
+        return {
+            'hits': self.hits,
+            'memory_hits': self.memory_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.memory_hits) / lookups
+                        if lookups > 0 else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'memory_used': self.memory_used,
+            'disk_used': self.disk_used
+        }
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                try:
+                    self._write_touched()
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Failed to write to {0}: {1}"
+                                   .format(self, e))
+                self.db.close()
+                self.db = None
+
+    def _write_touched(self):
+        if len(self.touched) > 0:
+            self.db.executemany(
+                "UPDATE dependent_value SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self.touched.items()])
+            self.touched.clear()
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_size:
+            return
+        if key in self.memory:
+            self.memory_used -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_used += len(data)
+        while self.memory_used > self.memory_size:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted)
+
+    def _evict(self):
+        # Other processes might be writing to the same file
+        self.disk_used = self._query_disk_used()
+        target = self.max_size * 0.9
+        while self.disk_used > target:
+            rows = self.db.execute(
+                "SELECT key, size FROM dependent_value " +
+                "ORDER BY accessed LIMIT 100").fetchall()
+            if len(rows) == 0:
+                break
+            for key, size in rows:
+                if self.disk_used <= target:
+                    break
+                self.db.execute("DELETE FROM dependent_value WHERE key = ?",
+                                (key,))
+                self.disk_used -= size
+                self.evictions += 1
+            self.db.commit()
+
+    def _query_disk_used(self):
+        return self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM dependent_value").fetchone()[0]
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, repr(self.path))
+
+    # Connections can't be shared between processes
+    def __getstate__(self):
+        return {'path': self.path, 'max_size': self.max_size,
+                'memory_size': self.memory_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.hits = self.memory_hits = self.misses = 0
+        self.writes = self.evictions = 0
+        self._open()
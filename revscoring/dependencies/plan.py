@@ -0,0 +1,741 @@
+"""
+.. autoclass:: revscoring.dependencies.Plan
+    :members:
+"""
+import hashlib
+import logging
+import pickle
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from ..errors import CaughtDependencyError, DependencyError, DependencyLoop
+from . import optimizer
+from .profiler import Profiler
+from .store import MISSING, ValueStore, key_id
+
+logger = logging.getLogger(__name__)
+
+# Process-wide (trusted, validation rate) for plans that don't set `trusted`
+_trust = (False, 0.0)
+
+# Execution states of a step
+SKIP, PROCESS, CACHED, DONE = 0, 1, 2, 3
+
+
+class Plan:
+    """
+    Represents a compiled, non-recursive execution plan for a dependent or a
+    collection of dependents.  The dependency graph is expanded, substituted
+    with context and topologically sorted once so that it can be executed
+    against many caches.
+
+    Use :func:`~revscoring.dependencies.compile` to construct a plan.
+
+    :Parameters:
+        dependents : :class:`revscoring.Dependent` | `iterable`
+            A dependent or collection of dependents to solve
+        context : `dict`
+            A (normalized) mapping of injected dependency processors
+        optimize : `bool`
+            Rewrite the plan with :mod:`~revscoring.dependencies.optimizer`
+        release : `bool`
+            Drop intermediate values as soon as no remaining step needs them
+            rather than keeping them until the plan is done.  Released values
+            are not written to the cache.
+        pin : `iterable` ( :class:`revscoring.Dependent` )
+            Intermediate dependents whose values should not be released
+        trusted : `bool` | `None`
+            Call dependents without call counting, debug logging and feature
+            validation.  If `None`, the process-wide default set with
+            :func:`~revscoring.dependencies.set_trusted` is used.
+        validation_rate : `float`
+            The proportion of feature values to validate in trusted mode
+
+    :Attributes:
+        rewrites : `list` ( `str` )
+            Descriptions of the rewrites applied by the optimizer
+    """
+
+    def __init__(self, dependents, context, optimize=False, release=False,
+                 pin=None, trusted=None, validation_rate=0.0):
+        self.many = hasattr(dependents, '__iter__')
+        if self.many:
+            self.dependents = tuple(dependents)
+        else:
+            self.dependents = (dependents,)
+
+        # Steps are (key, processor, dependency positions) triples in
+        # topological order.  `key` is the dependent as it is referenced (used
+        # for cache lookups) and `processor` is the dependent that will be
+        # called after context substitution.
+        self.steps = []
+        # Step position --> the argument indexes of its deferred dependencies
+        self.deferred = {}
+        positions = {}
+        self.outputs = tuple(self._add(dependent, context, positions)
+                             for dependent in self.dependents)
+        self.trusted = trusted
+        self.validation_rate = validation_rate
+        self.rewrites = []
+        if optimize:
+            self.steps, self.outputs, self.deferred, self.rewrites = \
+                optimizer.optimize(self.steps, self.outputs, self.deferred)
+        if release:
+            self.releasable = self._get_releasable(pin or [])
+        else:
+            self.releasable = None
+        # Steps whose values can be kept in a PersistentCache
+        self.persisted = frozenset(
+            position for position, (_, processor, _) in enumerate(self.steps)
+            if getattr(processor, "version", None) is not None and
+            position not in self.deferred)
+        self._consumers = None
+        self._names = None
+        self._intern()
+
+    def _get_releasable(self, pin):
+        pinned = set(str(dependent) for dependent in pin)
+        releasable = bytearray(len(self.steps))
+        for _, _, dependencies in self.steps:
+            for dependency in dependencies:
+                releasable[dependency] = 1
+
+        # Deferred dependencies might be solved after their other consumers
+        # are done, so they (and their dependencies) are kept.
+        stack = []
+        for position, indexes in self.deferred.items():
+            dependencies = self.steps[position][2]
+            stack.extend(dependencies[i] for i in indexes)
+        while len(stack) > 0:
+            position = stack.pop()
+            if releasable[position]:
+                releasable[position] = 0
+                stack.extend(self.steps[position][2])
+
+        for position in self.outputs:
+            releasable[position] = 0
+        for position, (key, processor, _) in enumerate(self.steps):
+            if str(key) in pinned or str(processor) in pinned:
+                releasable[position] = 0
+
+        return releasable
+
+    def _intern(self):
+        # (key id, processor id) pairs for solving against a ValueStore
+        self.ids = [(key_id(key), key_id(processor))
+                    for key, processor, _ in self.steps]
+
+    # Interned ids are only meaningful within a process
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['ids']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._intern()
+
+    def _add(self, dependent, context, positions):
+        if dependent in positions:
+            return positions[dependent]
+
+        # Frames are [key, processor, dependencies, next dependency]
+        stack = [[dependent, None, None, 0]]
+        visiting = set()
+        while len(stack) > 0:
+            frame = stack[-1]
+            key, processor, dependencies, i = frame
+
+            if processor is None:
+                # If a dependent is in context here, replace it.
+                processor = context[key] if key in context else key
+
+                if processor in visiting:
+                    raise DependencyLoop("Dependency loop detected at " +
+                                         repr(processor))
+                visiting.add(processor)
+
+                if callable(processor) and \
+                   hasattr(processor, "dependencies"):
+                    dependencies = processor.dependencies
+                else:
+                    dependencies = []
+                frame[1], frame[2] = processor, dependencies
+
+            if i < len(dependencies):
+                frame[3] += 1
+                if dependencies[i] not in positions:
+                    stack.append([dependencies[i], None, None, 0])
+            else:
+                stack.pop()
+                visiting.discard(processor)
+                positions[key] = len(self.steps)
+                if len(dependencies) > 0 and \
+                   len(getattr(processor, "deferred", ())) > 0:
+                    self.deferred[len(self.steps)] = \
+                        frozenset(processor.deferred)
+                self.steps.append(
+                    (key, processor,
+                     tuple(positions[d] for d in dependencies)))
+
+        return positions[dependent]
+
+    def solve(self, cache=None, profile=None, executor=None,
+              persistent_cache=None):
+        """
+        Executes the plan.
+
+        :Parameters:
+            cache : `dict` | :class:`~revscoring.dependencies.ValueStore`
+                A cache of previously solved dependencies as
+                :class:`revscoring.Dependent`:`<value>` pairs.  Newly
+                generated values will be added to it.  A
+                :class:`~revscoring.dependencies.ValueStore` can be read and
+                written without hashing dependents.
+            profile : `dict` | :class:`~revscoring.dependencies.Profiler`
+                A mapping of :class:`revscoring.Dependent` to `list` of
+                process durations for generating the value.  The provided
+                `dict` will be modified in-place and new durations will be
+                appended.  A :class:`~revscoring.dependencies.Profiler`
+                collects inclusive/exclusive times and cache hits too.
+            executor : :class:`concurrent.futures.Executor`
+                If provided, independent branches of the plan will be
+                processed concurrently in the executor as soon as their
+                dependencies are available.  When using a process pool, the
+                dependents and their values must be picklable.
+            persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+                A content-addressed cache of the values of dependents that
+                declare a `version`.  It is consulted before processing them.
+
+        :Returns:
+            If the plan was compiled for a single dependent, its value will be
+            returned.  Otherwise, a generator of values will be returned.
+        """
+        cache = cache if cache is not None else {}
+        if self.many:
+            return self._solve_many(cache, profile, executor,
+                                    persistent_cache)
+        else:
+            return self._execute(cache, profile, executor,
+                                 persistent_cache)[self.outputs[0]]
+
+    def _solve_many(self, cache, profile, executor, persistent_cache):
+        values = self._execute(cache, profile, executor, persistent_cache)
+        for position in self.outputs:
+            yield values[position]
+
+    def solve_batch(self, caches, profile=None, persistent_cache=None):
+        """
+        Executes the plan for a batch of observations at once.  Each step is
+        processed once for the whole batch using
+        :meth:`revscoring.Dependent.call_batch`, so dependents that implement
+        `process_batch` are given all of the argument tuples together.  An
+        error for one observation does not affect the others.
+
+        :Parameters:
+            caches : `iterable` ( `dict` )
+                A cache of previously solved dependencies per observation.
+                :class:`~revscoring.dependencies.ValueStore` works too.
+            profile : `dict` | :class:`~revscoring.dependencies.Profiler`
+                A mapping of :class:`revscoring.Dependent` to `list` of
+                process durations.  The duration of a batch is split evenly
+                between its observations.
+            persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+                A content-addressed cache of the values of dependents that
+                declare a `version`.
+
+        :Returns:
+            A `list` of (error, values) pairs -- one per cache.  `error` is
+            `None` if no error occurred.  If the plan was compiled for a
+            single dependent, `values` will be its value.
+        """
+        executions = [Execution(self, cache, persistent_cache)
+                      for cache in caches]
+        errors = [None] * len(executions)
+
+        for position, (_, processor, dependencies) in enumerate(self.steps):
+            batch = [i for i, execution in enumerate(executions)
+                     if errors[i] is None and
+                     execution.states[position] == PROCESS]
+            if position in self.persisted:
+                batch = [i for i in batch
+                         if not executions[i].recall(position)]
+            if len(batch) == 0:
+                continue
+            elif position in self.deferred:
+                # Deferred dependencies are solved per observation
+                for i in batch:
+                    try:
+                        executions[i].process_step(position)
+                    except DependencyError as e:
+                        errors[i] = e
+                continue
+
+            args_list = [tuple(executions[i].values[d] for d in dependencies)
+                         for i in batch]
+            try:
+                batch_values, duration = _call_batch(
+                    processor, args_list, *executions[0].trust)
+                durations = [duration / len(batch)] * len(batch)
+                batch_errors = [None] * len(batch)
+            except DependencyError as e:
+                if len(batch) == 1:
+                    batch_values, durations, batch_errors = [None], [None], [e]
+                else:
+                    batch_values, durations, batch_errors = \
+                        self._process_rows(processor, args_list,
+                                           executions[0].trust)
+
+            for i, value, duration, error in \
+                    zip(batch, batch_values, durations, batch_errors):
+                if error is not None:
+                    errors[i] = error
+                else:
+                    executions[i].complete(position, value, duration)
+                    executions[i].remember(position, value)
+
+        for execution in executions:
+            self._record(profile, execution)
+
+        return [(error, None) if error is not None else
+                (None, self._output(execution.values))
+                for error, execution in zip(errors, executions)]
+
+    def _output(self, values):
+        if self.many:
+            return [values[position] for position in self.outputs]
+        else:
+            return values[self.outputs[0]]
+
+    def _process_rows(self, processor, args_list, trust):
+        # Processes one-by-one to figure out which observations failed
+        values, durations, errors = [], [], []
+        for args in args_list:
+            try:
+                value, duration = _call(processor, args, *trust)
+                values.append(value)
+                durations.append(duration)
+                errors.append(None)
+            except DependencyError as e:
+                values.append(None)
+                durations.append(None)
+                errors.append(e)
+
+        return values, durations, errors
+
+    def _execute(self, cache, profile, executor, persistent_cache):
+        execution = Execution(self, cache, persistent_cache)
+
+        try:
+            if executor is None:
+                execution.process(range(len(self.steps)))
+            else:
+                self._process_concurrently(execution, executor)
+        finally:
+            self._record(profile, execution)
+
+        return execution.values
+
+    def _record(self, profile, execution):
+        if profile is None:
+            return
+        elif isinstance(profile, Profiler):
+            hits = [position for position, state in enumerate(execution.states)
+                    if state == CACHED]
+            profile.record(self, hits, execution.durations)
+        else:
+            for position, duration in enumerate(execution.durations):
+                if duration is not None:
+                    processor = self.steps[position][1]
+                    if processor in profile:
+                        profile[processor].append(duration)
+                    else:
+                        profile[processor] = [duration]
+
+    def _process_concurrently(self, execution, executor):
+        steps = self.steps
+        states, values = execution.states, execution.values
+        consumers = self._get_consumers()
+
+        # Count unsolved dependencies of each step that needs processing.
+        ready, waiting = [], {}
+        for position, (_, _, dependencies) in enumerate(steps):
+            if states[position] == PROCESS:
+                unsolved = sum(1 for d in dependencies
+                               if states[d] == PROCESS)
+                if unsolved == 0:
+                    ready.append(position)
+                else:
+                    waiting[position] = unsolved
+
+        futures = {}
+        deferred = []
+        try:
+            while len(ready) > 0 or len(futures) > 0 or len(deferred) > 0:
+                done = []
+                for position in ready:
+                    if states[position] == DONE or \
+                       execution.recall(position):
+                        # Already solved on behalf of a deferred dependency
+                        # or found in the persistent cache
+                        done.append(position)
+                    elif position in self.deferred:
+                        deferred.append(position)
+                    else:
+                        _, processor, dependencies = steps[position]
+                        future = executor.submit(
+                            _call, processor,
+                            [values[d] for d in dependencies],
+                            *execution.trust)
+                        futures[future] = position
+                ready = []
+
+                if len(futures) > 0:
+                    completed, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        position = futures.pop(future)
+                        value, duration = future.result()
+                        execution.complete(position, value, duration)
+                        execution.remember(position, value)
+                        done.append(position)
+                elif len(done) == 0:
+                    # Steps with deferred dependencies are processed in this
+                    # thread once nothing else is in flight so that their
+                    # deferred dependencies can be solved on demand.
+                    position = deferred.pop(0)
+                    if states[position] != DONE:
+                        execution.process_step(position)
+                    done.append(position)
+
+                for position in done:
+                    for consumer in consumers[position]:
+                        if consumer not in waiting:
+                            continue  # Cached or not needed
+                        waiting[consumer] -= 1
+                        if waiting[consumer] == 0:
+                            del waiting[consumer]
+                            ready.append(consumer)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _get_names(self):
+        if self._names is None:
+            self._names = [str(processor) for _, processor, _ in self.steps]
+        return self._names
+
+    def _get_consumers(self):
+        if self._consumers is None:
+            consumers = [[] for _ in self.steps]
+            for position, (_, _, dependencies) in enumerate(self.steps):
+                for dependency in dependencies:
+                    consumers[dependency].append(position)
+            self._consumers = [tuple(c) for c in consumers]
+        return self._consumers
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__,
+                                 repr(list(self.dependents)))
+
+
+class Execution:
+    """
+    Represents the state of executing a :class:`~revscoring.dependencies.Plan`
+    against a single cache.
+    """
+    __slots__ = ('plan', 'values', 'states', 'durations', 'lookup', 'save',
+                 'remaining', 'persistent_cache', 'digests', 'trust')
+
+    def __init__(self, plan, cache, persistent_cache=None):
+        steps = plan.steps
+        self.plan = plan
+        self.values = [None] * len(steps)
+        self.states = bytearray(len(steps))
+        self.durations = [None] * len(steps)
+        if plan.trusted is None:
+            self.trust = _trust
+        else:
+            self.trust = (plan.trusted, plan.validation_rate)
+        if persistent_cache is not None and len(plan.persisted) > 0:
+            self.persistent_cache = persistent_cache
+            self.digests = [None] * len(steps)
+        else:
+            self.persistent_cache = None
+
+        if isinstance(cache, ValueStore):
+            slots, ids = cache.values, plan.ids
+
+            def lookup(position):
+                return slots.get(ids[position][0], MISSING)
+
+            def save(position, value):
+                slots[ids[position][1]] = value
+        else:
+            def lookup(position):
+                key = steps[position][0]
+                return cache[key] if key in cache else MISSING
+
+            def save(position, value):
+                cache[steps[position][1]] = value
+
+        self.lookup, self.save = lookup, save
+        marked = self.mark(plan.outputs)
+
+        if plan.releasable is not None:
+            # Count the consumers that still need each releasable value
+            releasable = plan.releasable
+            self.remaining = [0] * len(steps)
+            for position in marked:
+                for dependency in steps[position][2]:
+                    if releasable[dependency]:
+                        self.remaining[dependency] += 1
+        else:
+            self.remaining = None
+
+    def mark(self, positions):
+        """
+        Marks steps and their (non-deferred) dependencies for processing
+        unless their values can be found in the cache.  Returns the marked
+        positions that have not been processed yet in processing order.
+        """
+        steps, deferred = self.plan.steps, self.plan.deferred
+        states, values, lookup = self.states, self.values, self.lookup
+
+        marked = []
+        stack = [position for position in set(positions)
+                 if states[position] in (SKIP, PROCESS)]
+        seen = set(stack)
+        while len(stack) > 0:
+            position = stack.pop()
+            if states[position] == SKIP:
+                value = lookup(position)
+                if value is not MISSING:
+                    values[position] = value
+                    states[position] = CACHED
+                    continue
+                states[position] = PROCESS
+
+            marked.append(position)
+            skip = deferred.get(position, ())
+            for i, dependency in enumerate(steps[position][2]):
+                if i not in skip and dependency not in seen and \
+                   states[dependency] in (SKIP, PROCESS):
+                    seen.add(dependency)
+                    stack.append(dependency)
+
+        marked.sort()
+        return marked
+
+    def process(self, positions):
+        """
+        Processes the marked steps among `positions` (in processing order).
+        """
+        states = self.states
+        for position in positions:
+            if states[position] == PROCESS:
+                self.process_step(position)
+
+    def process_step(self, position):
+        if self.recall(position):
+            return
+
+        _, processor, dependencies = self.plan.steps[position]
+        values = self.values
+
+        skip = self.plan.deferred.get(position)
+        if skip is None:
+            value, duration = _call(processor,
+                                    [values[d] for d in dependencies],
+                                    *self.trust)
+        else:
+            args = [Deferred(self, d) if i in skip else values[d]
+                    for i, d in enumerate(dependencies)]
+            value, duration = _call(processor, args, *self.trust)
+            # Time spent solving deferred dependencies is not exclusive
+            duration -= sum(arg.duration for arg in args
+                            if isinstance(arg, Deferred))
+
+        self.complete(position, value, duration)
+        self.remember(position, value)
+
+    def complete(self, position, value, duration):
+        values = self.values
+        values[position] = value
+        self.durations[position] = duration
+        self.states[position] = DONE
+
+        releasable = self.plan.releasable
+        if releasable is None:
+            self.save(position, value)
+            return
+        elif not releasable[position]:
+            self.save(position, value)
+
+        remaining = self.remaining
+        for dependency in self.plan.steps[position][2]:
+            if releasable[dependency]:
+                remaining[dependency] -= 1
+                if remaining[dependency] == 0:
+                    values[dependency] = None
+
+    def recall(self, position):
+        """
+        Completes a step with a value from the persistent cache.  Returns
+        `True` if the value was found.
+        """
+        if self.persistent_cache is None or \
+           position not in self.plan.persisted:
+            return False
+
+        digest = self.digest(position)
+        if digest is None:
+            return False
+        value = self.persistent_cache.get(digest)
+        if value is MISSING:
+            return False
+        else:
+            self.complete(position, value, None)
+            return True
+
+    def remember(self, position, value):
+        """
+        Stores the value of a step in the persistent cache.
+        """
+        if self.persistent_cache is not None and \
+           position in self.plan.persisted:
+            digest = self.digest(position)
+            if digest is not None:
+                self.persistent_cache.set(digest, value)
+
+    def digest(self, position):
+        """
+        Returns a content hash for the value of a step.  The values of
+        versioned steps are identified by their name, version and the content
+        hashes of their dependencies.  Other values are hashed directly.
+        Returns `None` if the value can't be hashed.
+        """
+        digest = self.digests[position]
+        if digest is None:
+            _, processor, dependencies = self.plan.steps[position]
+            hasher = hashlib.sha1()
+            if position in self.plan.persisted and \
+               self.states[position] != CACHED:
+                hasher.update("{0}@{1}".format(processor, processor.version)
+                              .encode('utf-8'))
+                for dependency in dependencies:
+                    dependency_digest = self.digest(dependency)
+                    if dependency_digest is None:
+                        return None
+                    hasher.update(dependency_digest)
+            else:
+                value = self.values[position]
+                try:
+                    if isinstance(value, str):
+                        hasher.update(b"s")
+                        hasher.update(value.encode('utf-8', 'surrogatepass'))
+                    else:
+                        hasher.update(b"p")
+                        hasher.update(pickle.dumps(value, protocol=4))
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    return None
+            digest = self.digests[position] = hasher.digest()
+
+        return digest
+
+    def resolve(self, position):
+        """
+        Solves a step (and its dependencies) on demand.
+        """
+        if self.states[position] in (SKIP, PROCESS):
+            self.process(self.mark([position]))
+
+        return self.values[position]
+
+
+class Deferred:
+    """
+    A handle on the value of a deferred dependency.  Call it to solve the
+    dependency.  See :class:`revscoring.Dependent`.
+    """
+    __slots__ = ('execution', 'position', 'duration')
+
+    def __init__(self, execution, position):
+        self.execution = execution
+        self.position = position
+        self.duration = 0.0
+
+    def __call__(self):
+        start = time.perf_counter()
+        try:
+            return self.execution.resolve(self.position)
+        finally:
+            self.duration += time.perf_counter() - start
+
+
+def set_trusted(trusted=True, validation_rate=0.0):
+    """
+    Sets the process-wide default for trusted (production) mode.  In trusted
+    mode, dependents are called without call counting or debug logging and
+    :class:`revscoring.Feature` values are not validated (or only a random
+    sample of them are).  Plans and contexts that set `trusted` explicitly
+    are not affected.
+
+    :Parameters:
+        trusted : `bool`
+            Enable trusted mode?
+        validation_rate : `float`
+            The proportion of feature values to validate in trusted mode
+    """
+    global _trust
+    _trust = (bool(trusted), float(validation_rate))
+
+
+def _call(processor, args, trusted=False, validation_rate=0.0):
+    # Check if the dependency is callable.
+    if not callable(processor):
+        raise RuntimeError("Can't solve dependency " + repr(processor) +
+                           ".  " + type(processor).__name__ +
+                           " is not callable.")
+
+    try:
+        start = time.perf_counter()
+        if trusted and hasattr(processor, "call_trusted"):
+            value = processor.call_trusted(args, validation_rate)
+        else:
+            value = processor(*args)
+        return value, time.perf_counter() - start
+    except DependencyError:
+        raise
+    except Exception as e:
+        message = "Failed to process {0}: {1}".format(processor, e)
+        tb = traceback.extract_stack()
+        formatted_exception = traceback.format_exc()
+        raise CaughtDependencyError(message, e, tb, formatted_exception)
+
+
+def _call_batch(processor, args_list, trusted=False, validation_rate=0.0):
+    if not hasattr(processor, "call_batch"):
+        start = time.perf_counter()
+        values = [_call(processor, args)[0] for args in args_list]
+        return values, time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        if trusted and processor.process_batch is None and \
+           hasattr(processor, "call_trusted"):
+            values = [processor.call_trusted(args, validation_rate)
+                      for args in args_list]
+        else:
+            values = processor.call_batch(args_list)
+        return values, time.perf_counter() - start
+    except DependencyError:
+        raise
+    except Exception as e:
+        message = "Failed to process {0}: {1}".format(processor, e)
+        tb = traceback.extract_stack()
+        formatted_exception = traceback.format_exc()
+        raise CaughtDependencyError(message, e, tb, formatted_exception)
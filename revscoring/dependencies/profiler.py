@@ -0,0 +1,186 @@
+"""
+.. autoclass:: revscoring.dependencies.Profiler
+    :members:
+"""
+from statistics import mean, median
+
+
+class DependentStats:
+    """
+    Accumulates the profile of a single dependent.
+
+    :Attributes:
+        calls : `int`
+            The number of times the dependent was processed
+        hits : `int`
+            The number of times the dependent's value was found in the cache
+        exclusive : `float`
+            Total seconds spent processing the dependent itself
+        inclusive : `float`
+            Total seconds spent processing the dependent and the dependencies
+            that were processed on its behalf
+        durations : `list` ( `float` )
+            Exclusive seconds of each call
+    """
+    __slots__ = ('calls', 'hits', 'exclusive', 'inclusive', 'durations')
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.exclusive = 0.0
+        self.inclusive = 0.0
+        self.durations = []
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.hits += other.hits
+        self.exclusive += other.exclusive
+        self.inclusive += other.inclusive
+        self.durations.extend(other.durations)
+
+    def row(self):
+        """
+        Returns (calls, hits, exclusive, inclusive, min, max, mean, median)
+        """
+        durations = self.durations or [0.0]
+        return (self.calls, self.hits, self.exclusive, self.inclusive,
+                min(durations), max(durations), mean(durations),
+                median(durations))
+
+    def __getstate__(self):
+        return (self.calls, self.hits, self.exclusive, self.inclusive,
+                self.durations)
+
+    def __setstate__(self, state):
+        (self.calls, self.hits, self.exclusive, self.inclusive,
+         self.durations) = state
+
+
+class Profiler:
+    """
+    Collects a hierarchical profile of dependency solving.  Pass a `Profiler`
+    as the `profile` of :func:`~revscoring.dependencies.solve` (or any of
+    the solving methods) to collect it.
+
+    Every processed dependent is attributed to the first dependent that
+    consumed it, so processing forms a tree (as it would in a recursive solve).
+    The exclusive time of a dependent is the time spent in its own `process`
+    and the inclusive time adds the time of the dependents processed beneath
+    it.  Times are measured with :func:`time.perf_counter`.
+
+    Profiles are keyed by `str(dependent)` so they can be pickled and
+    :meth:`~revscoring.dependencies.Profiler.merge`'d across processes.
+
+    :Attributes:
+        stats : `dict` ( `str` : `DependentStats` )
+            Per-dependent statistics
+        stacks : `dict` ( `tuple` ( `str` ) : `float` )
+            Exclusive seconds spent per stack of dependents
+        batches : `list` ( (`int`, `float`) )
+            (size, seconds) of batches recorded with
+            :meth:`~revscoring.dependencies.Profiler.record_batch`
+        requests : `list` ( (`str`, `int`, `int` | `None`, `float`) )
+            (kind, size, bytes, seconds) of batched requests (e.g. to the
+            MediaWiki API) recorded with
+            :meth:`~revscoring.dependencies.Profiler.record_request`
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.stacks = {}
+        self.batches = []
+        self.requests = []
+
+    def record(self, plan, hits, durations):
+        """
+        Records a single execution of a :class:`~revscoring.dependencies.Plan`.
+
+        :Parameters:
+            plan : :class:`~revscoring.dependencies.Plan`
+                The executed plan
+            hits : `iterable` ( `int` )
+                Positions of steps whose values were found in the cache
+            durations : `list` ( `float` | `None` )
+                The exclusive duration of each step (`None` if the step was
+                not processed)
+        """
+        names = plan._get_names()
+        consumers = plan._get_consumers()
+
+        for position in hits:
+            self._get_stats(names[position]).hits += 1
+
+        # Dependencies precede their consumers in a plan, so inclusive times
+        # are complete by the time they are added to their owner.
+        owners = [None] * len(durations)
+        inclusive = [0.0] * len(durations)
+        for position, duration in enumerate(durations):
+            if duration is None:
+                continue
+
+            for consumer in consumers[position]:
+                if durations[consumer] is not None:
+                    owners[position] = consumer
+                    break
+
+            inclusive[position] += duration
+            if owners[position] is not None:
+                inclusive[owners[position]] += inclusive[position]
+
+        for position, duration in enumerate(durations):
+            if duration is None:
+                continue
+
+            stats = self._get_stats(names[position])
+            stats.calls += 1
+            stats.exclusive += duration
+            stats.inclusive += inclusive[position]
+            stats.durations.append(duration)
+
+            stack = []
+            owner = position
+            while owner is not None:
+                stack.append(names[owner])
+                owner = owners[owner]
+            stack = tuple(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + duration
+
+    def record_batch(self, size, duration):
+        """
+        Records the size and duration of a batch of observations.
+        """
+        self.batches.append((size, duration))
+
+    def record_request(self, kind, size, n_bytes, duration):
+        """
+        Records the kind, size (number of items), bytes (if known) and
+        duration of a batched request.
+        """
+        self.requests.append((kind, size, n_bytes, duration))
+
+    def merge(self, other):
+        """
+        Merges another `Profiler` (e.g. from a worker process) into this one.
+        """
+        for name, stats in other.stats.items():
+            self._get_stats(name).merge(stats)
+        for stack, duration in other.stacks.items():
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + duration
+        self.batches.extend(other.batches)
+        self.requests.extend(other.requests)
+
+    def write_collapsed_stacks(self, f):
+        """
+        Writes the profile in the "collapsed stack" format (one
+        `frame;frame;frame <microseconds>` line per stack) that is read by
+        flamegraph.pl and https://www.speedscope.app/.
+        """
+        for stack, duration in sorted(self.stacks.items()):
+            f.write("{0} {1}\n".format(
+                ";".join(name.replace(";", ":") for name in stack),
+                int(round(duration * 1000000))))
+
+    def _get_stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = DependentStats()
+        return self.stats[name]
@@ -0,0 +1,130 @@
+"""
+.. autoclass:: revscoring.dependencies.ValueStore
+    :members:
+"""
+import threading
+
+# Interned key --> id
+_ids = {}
+# id --> interned key
+_keys = []
+_lock = threading.Lock()
+
+
+class Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = Missing()
+
+
+def intern_id(key):
+    """
+    Gets a stable (per-process) integer id for a hashable key.  Keys that
+    compare equal share an id, so `str(dependent)` and `dependent` map to the
+    same id.
+    """
+    try:
+        return _ids[key]
+    except KeyError:
+        with _lock:
+            if key not in _ids:
+                _ids[key] = len(_keys)
+                _keys.append(key)
+            return _ids[key]
+
+
+def key_id(key):
+    """
+    Gets the interned integer id of a :class:`revscoring.Dependent` (or any
+    other hashable key that might be found in a cache).
+    """
+    try:
+        return key._id
+    except AttributeError:
+        return intern_id(key)
+
+
+class ValueStore:
+    """
+    Implements a store of values indexed by the interned id of a
+    :class:`revscoring.Dependent`.  A
+    :class:`~revscoring.dependencies.Plan` can read and write a
+    `ValueStore` without hashing any dependents.  Only the ids that have
+    values take up space, so a store doesn't grow with the number of
+    dependents that have been interned in the process.
+
+    `ValueStore` behaves like a `dict` of :class:`revscoring.Dependent` :
+    `<value>` pairs, so it can be used anywhere a `cache` is expected.
+
+    :Parameters:
+        cache : `dict`
+            A cache of previously solved dependencies as
+            :class:`revscoring.Dependent`:`<value>` pairs to adapt
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, cache=None):
+        # Interned id --> value
+        self.values = {}
+        if cache is not None:
+            self.update(cache)
+
+    def update(self, cache):
+        items = cache.items() if hasattr(cache, "items") else cache
+        for key, value in items:
+            self[key] = value
+
+    def get(self, key, default=None):
+        return self.values.get(key_id(key), default)
+
+    def items(self):
+        for id_, value in self.values.items():
+            yield _keys[id_], value
+
+    def keys(self):
+        for key, _ in self.items():
+            yield key
+
+    def to_dict(self):
+        """
+        Converts the store into a `dict` of key : `<value>` pairs.
+        """
+        return dict(self.items())
+
+    def __contains__(self, key):
+        return key_id(key) in self.values
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        else:
+            return value
+
+    def __setitem__(self, key, value):
+        self.values[key_id(key)] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        del self.values[key_id(key)]
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__,
+                                 repr(self.to_dict()))
+
+    # Interned ids are only meaningful within a process
+    def __getstate__(self):
+        return {str(key): value for key, value in self.items()}
+
+    def __setstate__(self, state):
+        self.values = {}
+        self.update(state)
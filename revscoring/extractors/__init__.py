@@ -7,10 +7,18 @@ api
 +++
 .. automodule:: revscoring.extractors.api
 
+dump
+++++
+.. automodule:: revscoring.extractors.dump
+
 extractor
 +++++++++
 .. automodule:: revscoring.extractors.extractor
 
+locality
+++++++++
+.. automodule:: revscoring.extractors.locality
+
 """
 from .extractor import Extractor, OfflineExtractor
 
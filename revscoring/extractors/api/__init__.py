@@ -1,3 +1,4 @@
+from .async_extractor import AsyncExtractor
 from .extractor import Extractor
 
-__all__ = [Extractor]
+__all__ = [Extractor, AsyncExtractor]
@@ -0,0 +1,599 @@
+"""
+.. autoclass:: revscoring.extractors.api.AsyncExtractor
+    :members:
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+
+import mwapi
+import mwtypes
+from more_itertools import chunked
+
+from ...datasources import revision_oriented
+from ...dependencies import PersistentCache
+from ...errors import (PageNotFound, QueryNotSupported, RevisionNotFound,
+                       UserNotFound)
+from .batcher import AdaptiveBatcher
+from .doc_cache import DocCache
+from .extractor import LOOKUP_ERRORS, Extractor, _normalize_revisions
+from .single_flight import AsyncSingleFlight
+from .util import CONTRIB_PROPS, rev_props, user_props
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncExtractor(Extractor):
+    """
+    Implements an :class:`~revscoring.extractors.api.Extractor` that queries
+    the MediaWiki API with :class:`mwapi.AsyncSession` over a pooled HTTP
+    client.  `extract()` has the same contract as
+    :meth:`revscoring.extractors.api.Extractor.extract`.
+
+    For each batch of revisions, the revision documents are requested first
+    and then parent revisions, user info, page creation revisions and the last
+    revision of each user are requested concurrently.  The documents for the
+    next `pipeline` batches are requested while a batch is being solved.
+
+    The API is queried from an event loop that runs in a background thread,
+    so an `AsyncExtractor` can be shared between threads.
+
+    :Parameters:
+        host : `str`
+            The host of the MediaWiki API (e.g. "https://en.wikipedia.org")
+        user_agent : `str`
+            The User-Agent header to include with all requests
+        api_path : `str`
+            The path to "api.php" on the server
+        timeout : `float`
+            How long to wait for the server to send data before giving up
+        context : `dict` | `iterable`
+            A set of dependents to be used in place of those already provided
+        cache : `dict`
+            A cache of computed values to use for every extraction
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of expensive dependents
+        batch_size : `int`
+            The number of revisions to request documents for at once
+        pipeline : `int`
+            The number of batches to request documents for ahead of the batch
+            that is being solved
+        connections : `int`
+            The maximum number of simultaneous connections to the API
+        doc_cache : :class:`~revscoring.extractors.api.doc_cache.DocCache`
+            A cache of user info, page creation, last user revision and
+            property suggestion documents
+        rev_doc_window : `int`
+            The number of recently requested revision documents to keep so
+            that they can be reused as the parents of revisions in later
+            batches
+        batcher : :class:`~revscoring.extractors.api.batcher.AdaptiveBatcher`
+            Chooses how many revisions and users to request at once.  The
+            batches of a lookup are requested concurrently.
+        coalesce_window : `float`
+            How long (in seconds) a revision or user lookup waits to be merged
+            with concurrent lookups (e.g. from pipelined batches) before it is
+            sent.  Keys that are already being looked up are never requested
+            twice.
+    """
+
+    def __init__(self, host, user_agent=None, api_path=None, timeout=None,
+                 context=None, cache=None, persistent_cache=None,
+                 batch_size=50, pipeline=2, connections=10, doc_cache=None,
+                 rev_doc_window=100, batcher=None, coalesce_window=0.0):
+        if aiohttp is None:
+            raise ImportError("AsyncExtractor requires aiohttp.  " +
+                              "Try `pip install aiohttp`.")
+        super().__init__(None, context=context, cache=cache,
+                         persistent_cache=persistent_cache,
+                         doc_cache=doc_cache, rev_doc_window=rev_doc_window,
+                         batcher=batcher, coalesce_window=coalesce_window)
+        self.host = str(host)
+        self.user_agent = user_agent
+        self.api_path = api_path
+        self.timeout = timeout
+        self.batch_size = int(batch_size)
+        self.pipeline = int(pipeline)
+        self.connections = int(connections)
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="AsyncExtractor",
+                    daemon=True)
+                thread.start()
+                self.session = asyncio.run_coroutine_threadsafe(
+                    self._open_session(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        return mwapi.AsyncSession(
+            self.host, user_agent=self.user_agent, api_path=self.api_path,
+            timeout=self.timeout,
+            session=aiohttp.ClientSession(connector=connector))
+
+    def _run(self, coroutine):
+        loop = self._get_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def close(self):
+        """
+        Closes the HTTP client and stops the event loop.
+        """
+        with self._lock:
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self.session.session.close(), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                self.session = None
+
+    def _extract_many(self, rev_ids, dependents, context, caches, cache,
+                      profile):
+        all_dependents = self.expansion(dependents, context).dependents
+        rev_ids = list(rev_ids)
+
+        caches = caches if caches is not None else {}
+        caches.update({rev_id: {} for rev_id in rev_ids
+                       if rev_id not in caches})
+        for rev_id, rev_cache in caches.items():
+            for dependent, value in (cache or {}).items():
+                if dependent not in rev_cache:
+                    rev_cache[dependent] = value
+
+        # Documents for the next batches are requested while the current
+        # batch is being solved.
+        batches = iter(chunked(rev_ids, self.batch_size))
+        pending = deque()
+
+        def request_next_batch():
+            for batch in batches:
+                # The event loop works with copies of the caches
+                lookups = {rev_id: dict(caches[rev_id]) for rev_id in batch}
+                future = asyncio.run_coroutine_threadsafe(
+                    self._prefetch(lookups, all_dependents), self._get_loop())
+                pending.append((batch, future))
+                break
+
+        for _ in range(max(1, self.pipeline)):
+            request_next_batch()
+
+        while len(pending) > 0:
+            batch, future = pending.popleft()
+            docs, errored = future.result()
+            request_next_batch()
+
+            for rev_id, rev_docs in docs.items():
+                caches[rev_id].update(rev_docs)
+
+            rev_ids_to_solve = [rev_id for rev_id in batch
+                                if rev_id not in errored]
+            error_values = self._extract_batch(
+                rev_ids_to_solve, dependents, context=context,
+                caches=[caches[rev_id] for rev_id in rev_ids_to_solve],
+                profile=profile)
+            extractions = dict(zip(rev_ids_to_solve, error_values))
+
+            for rev_id in batch:
+                if rev_id in errored:
+                    yield errored[rev_id], None
+                else:
+                    yield extractions[rev_id]
+
+    async def _prefetch(self, lookups, all_dependents):
+        """
+        Requests the documents that a batch of revisions needs.  Returns a
+        `dict` of rev_id --> {datasource: document} and a `dict` of rev_id -->
+        error.
+        """
+        docs = {rev_id: {} for rev_id in lookups}
+        errored = {}
+        if not self.revision & all_dependents:
+            return docs, errored
+
+        # Only request the fields that the dependents will read
+        rvprop = rev_props(self.revision, all_dependents)
+
+        # datasource.revision.doc
+        lookup_rev_ids = {
+            rev_id: lookup.get(revision_oriented.revision.id, rev_id)
+            for rev_id, lookup in lookups.items()
+            if self.revision.doc not in lookup}
+        logger.info("Batch requesting {0} revision from the API"
+                    .format(len(lookup_rev_ids)))
+        requested_rev_docs = await self._get_rev_doc_map(
+            set(lookup_rev_ids.values()), rvprop)
+        self._remember_rev_docs(requested_rev_docs, rvprop)
+        for rev_id, lookup_rev_id in lookup_rev_ids.items():
+            if lookup_rev_id in requested_rev_docs:
+                docs[rev_id][self.revision.doc] = \
+                    requested_rev_docs[lookup_rev_id]
+            else:
+                errored[rev_id] = RevisionNotFound(self.revision,
+                                                   lookup_rev_id)
+
+        rev_docs = {}
+        for rev_id, lookup in lookups.items():
+            rev_doc = docs[rev_id].get(self.revision.doc,
+                                       lookup.get(self.revision.doc))
+            if rev_id not in errored and rev_doc is not None:
+                rev_docs[rev_id] = rev_doc
+
+        # The rest of the documents only depend on the revision documents
+        prefetches = []
+        if self.revision.parent & all_dependents:
+            prefetches.append(self._prefetch_parents(
+                lookups, rev_docs, requested_rev_docs, rvprop,
+                rev_props(self.revision.parent, all_dependents), docs,
+                errored))
+        if self.revision.user.info & all_dependents:
+            prefetches.append(self._prefetch_user_info(
+                lookups, rev_docs,
+                user_props(self.revision.user.info, all_dependents), docs,
+                errored))
+        if self.revision.page.creation & all_dependents:
+            prefetches.append(self._prefetch_page_creations(
+                lookups, rev_docs, all_dependents, docs, errored))
+        if self.revision.user.last_revision & all_dependents:
+            prefetches.append(self._prefetch_last_user_revisions(
+                lookups, rev_docs,
+                rev_props(self.revision.user.last_revision, all_dependents) &
+                CONTRIB_PROPS, docs))
+        await asyncio.gather(*prefetches)
+
+        return docs, errored
+
+    async def _prefetch_parents(self, lookups, rev_docs, requested_rev_docs,
+                                requested_rvprop, rvprop, docs, errored):
+        parent_ids = {
+            rev_id: lookups[rev_id].get(revision_oriented.revision.parent.id,
+                                        rev_doc.get('parentid'))
+            for rev_id, rev_doc in rev_docs.items()
+            if self.revision.parent.doc not in lookups[rev_id]}
+        # Consecutive edits to a page don't need their parents requested
+        # again
+        parent_rev_docs = self._reuse_rev_docs(
+            parent_ids.values(), rvprop, requested_rev_docs, requested_rvprop)
+        parent_ids_to_lookup = {parent_id for parent_id in parent_ids.values()
+                                if parent_id and
+                                parent_id not in parent_rev_docs}
+        logger.info("Batch requesting {0} revision.parent from the API"
+                    .format(len(parent_ids_to_lookup)) +
+                    " ({0} reused)".format(len(parent_rev_docs)))
+        requested_parent_docs = await self._get_rev_doc_map(
+            parent_ids_to_lookup, rvprop)
+        self._remember_rev_docs(requested_parent_docs, rvprop)
+        parent_rev_docs.update(requested_parent_docs)
+
+        for rev_id, parent_id in parent_ids.items():
+            if parent_id in parent_rev_docs:
+                docs[rev_id][self.revision.parent.doc] = \
+                    parent_rev_docs[parent_id]
+            elif parent_id == 0:
+                docs[rev_id][self.revision.parent.doc] = None
+            else:
+                errored[rev_id] = RevisionNotFound(self.revision.parent,
+                                                   parent_id)
+
+    async def _prefetch_user_info(self, lookups, rev_docs, usprop, docs,
+                                  errored):
+        user_texts = {
+            rev_id: rev_doc.get('user')
+            for rev_id, rev_doc in rev_docs.items()
+            if self.revision.user.info.doc not in lookups[rev_id] and
+            rev_doc.get('userid', 0) > 0}
+        logger.info("Batch requesting {0} revision.user.info from the API"
+                    .format(len(set(user_texts.values()))))
+        user_info_docs = await self._get_user_doc_map(
+            set(user_texts.values()), usprop)
+
+        for rev_id, user_text in user_texts.items():
+            if user_text in user_info_docs:
+                docs[rev_id][self.revision.user.info.doc] = \
+                    user_info_docs[user_text]
+            else:
+                errored[rev_id] = UserNotFound(self.revision.user, user_text)
+
+    async def _prefetch_page_creations(self, lookups, rev_docs,
+                                       all_dependents, docs, errored):
+        rvprop = rev_props(self.revision.page.creation, all_dependents)
+
+        page_ids = {
+            rev_id: rev_doc['page']['pageid']
+            for rev_id, rev_doc in rev_docs.items()
+            if self.revision.page.creation.doc not in lookups[rev_id] and
+            'pageid' in rev_doc.get('page', {})}
+        unique_page_ids = list(set(page_ids.values()))
+        logger.info("Requesting {0} revision.page.creation from the API"
+                    .format(len(unique_page_ids)))
+        creation_docs = _lookup_results(unique_page_ids, await asyncio.gather(
+            *(self._get_page_creation_doc(page_id, rvprop)
+              for page_id in unique_page_ids), return_exceptions=True))
+
+        for rev_id, page_id in page_ids.items():
+            # Pages whose lookup failed are left for the datasource
+            if page_id not in creation_docs:
+                continue
+            elif creation_docs[page_id] is None:
+                errored[rev_id] = PageNotFound(self.revision.page, page_id)
+            else:
+                docs[rev_id][self.revision.page.creation.doc] = \
+                    creation_docs[page_id]
+
+    async def _prefetch_last_user_revisions(self, lookups, rev_docs, ucprop,
+                                            docs):
+        user_timestamps = {
+            rev_id: (rev_doc['user'], rev_doc['timestamp'])
+            for rev_id, rev_doc in rev_docs.items()
+            if self.revision.user.last_revision.doc not in lookups[rev_id] and
+            'user' in rev_doc and 'timestamp' in rev_doc}
+        unique_user_timestamps = list(set(user_timestamps.values()))
+        logger.info("Requesting {0} revision.user.last_revision from the API"
+                    .format(len(unique_user_timestamps)))
+        last_rev_docs = _lookup_results(
+            unique_user_timestamps, await asyncio.gather(
+                *(self._get_user_last_revision(
+                    user_text, mwtypes.Timestamp(timestamp), ucprop)
+                  for user_text, timestamp in unique_user_timestamps),
+                return_exceptions=True))
+
+        for rev_id, user_timestamp in user_timestamps.items():
+            if user_timestamp in last_rev_docs:
+                docs[rev_id][self.revision.user.last_revision.doc] = \
+                    last_rev_docs[user_timestamp]
+
+    def get_rev_doc_map(self, rev_ids, rvprop={'ids', 'user', 'timestamp',
+                                               'userid', 'comment', 'content',
+                                               'flags', 'size'}):
+        return self._run(self._get_rev_doc_map(rev_ids, rvprop))
+
+    async def _get_rev_doc_map(self, rev_ids, rvprop):
+        if len(rev_ids) == 0:
+            return {}
+
+        logger.debug("Building a map of {0} revisions: {1}"
+                     .format(len(rev_ids), rev_ids))
+        single_flight = self._get_single_flight(
+            'revisions', self._query_rev_doc_map_async, rvprop,
+            single_flight_class=AsyncSingleFlight)
+        return await single_flight.get_many(rev_ids)
+
+    async def _query_rev_doc_map_async(self, rev_ids, props):
+        # See Extractor._query_rev_doc_map()
+        sizes = None
+        if 'content' in props and len(rev_ids) > 1 and \
+           self.batcher.max_bytes is not None:
+            sizes = self._known_sizes(rev_ids)
+            unknown_ids = [rev_id for rev_id in rev_ids
+                           if rev_id not in sizes]
+            if len(unknown_ids) > 0:
+                size_docs = await self._query_revisions_by_revids(
+                    unknown_ids, rvprop={'ids', 'size'})
+                self._remember_sizes(size_docs)
+                sizes.update((rd['revid'], rd.get('size', 0))
+                             for rd in size_docs)
+        rev_docs = await self._query_revisions_by_revids(
+            rev_ids, sizes=sizes, rvprop=props)
+        self._remember_sizes(rev_docs)
+        return {rd['revid']: rd for rd in rev_docs}
+
+    async def _query_revisions_by_revids(self, revids, sizes=None,
+                                         **params):
+        async def query(batch_ids):
+            page_docs = await self._query_pages(revids=batch_ids, **params)
+            return [rev_doc for page_doc in page_docs
+                    for rev_doc in _normalize_revisions(page_doc)]
+
+        if 'content' in params.get('rvprop', ()):
+            kind = "revisions.content"
+        else:
+            kind = "revisions"
+        return await self.batcher.request_async(kind, revids, query,
+                                                sizes=sizes)
+
+    async def _query_pages(self, **params):
+        doc = await self.session.get(action='query', prop='revisions',
+                                     rvslots='main', **params)
+        return list(doc['query'].get('pages', {}).values())
+
+    def get_user_doc_map(self, user_texts,
+                         usprop={'groups', 'registration', 'emailable',
+                                 'editcount', 'gender'}):
+        return self._run(self._get_user_doc_map(user_texts, usprop))
+
+    async def _get_user_doc_map(self, user_texts, usprop):
+        user_docs, user_texts = self._recall_docs('user', user_texts, usprop)
+        if len(user_texts) == 0:
+            return user_docs
+
+        logger.debug("Building a map of {0} user.info.docs"
+                     .format(len(user_texts)))
+        single_flight = self._get_single_flight(
+            'users', self._query_user_doc_map_async, usprop,
+            single_flight_class=AsyncSingleFlight)
+        found_docs = await single_flight.get_many(user_texts)
+        self._remember_docs('user', user_texts, usprop, found_docs)
+        user_docs.update(found_docs)
+        return user_docs
+
+    async def _query_user_doc_map_async(self, user_texts, props):
+        async def query(batch_texts):
+            doc = await self.session.get(action='query', list='users',
+                                         ususers=batch_texts, usprop=props)
+            return doc['query'].get('users', [])
+
+        user_docs = await self.batcher.request_async("users", user_texts,
+                                                     query)
+        return {user_doc['name']: user_doc for user_doc in user_docs}
+
+    def get_user_last_revision(self, user_text, rev_timestamp,
+                               ucprop={'ids', 'timestamp', 'comment', 'size'}):
+        return self._run(
+            self._get_user_last_revision(user_text, rev_timestamp, ucprop))
+
+    async def _get_user_last_revision(self, user_text, rev_timestamp, ucprop):
+        if user_text is None or rev_timestamp is None:
+            return None
+
+        key = (user_text, str(rev_timestamp))
+        docs, _ = self._recall_docs('last_user_revision', [key], ucprop)
+        if key in docs:
+            return docs[key]
+
+        rev_doc = await self._request_user_last_revision(
+            user_text, rev_timestamp, ucprop)
+        # It's OK to not find a revision here, so `None` is remembered too.
+        self._remember_docs('last_user_revision', [key], ucprop,
+                            {key: rev_doc})
+        return rev_doc
+
+    async def _request_user_last_revision(self, user_text, rev_timestamp,
+                                          ucprop):
+        logger.debug("Requesting the last revision by {0} from the API"
+                     .format(user_text))
+        doc = await self.session.get(action="query", list="usercontribs",
+                                     ucuser=user_text, ucprop=ucprop,
+                                     uclimit=1, ucdir="older",
+                                     ucstart=(rev_timestamp - 1))
+
+        rev_docs = doc['query']['usercontribs']
+
+        if len(rev_docs) > 0:
+            return rev_docs[0]
+        else:
+            # It's OK to not find a revision here.
+            return None
+
+    def get_page_creation_doc(self, page_id,
+                              rvprop={'ids', 'user', 'timestamp', 'userid',
+                                      'comment', 'flags', 'size'}):
+        return self._run(self._get_page_creation_doc(page_id, rvprop))
+
+    async def _get_page_creation_doc(self, page_id, rvprop):
+        if page_id is None:
+            return None
+
+        docs, page_ids = self._recall_docs('page_creation', [page_id], rvprop)
+        if len(page_ids) == 0:
+            return docs.get(page_id)
+
+        rev_doc = await self._request_page_creation_doc(page_id, rvprop)
+        self._remember_docs('page_creation', [page_id], rvprop,
+                            {page_id: rev_doc} if rev_doc is not None else {})
+        return rev_doc
+
+    async def _request_page_creation_doc(self, page_id, rvprop):
+        logger.debug("Requesting creation revision for ({0}) from the API"
+                     .format(page_id))
+        page_docs = await self._query_pages(pageids=page_id, rvdir="newer",
+                                            rvlimit=1, rvprop=rvprop)
+        for page_doc in page_docs:
+            rev_docs = page_doc.get('revisions', [])
+            if len(rev_docs) == 1:
+                return rev_docs[0]
+
+        # This is bad, but it should be handled by the calling funcion
+        return None
+
+    def get_property_suggestion_doc(self, entity_id):
+        return self._run(self._get_property_suggestion_doc(entity_id))
+
+    async def _get_property_suggestion_doc(self, entity_id):
+        if entity_id is None:
+            return None
+
+        docs, entity_ids = self._recall_docs(
+            'property_suggestion', [entity_id], ())
+        if len(entity_ids) == 0:
+            return docs.get(entity_id)
+
+        search_doc = await self._request_property_suggestion_doc(entity_id)
+        self._remember_docs(
+            'property_suggestion', [entity_id], (),
+            {entity_id: search_doc} if search_doc is not None else {})
+        return search_doc
+
+    async def _request_property_suggestion_doc(self, entity_id):
+        logger.debug("Requesting property suggestions for ({0}) from the API"
+                     .format(entity_id))
+        try:
+            doc = await self.session.get(
+                action='wbsgetsuggestions', entity=entity_id, include='all',
+                limit=50)
+        except (mwapi.errors.APIError, mwapi.errors.RequestError) as e:
+            api_error = _api_error(e)
+            if api_error is None:
+                raise
+            elif api_error.code == "unknown_action":
+                raise QueryNotSupported(api_error.info)
+            else:
+                # Any other error should be a missing entity
+                return None
+
+        return doc['search']
+
+    # The event loop and HTTP client can't be shared between processes
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_lock'] = None
+        state['_loop'] = None
+        state['session'] = None
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, name, section_key="extractors"):
+        logger.info("Loading api.AsyncExtractor '{0}' from config."
+                    .format(name))
+        section = config[section_key][name]
+        kwargs = {k: v for k, v in section.items()
+                  if k not in ("class", "persistent_cache", "doc_cache",
+                               "batcher")}
+        if 'persistent_cache' in section:
+            kwargs['persistent_cache'] = \
+                PersistentCache(**section['persistent_cache'])
+        if 'doc_cache' in section:
+            kwargs['doc_cache'] = DocCache(**section['doc_cache'])
+        if 'batcher' in section:
+            kwargs['batcher'] = AdaptiveBatcher(**section['batcher'])
+        return cls(**kwargs)
+
+
+def _lookup_results(keys, results):
+    # Lookups that failed are left out so that the revisions that need them
+    # look them up again (and fail) when they are solved
+    docs = {}
+    for key, result in zip(keys, results):
+        if isinstance(result, LOOKUP_ERRORS):
+            logger.warning("Lookup of {0} failed: {1}".format(key, result))
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            docs[key] = result
+    return docs
+
+
+def _api_error(error):
+    # mwapi.AsyncSession wraps the APIErrors that the API returns in a
+    # RequestError
+    if isinstance(error, mwapi.errors.APIError):
+        return error
+    elif isinstance(error.__cause__, mwapi.errors.APIError):
+        return error.__cause__
+    else:
+        return None
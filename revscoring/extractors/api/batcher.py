@@ -0,0 +1,258 @@
+"""
+.. autoclass:: revscoring.extractors.api.batcher.AdaptiveBatcher
+    :members:
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import mwapi.errors
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_CODES = {'maxlag', 'ratelimited'}
+"""
+API error codes that mean that a request should be retried later
+"""
+
+
+class AdaptiveBatcher:
+    """
+    Chooses how many items (e.g. rev_ids or user names) to request from the
+    API at once.  Batches of each kind of request start at `max_size`.  A
+    batch that takes longer than `target_latency` halves the size of the
+    following batches and batches that are quick grow them back by a quarter.
+    A batch that times out is split in half and retried.  Requests that get a
+    `maxlag` or `ratelimited` error are retried after an increasing wait.
+
+    If the (estimated) byte sizes of the items are known (e.g. for requests
+    with `content`), batches are also cut so that their total doesn't exceed
+    `max_bytes`.
+
+    :Parameters:
+        max_size : `int`
+            The largest batch to request (the API allows 50 ids per request)
+        min_size : `int`
+            The smallest batch to shrink to
+        max_bytes : `int`
+            The maximum total size of content to request at once.  Set to
+            `None` to only size batches by count.
+        target_latency : `float`
+            How long (in seconds) a request should take
+        backoff : `float`
+            How long (in seconds) to wait before the first retry of a request
+            that got a `maxlag` or `ratelimited` error
+        max_retries : `int`
+            How many times to retry such a request before giving up
+
+    :Attributes:
+        sizes : `dict` ( `str` : `int` )
+            The current batch size per kind of request
+    """
+
+    def __init__(self, max_size=50, min_size=1, max_bytes=8000000,
+                 target_latency=5.0, backoff=1.0, max_retries=3):
+        self.max_size = int(max_size)
+        self.min_size = int(min_size)
+        self.max_bytes = int(max_bytes) if max_bytes is not None else None
+        self.target_latency = float(target_latency)
+        self.backoff = float(backoff)
+        self.max_retries = int(max_retries)
+        self._open()
+
+    def _open(self):
+        self.lock = threading.Lock()
+        self.sizes = {}
+        # Observations are kept per thread so that concurrent callers only
+        # drain the requests that they made
+        self.local = threading.local()
+
+    def size(self, kind):
+        """
+        Returns the current batch size for a kind of request.
+        """
+        return self.sizes.get(kind, self.max_size)
+
+    def batches(self, kind, items, sizes=None):
+        """
+        Splits `items` into batches.  Each batch is cut at the current size for
+        `kind`, so batches adapt as requests are observed.
+
+        :Parameters:
+            kind : `str`
+                The kind of request (e.g. "revisions")
+            items : `iterable`
+                The items to request
+            sizes : `dict`
+                The estimated byte size of items.  Items that are missing
+                count as 0 bytes.
+        """
+        batch = []
+        batch_bytes = 0
+        for item in items:
+            item_bytes = sizes.get(item, 0) if sizes is not None else 0
+            if len(batch) > 0 and \
+               (len(batch) >= self.size(kind) or
+                    (self.max_bytes is not None and
+                     batch_bytes + item_bytes > self.max_bytes)):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(item)
+            batch_bytes += item_bytes
+
+        if len(batch) > 0:
+            yield batch
+
+    def request(self, kind, items, query, sizes=None):
+        """
+        Requests `items` in adaptive batches and yields from the results.
+
+        :Parameters:
+            kind : `str`
+                The kind of request (e.g. "revisions")
+            items : `iterable`
+                The items to request
+            query : `func`
+                A function that takes a `list` of items and returns an
+                iterable of results
+            sizes : `dict`
+                The estimated byte size of items
+        """
+        for batch in self.batches(kind, items, sizes=sizes):
+            yield from self._request(kind, batch, query, sizes)
+
+    def _request(self, kind, batch, query, sizes):
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                results = list(query(batch))
+            except mwapi.errors.TimeoutError:
+                if not self._split(kind, batch):
+                    raise
+                middle = len(batch) // 2
+                return (self._request(kind, batch[:middle], query, sizes) +
+                        self._request(kind, batch[middle:], query, sizes))
+            except mwapi.errors.APIError as e:
+                wait = self._backoff(kind, batch, e, attempt)
+                if wait is None:
+                    raise
+                time.sleep(wait)
+            else:
+                duration = time.perf_counter() - start
+                self._observe(kind, batch, duration, sizes)
+                return results
+
+    async def request_async(self, kind, items, query, sizes=None):
+        """
+        Requests `items` in adaptive batches from an event loop.  The batches
+        are requested concurrently.  Returns a `list` of the results.
+
+        :Parameters:
+            kind : `str`
+                The kind of request (e.g. "revisions")
+            items : `iterable`
+                The items to request
+            query : `func`
+                A coroutine function that takes a `list` of items and returns
+                an iterable of results
+            sizes : `dict`
+                The estimated byte size of items
+
+        Requests that are made from an event loop are not recorded for
+        :meth:`drain` since the loop is shared by all callers.
+        """
+        batch_results = await asyncio.gather(
+            *(self._request_async(kind, batch, query, sizes)
+              for batch in self.batches(kind, items, sizes=sizes)))
+        return [result for results in batch_results for result in results]
+
+    async def _request_async(self, kind, batch, query, sizes):
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                results = list(await query(batch))
+            except mwapi.errors.TimeoutError:
+                if not self._split(kind, batch):
+                    raise
+                middle = len(batch) // 2
+                return (
+                    await self._request_async(kind, batch[:middle], query,
+                                              sizes) +
+                    await self._request_async(kind, batch[middle:], query,
+                                              sizes))
+            except (mwapi.errors.APIError, mwapi.errors.RequestError) as e:
+                wait = self._backoff(kind, batch, e, attempt)
+                if wait is None:
+                    raise
+                await asyncio.sleep(wait)
+            else:
+                duration = time.perf_counter() - start
+                self._observe(kind, batch, duration, sizes, record=False)
+                return results
+
+    def _split(self, kind, batch):
+        # Returns whether a batch that timed out can be split and retried
+        self._shrink(kind, len(batch))
+        if len(batch) <= 1:
+            return False
+        logger.info("Request for {0} {1} timed out.  Splitting."
+                    .format(len(batch), kind))
+        return True
+
+    def _backoff(self, kind, batch, error, attempt):
+        # Returns how long to wait before retrying or None to give up.
+        # mwapi.AsyncSession wraps APIErrors in a RequestError.
+        if not isinstance(error, mwapi.errors.APIError):
+            error = error.__cause__
+        if not isinstance(error, mwapi.errors.APIError) or \
+           error.code not in BACKOFF_CODES or attempt >= self.max_retries:
+            return None
+        self._shrink(kind, len(batch))
+        wait = self.backoff * 2 ** attempt
+        logger.info("Got {0} when requesting {1}.  Waiting {2} seconds."
+                    .format(error.code, kind, wait))
+        return wait
+
+    def _observe(self, kind, batch, duration, sizes, record=True):
+        batch_bytes = sum(sizes.get(item, 0) for item in batch) \
+            if sizes is not None else None
+        if record:
+            self._log().append((kind, len(batch), batch_bytes, duration))
+        with self.lock:
+            if duration > self.target_latency:
+                self.sizes[kind] = max(self.min_size, len(batch) // 2)
+            elif duration < self.target_latency / 2 and \
+                    len(batch) >= self.size(kind):
+                size = self.size(kind)
+                self.sizes[kind] = min(self.max_size, size + max(1, size // 4))
+
+    def _shrink(self, kind, batch_size):
+        with self.lock:
+            self.sizes[kind] = max(self.min_size, batch_size // 2)
+
+    def _log(self):
+        if not hasattr(self.local, 'log'):
+            self.local.log = []
+        return self.local.log
+
+    def drain(self):
+        """
+        Returns and forgets the (kind, size, bytes, seconds) of the requests
+        that were made by the calling thread since its last call.
+        """
+        log = self._log()
+        self.local.log = []
+        return log
+
+    # Locks and observations aren't shared between processes
+    def __getstate__(self):
+        return {'max_size': self.max_size, 'min_size': self.min_size,
+                'max_bytes': self.max_bytes,
+                'target_latency': self.target_latency,
+                'backoff': self.backoff, 'max_retries': self.max_retries}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
@@ -0,0 +1,183 @@
+"""
+Records :class:`mwapi.Session` requests and responses to a local "cassette"
+file and replays them, so that an
+:class:`~revscoring.extractors.api.Extractor` can be benchmarked without a
+network and against a fixed state of the wiki.
+
+.. autoclass:: revscoring.extractors.api.cassette.RecordingSession
+    :members:
+
+.. autoclass:: revscoring.extractors.api.cassette.ReplaySession
+    :members:
+
+.. autoclass:: revscoring.extractors.api.cassette.RequestNotRecorded
+"""
+import gzip
+import json
+import threading
+import time
+
+import mwapi
+import mwapi.errors
+
+
+class RequestNotRecorded(KeyError):
+    """
+    Raised by :class:`~revscoring.extractors.api.cassette.ReplaySession` when
+    a request isn't in the cassette.
+    """
+
+
+class RecordingSession:
+    """
+    Wraps a :class:`mwapi.Session` and appends each request, its response
+    and how long it took to a gzipped JSON lines cassette file.  Use it in
+    place of the wrapped session (e.g.
+    ``Extractor(RecordingSession(mwapi.Session(host), "enwiki.cassette"))``)
+    and :meth:`close` it when done.
+
+    :Parameters:
+        session : :class:`mwapi.Session`
+            The session to send requests with
+        path : `str`
+            The cassette file to write.  An existing file is appended to.
+    """
+
+    def __init__(self, session, path):
+        self.session = session
+        self.path = path
+        self.lock = threading.Lock()
+        self.f = gzip.open(path, 'at', encoding='utf-8')
+        self.requests = 0
+
+    def get(self, **params):
+        return self.request('GET', params)
+
+    def post(self, **params):
+        return self.request('POST', params)
+
+    def request(self, method, params):
+        normalized_params = normalize_params(params)
+        start = time.perf_counter()
+        try:
+            doc = self.session.request(method, params=params)
+        except mwapi.errors.APIError as e:
+            self._write(method, normalized_params, start, error={
+                'code': e.code, 'info': e.info, 'content': e.content})
+            raise
+        else:
+            self._write(method, normalized_params, start, doc=doc)
+            return doc
+
+    def _write(self, method, normalized_params, start, **response):
+        line = json.dumps(dict(
+            method=method, params=normalized_params,
+            duration=round(time.perf_counter() - start, 4), **response))
+        with self.lock:
+            self.f.write(line + "\n")
+            self.requests += 1
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplaySession:
+    """
+    Implements the part of the :class:`mwapi.Session` interface that
+    :class:`~revscoring.extractors.api.Extractor` uses by serving responses
+    from a cassette written by
+    :class:`~revscoring.extractors.api.cassette.RecordingSession`.  If a
+    request was recorded more than once, the last response is served.
+
+    :Parameters:
+        path : `str`
+            The cassette file to read
+        latency : `float` | "recorded"
+            How long (in seconds) to wait before responding to each request.
+            Set to "recorded" to wait as long as the recorded request took.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.responses = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                response = json.loads(line)
+                key = request_key(response.pop('method'),
+                                  response.pop('params'))
+                self.responses[key] = response
+        self.requests = 0
+
+    def get(self, **params):
+        return self.request('GET', params)
+
+    def post(self, **params):
+        return self.request('POST', params)
+
+    def request(self, method, params):
+        normalized_params = normalize_params(params)
+        response = self.responses.get(request_key(method, normalized_params))
+        if response is None:
+            raise RequestNotRecorded(
+                "{0} {1}".format(method, normalized_params))
+        self.requests += 1
+
+        if self.latency == "recorded":
+            time.sleep(response['duration'])
+        elif self.latency > 0:
+            time.sleep(self.latency)
+
+        if 'error' in response:
+            error = response['error']
+            raise mwapi.errors.APIError(error['code'], error['info'],
+                                        error['content'])
+        else:
+            # Callers may modify the docs they get back
+            return json.loads(json.dumps(response['doc']))
+
+
+def from_config(section, session_kwargs):
+    """
+    Constructs a session from the `cassette` section of an extractor's
+    config.  `mode` is "record" or "replay".
+    """
+    mode = section.get('mode', "replay")
+    if mode == "record":
+        return RecordingSession(mwapi.Session(**session_kwargs),
+                                section['path'])
+    elif mode == "replay":
+        return ReplaySession(section['path'],
+                             latency=section.get('latency', 0.0))
+    else:
+        raise ValueError("Unknown cassette mode {0}".format(repr(mode)))
+
+
+def normalize_params(params):
+    """
+    Converts request parameters into the strings that would be sent.
+    Multi-valued parameters (e.g. `revids` and `ususers`) are sorted so that
+    keys don't depend on hash order.  Extractors build their lists of ids by
+    iterating over sets.
+    """
+    normalized = {}
+    for key, value in params.items():
+        if value is None or value is False:
+            continue
+        elif value is True:
+            value = ""
+        elif isinstance(value, (set, frozenset, list, tuple)):
+            value = "|".join(sorted(str(v) for v in value))
+        normalized[key] = str(value)
+    return normalized
+
+
+def request_key(method, normalized_params):
+    return method, tuple(sorted(normalized_params.items()))
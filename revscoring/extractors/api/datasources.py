@@ -1,7 +1,7 @@
 from ...datasources import Datasource
 from ...errors import (EntityNotFound, PageNotFound, RevisionNotFound,
                        UserNotFound)
-from .util import REV_PROPS, USER_PROPS
+from .util import CONTRIB_PROPS, rev_props, user_props
 
 
 class RevDocById(Datasource):
@@ -16,11 +16,7 @@ class RevDocById(Datasource):
         if rev_id == 0:
             return None
 
-        rvprop = set(REV_PROPS)
-
-        if self.revision.text in dependents:
-            rvprop.add('content')
-
+        rvprop = rev_props(self.revision, dependents)
         rev_doc_map = self.extractor.get_rev_doc_map([rev_id], rvprop=rvprop)
 
         if rev_id not in rev_doc_map:
@@ -38,11 +34,7 @@ class PageCreationRevDoc(Datasource):
                          depends_on=[page.id, extractor.dependents])
 
     def process(self, page_id, dependents):
-        rvprop = set(REV_PROPS)
-
-        if self.page.creation.text in dependents:
-            rvprop.add('content')
-
+        rvprop = rev_props(self.page.creation, dependents)
         rev_doc = self.extractor.get_page_creation_doc(page_id, rvprop=rvprop)
 
         # If we didn't find a revision for page creation, this is bad.  Error.
@@ -78,14 +70,15 @@ class UserInfoDoc(Datasource):
         self.user = user
         self.extractor = extractor
         super().__init__(user.info._name + ".doc", self.process,
-                         depends_on=[user.id, user.text])
+                         depends_on=[user.id, user.text,
+                                     extractor.dependents])
 
-    def process(self, user_id, user_text):
+    def process(self, user_id, user_text, dependents):
         if user_id == 0:
             return None  # Doesn't work for anons
         else:
-            user_doc_map = self.extractor.get_user_doc_map([user_text],
-                                                           usprop=USER_PROPS)
+            user_doc_map = self.extractor.get_user_doc_map(
+                [user_text], usprop=user_props(self.user.info, dependents))
 
             if user_text not in user_doc_map:
                 raise UserNotFound(self.user, user_text)
@@ -105,10 +98,7 @@ class LastUserRevDoc(Datasource):
         )
 
     def process(self, user_text, rev_timestamp, dependents):
-        ucprop = set(REV_PROPS)
-
-        if self.revision.user.last_revision.text in dependents:
-            ucprop.add('text')
-
-        return self.extractor.get_last_user_revision(user_text, rev_timestamp,
+        ucprop = rev_props(self.revision.user.last_revision, dependents) & \
+            CONTRIB_PROPS
+        return self.extractor.get_user_last_revision(user_text, rev_timestamp,
                                                      ucprop=ucprop)
@@ -0,0 +1,131 @@
+"""
+.. autoclass:: revscoring.extractors.api.doc_cache.DocCache
+    :members:
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from ...dependencies.store import MISSING
+
+
+class NotFoundType:
+    def __repr__(self):
+        return "NOT_FOUND"
+
+    def __reduce__(self):
+        return (_get_not_found, ())
+
+
+NOT_FOUND = NotFoundType()
+"""
+Returned by :meth:`~revscoring.extractors.api.doc_cache.DocCache.get` when a
+document was recently looked up and not found.
+"""
+
+
+def _get_not_found():
+    return NOT_FOUND
+
+
+class DocCache:
+    """
+    Implements a bounded, thread-safe, least-recently-used cache of API
+    documents that change slowly or not at all (e.g. user info and page
+    creation revisions).  Documents expire `ttl` seconds after they were
+    stored.  Lookups that found nothing (e.g. a
+    :class:`~revscoring.errors.UserNotFound`) are remembered for
+    `negative_ttl` seconds.
+
+    :Parameters:
+        max_size : `int`
+            The maximum number of documents to hold
+        ttl : `float`
+            How long (in seconds) a document is kept
+        negative_ttl : `float`
+            How long (in seconds) a failed lookup is kept
+
+    :Attributes:
+        hits : `dict` ( `str` : `int` )
+            The number of documents that were found per kind
+        misses : `dict` ( `str` : `int` )
+            The number of documents that were not found per kind
+        evictions : `int`
+            The number of documents that were evicted to stay under `max_size`
+    """
+
+    def __init__(self, max_size=10000, ttl=600, negative_ttl=60):
+        self.max_size = int(max_size)
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self._open()
+
+    def _open(self):
+        self.lock = threading.Lock()
+        self.docs = OrderedDict()  # (kind, key) --> (expires, doc)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.evictions = 0
+
+    def get(self, kind, key):
+        """
+        Gets a document.  Returns
+        :data:`~revscoring.dependencies.store.MISSING` if the document isn't
+        cached or has expired and
+        :data:`~revscoring.extractors.api.doc_cache.NOT_FOUND` if it was
+        recently looked up and not found.
+        """
+        with self.lock:
+            expires, doc = self.docs.get((kind, key), (None, MISSING))
+            if doc is not MISSING and expires <= time.monotonic():
+                del self.docs[(kind, key)]
+                doc = MISSING
+
+            if doc is MISSING:
+                self.misses[kind] += 1
+            else:
+                self.docs.move_to_end((kind, key))
+                self.hits[kind] += 1
+            return doc
+
+    def set(self, kind, key, doc):
+        """
+        Stores a document.  Store
+        :data:`~revscoring.extractors.api.doc_cache.NOT_FOUND` to remember a
+        failed lookup.
+        """
+        if self.max_size <= 0:
+            return
+        ttl = self.negative_ttl if doc is NOT_FOUND else self.ttl
+        with self.lock:
+            self.docs[(kind, key)] = (time.monotonic() + ttl, doc)
+            self.docs.move_to_end((kind, key))
+            while len(self.docs) > self.max_size:
+                self.docs.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Returns a `dict` of hit/miss statistics.
+        """
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        return {
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'hit_rate': hits / lookups if lookups > 0 else 0.0,
+            'evictions': self.evictions,
+            'size': len(self.docs)
+        }
+
+    def __len__(self):
+        return len(self.docs)
+
+    # Cached documents aren't shared between processes
+    def __getstate__(self):
+        return {'max_size': self.max_size, 'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
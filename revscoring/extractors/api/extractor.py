@@ -1,23 +1,93 @@
 import logging
-from itertools import islice
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import mwapi
+import mwtypes
+from more_itertools import chunked
 
 from ...datasources import Datasource, revision_oriented
-from ...dependencies import expand
-from ...errors import QueryNotSupported, RevisionNotFound, UserNotFound
+from ...dependencies import PersistentCache
+from ...dependencies.store import MISSING
+from ...errors import (PageNotFound, QueryNotSupported, RevisionNotFound,
+                       UserNotFound)
 from .. import Extractor as BaseExtractor
-from . import datasources
+from . import cassette, datasources
+from .batcher import AdaptiveBatcher
+from .doc_cache import NOT_FOUND, DocCache
 from .revision_oriented import Revision
-from .util import REV_PROPS, USER_PROPS
+from .single_flight import SingleFlight
+from .util import CONTRIB_PROPS, rev_props, user_props
 
 logger = logging.getLogger(__name__)
 
+LOOKUP_ERRORS = (mwapi.errors.APIError, mwapi.errors.RequestError,
+                 mwapi.errors.ConnectionError, mwapi.errors.TimeoutError)
+"""
+Errors that a prefetching lookup for a single page or user can fail with.
+The revisions that need the lookup look it up again when they are solved.
+"""
+
 
 class Extractor(BaseExtractor):
-    def __init__(self, session, context=None, cache=None):
-        super().__init__(context=context, cache=cache)
+    """
+    Implements a context for extracting dependents for revisions from the
+    MediaWiki API.
+
+    Concurrent requests for the same revisions or users (e.g. from the
+    threads of a :class:`~revscoring.ScoreProcessor`) wait on a single
+    outstanding query.  See
+    :class:`~revscoring.extractors.api.single_flight.SingleFlight`.
+
+    :Parameters:
+        session : :class:`mwapi.Session`
+            A session to use when querying the API.  See
+            :mod:`revscoring.extractors.api.cassette` to record and replay
+            requests.
+        context : `dict` | `iterable`
+            A set of dependents to be used in place of those already provided
+        cache : `dict`
+            A cache of computed values to use for every extraction
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of expensive dependents
+        coalesce_window : `float`
+            How long (in seconds) a query for revisions or users waits for
+            other threads' lookups to merge into it
+        doc_cache : :class:`~revscoring.extractors.api.doc_cache.DocCache`
+            A cache of user info, page creation, last user revision and
+            property suggestion documents
+        lookup_workers : `int`
+            The number of concurrent requests to use for page creation and
+            last user revision lookups that can't be batched
+        batcher : :class:`~revscoring.extractors.api.batcher.AdaptiveBatcher`
+            Chooses how many revisions and users to request at once.  The
+            chosen sizes are recorded in a
+            :class:`~revscoring.dependencies.Profiler` that is passed to
+            :meth:`~revscoring.extractors.api.Extractor.extract`.
+        rev_doc_window : `int`
+            The number of recently requested revision documents to keep so
+            that they can be reused as the parents of revisions in later
+            batches.  Parents that are revisions of the same batch are always
+            reused.
+    """
+
+    def __init__(self, session, context=None, cache=None,
+                 persistent_cache=None, coalesce_window=0.0, doc_cache=None,
+                 lookup_workers=10, batcher=None, rev_doc_window=100):
+        super().__init__(context=context, cache=cache,
+                         persistent_cache=persistent_cache)
         self.session = session
+        self.coalesce_window = float(coalesce_window)
+        self.doc_cache = doc_cache
+        self.lookup_workers = int(lookup_workers)
+        self.batcher = batcher or AdaptiveBatcher()
+        self.rev_doc_window = DocCache(max_size=rev_doc_window)
+        # Revision sizes that were returned by earlier requests so that
+        # content batches don't need to request them again
+        self.rev_sizes = DocCache()
+        self._single_flights = {}
+        self._single_flights_lock = threading.Lock()
         self.dependents = Datasource("extractor.dependents")
 
         rev_doc = self.get_rev_doc_by_id(revision_oriented.revision)
@@ -94,7 +164,7 @@ class Extractor(BaseExtractor):
 
     def _extract_many(self, rev_ids, dependents, context, caches, cache,
                       profile):
-        all_dependents = set(expand(dependents))
+        all_dependents = self.expansion(dependents, context).dependents
 
         caches = caches if caches is not None else {}
         caches.update({rev_id: {} for rev_id in rev_ids
@@ -108,9 +178,8 @@ class Extractor(BaseExtractor):
 
         # Build up caches for data that can be queried in batch
         if self.revision & all_dependents:
-            rvprop = set(REV_PROPS)
-            if self.revision.text in all_dependents:
-                rvprop.add('content')
+            # Only request the fields that the dependents will read
+            rvprop = rev_props(self.revision, all_dependents)
 
             # datasource.revision.doc
             revids_to_lookup = []
@@ -124,6 +193,7 @@ class Extractor(BaseExtractor):
                         .format(len(revids_to_lookup)))
 
             rev_docs = self.get_rev_doc_map(revids_to_lookup, rvprop=rvprop)
+            self._remember_rev_docs(rev_docs, rvprop)
 
             for rev_id in revids_to_lookup:
                 lookup_rev_id = caches[rev_id].get(
@@ -137,6 +207,8 @@ class Extractor(BaseExtractor):
 
             # datasource.revision.parent.doc
             if self.revision.parent & all_dependents:
+                parent_rvprop = rev_props(self.revision.parent,
+                                          all_dependents)
                 parentids_to_lookup = []
                 for rev_id, rev_cache in caches.items():
                     if self.revision.doc in rev_cache and \
@@ -147,10 +219,21 @@ class Extractor(BaseExtractor):
                             rev_doc.get('parentid'))
                         parentids_to_lookup.append(parent_id)
 
+                # Consecutive edits to a page don't need their parents
+                # requested again
+                parent_rev_docs = self._reuse_rev_docs(
+                    parentids_to_lookup, parent_rvprop, rev_docs, rvprop)
+                parentids_to_lookup = [parent_id
+                                       for parent_id in parentids_to_lookup
+                                       if parent_id not in parent_rev_docs]
+
                 logger.info("Batch requesting {0} revision.parent from the API"
-                            .format(len(parentids_to_lookup)))
-                parent_rev_docs = self.get_rev_doc_map(parentids_to_lookup,
-                                                       rvprop=rvprop)
+                            .format(len(parentids_to_lookup)) +
+                            " ({0} reused)".format(len(parent_rev_docs)))
+                requested_rev_docs = self.get_rev_doc_map(
+                    parentids_to_lookup, rvprop=parent_rvprop)
+                self._remember_rev_docs(requested_rev_docs, parent_rvprop)
+                parent_rev_docs.update(requested_rev_docs)
 
                 for rev_id, rev_cache in caches.items():
                     if self.revision.doc in rev_cache and \
@@ -181,8 +264,9 @@ class Extractor(BaseExtractor):
 
                 logger.info("Batch requesting {0} revision.user.info from "
                             .format(len(user_texts_to_lookup)) + "the API")
-                user_info_docs = self.get_user_doc_map(user_texts_to_lookup,
-                                                       usprop=USER_PROPS)
+                user_info_docs = self.get_user_doc_map(
+                    user_texts_to_lookup,
+                    usprop=user_props(self.revision.user.info, all_dependents))
 
                 for rev_id, rev_cache in caches.items():
                     if self.revision.doc in rev_cache and \
@@ -197,28 +281,104 @@ class Extractor(BaseExtractor):
                                 errored[rev_id] = \
                                     UserNotFound(self.revision.user, user_text)
 
-        # Now extract dependent values one-by-one
+            # datasource.revision.page.creation.doc
+            if self.revision.page.creation & all_dependents:
+                creation = self.revision.page.creation
+                rvprop = rev_props(creation, all_dependents)
+
+                page_ids = {}
+                for rev_id, rev_cache in caches.items():
+                    if self.revision.doc in rev_cache and \
+                       creation.doc not in rev_cache:
+                        rev_doc = rev_cache[self.revision.doc]
+                        if 'pageid' in rev_doc.get('page', {}):
+                            page_ids[rev_id] = rev_doc['page']['pageid']
+
+                logger.info("Batch requesting {0} revision.page.creation "
+                            .format(len(set(page_ids.values()))) +
+                            "from the API")
+                creation_docs = self.get_page_creation_doc_map(
+                    set(page_ids.values()), rvprop=rvprop)
+
+                for rev_id, page_id in page_ids.items():
+                    # Pages whose lookup failed are left for the datasource
+                    if page_id not in creation_docs:
+                        continue
+                    elif creation_docs[page_id] is None:
+                        errored[rev_id] = PageNotFound(self.revision.page,
+                                                       page_id)
+                    else:
+                        caches[rev_id][creation.doc] = creation_docs[page_id]
+
+            # datasource.revision.user.last_revision.doc
+            if self.revision.user.last_revision & all_dependents:
+                last_revision = self.revision.user.last_revision
+                user_timestamps = {}
+                for rev_id, rev_cache in caches.items():
+                    if self.revision.doc in rev_cache and \
+                       last_revision.doc not in rev_cache:
+                        rev_doc = rev_cache[self.revision.doc]
+                        if 'user' in rev_doc and 'timestamp' in rev_doc:
+                            user_timestamps[rev_id] = \
+                                (rev_doc['user'], rev_doc['timestamp'])
+
+                logger.info("Batch requesting {0} revision.user.last_revision "
+                            .format(len(set(user_timestamps.values()))) +
+                            "from the API")
+                last_rev_docs = self.get_user_last_revision_map(
+                    set(user_timestamps.values()),
+                    ucprop=rev_props(last_revision, all_dependents) &
+                    CONTRIB_PROPS)
+
+                for rev_id, user_timestamp in user_timestamps.items():
+                    if user_timestamp in last_rev_docs:
+                        caches[rev_id][last_revision.doc] = \
+                            last_rev_docs[user_timestamp]
+
+        # Now try to solve the other dependencies for the whole batch
+        rev_ids_to_solve = [rev_id for rev_id in rev_ids
+                            if rev_id not in errored]
+        error_values = self._extract_batch(
+            rev_ids_to_solve, dependents, context=context,
+            caches=[caches[rev_id] for rev_id in rev_ids_to_solve],
+            profile=profile)
+        extractions = dict(zip(rev_ids_to_solve, error_values))
+        self._record_requests(profile)
+
         for rev_id in rev_ids:
             # If an error happened, give up hope
             if rev_id in errored:
                 yield errored[rev_id], None
             else:
-                # If no error happened, try to solve the other dependencies.
-                try:
-                    values = self._extract(rev_id, dependents, context=context,
-                                           cache=caches[rev_id],
-                                           profile=profile)
-                    yield None, list(values)
-                except Exception as e:
-                    yield e, None
+                yield extractions[rev_id]
 
     def _extract(self, rev_id, dependents, context, cache, profile):
-        all_dependents = set(expand(dependents))
+        expansion = self.expansion(dependents, context)
 
         cache.update({self.revision.id: rev_id,
-                      self.dependents: [str(i) for i in all_dependents]})
-        return self.solve(dependents, context=context, cache=cache,
-                          profile=profile)
+                      self.dependents: expansion.names})
+        values = self.solve(dependents, context=context, cache=cache,
+                            profile=profile)
+        self._record_requests(profile)
+        return values
+
+    def _record_requests(self, profile):
+        requests = self.batcher.drain()
+        if hasattr(profile, 'record_request'):
+            for kind, size, n_bytes, duration in requests:
+                profile.record_request(kind, size, n_bytes, duration)
+
+    def _extract_batch(self, rev_ids, dependents, context, caches, profile):
+        dependent_names = self.expansion(dependents, context).names
+
+        for rev_id, cache in zip(rev_ids, caches):
+            cache.update({self.revision.id: rev_id,
+                          self.dependents: dependent_names})
+        try:
+            return self.solve_batch(dependents, caches, context=context,
+                                    profile=profile)
+        except LOOKUP_ERRORS as e:
+            return [(e, None) for _ in rev_ids]
 
     def get_rev_doc_map(self, rev_ids, rvprop={'ids', 'user', 'timestamp',
                                                'userid', 'comment', 'content',
@@ -228,52 +388,190 @@ class Extractor(BaseExtractor):
 
         logger.debug("Building a map of {0} revisions: {1}"
                      .format(len(rev_ids), rev_ids))
-        rev_docs = self.query_revisions_by_revids(rev_ids, rvprop=rvprop)
-
+        single_flight = self._get_single_flight(
+            'revisions', self._query_rev_doc_map, rvprop)
+        return single_flight.get_many(rev_ids)
+
+    def _query_rev_doc_map(self, rev_ids, props):
+        sizes = None
+        if 'content' in props and len(rev_ids) > 1 and \
+           self.batcher.max_bytes is not None:
+            # Cheap metadata lets content requests be cut by size.  Only the
+            # sizes that weren't returned by earlier requests are requested.
+            sizes = self._known_sizes(rev_ids)
+            unknown_ids = [rev_id for rev_id in rev_ids
+                           if rev_id not in sizes]
+            if len(unknown_ids) > 0:
+                size_docs = list(self.query_revisions_by_revids(
+                    unknown_ids, rvprop={'ids', 'size'}))
+                self._remember_sizes(size_docs)
+                sizes.update((rd['revid'], rd.get('size', 0))
+                             for rd in size_docs)
+        rev_docs = list(self.query_revisions_by_revids(
+            rev_ids, sizes=sizes, rvprop=props))
+        self._remember_sizes(rev_docs)
         return {rd['revid']: rd for rd in rev_docs}
 
-    def query_revisions_by_revids(self, revids, batch=50, **params):
-        revids_iter = iter(revids)
-        while True:
-            batch_ids = list(islice(revids_iter, 0, batch))
-            if len(batch_ids) == 0:
-                break
+    def _known_sizes(self, rev_ids):
+        sizes = {}
+        for rev_id in rev_ids:
+            size = self.rev_sizes.get('revision', rev_id)
+            if size is not MISSING:
+                sizes[rev_id] = size
+        return sizes
+
+    def _remember_sizes(self, rev_docs):
+        for rev_doc in rev_docs:
+            if 'size' in rev_doc:
+                self.rev_sizes.set('revision', rev_doc['revid'],
+                                   rev_doc['size'])
+
+    def query_revisions_by_revids(self, revids, batch=None, sizes=None,
+                                  **params):
+        """
+        Requests revisions in batches that are sized by the extractor's
+        :class:`~revscoring.extractors.api.batcher.AdaptiveBatcher` (or of
+        `batch` revisions if it is set).  `sizes` is a `dict` of rev_id -->
+        estimated content bytes.
+        """
+        def query(batch_ids):
+            doc = self.session.get(action='query', prop='revisions',
+                                   revids=batch_ids, rvslots='main', **params)
+            for page_doc in doc['query'].get('pages', {}).values():
+                yield from _normalize_revisions(page_doc)
+
+        if batch is not None:
+            for batch_ids in chunked(revids, batch):
+                yield from query(batch_ids)
+        else:
+            if 'content' in params.get('rvprop', ()):
+                kind = "revisions.content"
             else:
-                doc = self.session.get(action='query', prop='revisions',
-                                       revids=batch_ids, rvslots='main',
-                                       **params)
-
-                for page_doc in doc['query'].get('pages', {}).values():
-                    yield from _normalize_revisions(page_doc)
+                kind = "revisions"
+            yield from self.batcher.request(kind, revids, query, sizes=sizes)
 
     def get_user_doc_map(self, user_texts,
                          usprop={'groups', 'registration', 'emailable',
                                  'editcount', 'gender'}):
         if len(user_texts) == 0:
             return {}
-        logger.debug("Building a map of {0} user.info.docs"
-                     .format(len(user_texts)))
+        user_docs, user_texts = self._recall_docs('user', user_texts, usprop)
+        if len(user_texts) > 0:
+            logger.debug("Building a map of {0} user.info.docs"
+                         .format(len(user_texts)))
+            single_flight = self._get_single_flight(
+                'users', self._query_user_doc_map, usprop)
+            found_docs = single_flight.get_many(user_texts)
+            self._remember_docs('user', user_texts, usprop, found_docs)
+            user_docs.update(found_docs)
+        return user_docs
+
+    def _query_user_doc_map(self, user_texts, props):
         return {ud['name']: ud
-                for ud in self.query_users_by_text(user_texts, usprop=usprop)}
-
-    def query_users_by_text(self, user_texts, batch=50, **params):
-        user_texts_iter = iter(user_texts)
-        while True:
-            batch_texts = list(islice(user_texts_iter, 0, batch))
-            if len(batch_texts) == 0:
-                break
-            else:
-                doc = self.session.get(action='query', list='users',
-                                       ususers=batch_texts, **params)
+                for ud in self.query_users_by_text(user_texts, usprop=props)}
 
-                for user_doc in doc['query'].get('users', []):
-                    yield user_doc
+    def _recall_docs(self, kind, keys, props):
+        """
+        Returns a `dict` of cached documents and a `list` of the keys that
+        still need to be looked up.  Keys that were recently not found are
+        left out of both.
+        """
+        if self.doc_cache is None:
+            return {}, list(keys)
+
+        docs = {}
+        missing_keys = []
+        props = frozenset(props)
+        for key in keys:
+            doc = self.doc_cache.get(kind, (key, props))
+            if doc is MISSING:
+                missing_keys.append(key)
+            elif doc is not NOT_FOUND:
+                docs[key] = doc
+        return docs, missing_keys
+
+    def _remember_docs(self, kind, keys, props, docs):
+        if self.doc_cache is not None:
+            props = frozenset(props)
+            for key in keys:
+                self.doc_cache.set(kind, (key, props),
+                                   docs.get(key, NOT_FOUND))
+
+    def _reuse_rev_docs(self, rev_ids, props, batch_rev_docs, batch_props):
+        """
+        Returns a `dict` of rev_id --> rev_doc for the revisions that have
+        already been requested with (at least) `props` -- either in the
+        current batch (`batch_rev_docs` were requested with `batch_props`) or
+        in a recent one.
+        """
+        props = frozenset(props)
+        rev_docs = {}
+        for rev_id in rev_ids:
+            if rev_id in batch_rev_docs and props <= frozenset(batch_props):
+                rev_docs[rev_id] = batch_rev_docs[rev_id]
+            elif rev_id:
+                recalled = self.rev_doc_window.get('revision', rev_id)
+                if recalled is not MISSING and props <= recalled[0]:
+                    rev_docs[rev_id] = recalled[1]
+        return rev_docs
+
+    def _remember_rev_docs(self, rev_docs, props):
+        props = frozenset(props)
+        for rev_id, rev_doc in rev_docs.items():
+            self.rev_doc_window.set('revision', rev_id, (props, rev_doc))
+
+    def _get_single_flight(self, kind, query, props,
+                           single_flight_class=SingleFlight):
+        # Lookups can only be shared by requests for the same props
+        key = (kind, frozenset(props))
+        with self._single_flights_lock:
+            if key not in self._single_flights:
+                self._single_flights[key] = single_flight_class(
+                    partial(query, props=set(props)),
+                    window=self.coalesce_window)
+            return self._single_flights[key]
+
+    def single_flight_stats(self):
+        """
+        Returns a `dict` of request/query statistics for revision and user
+        lookups.
+        """
+        stats = {'requests': 0, 'coalesced': 0, 'queries': 0}
+        for single_flight in list(self._single_flights.values()):
+            for key, value in single_flight.stats().items():
+                stats[key] += value
+        return stats
+
+    def query_users_by_text(self, user_texts, batch=None, **params):
+        def query(batch_texts):
+            doc = self.session.get(action='query', list='users',
+                                   ususers=batch_texts, **params)
+            return doc['query'].get('users', [])
+
+        if batch is not None:
+            for batch_texts in chunked(user_texts, batch):
+                yield from query(batch_texts)
+        else:
+            yield from self.batcher.request("users", user_texts, query)
 
     def get_user_last_revision(self, user_text, rev_timestamp,
                                ucprop={'ids', 'timestamp', 'comment', 'size'}):
         if user_text is None or rev_timestamp is None:
             return None
 
+        key = (user_text, str(rev_timestamp))
+        docs, _ = self._recall_docs('last_user_revision', [key], ucprop)
+        if key in docs:
+            return docs[key]
+
+        rev_doc = self._query_user_last_revision(user_text, rev_timestamp,
+                                                 ucprop)
+        # It's OK to not find a revision here, so `None` is remembered too.
+        self._remember_docs('last_user_revision', [key], ucprop,
+                            {key: rev_doc})
+        return rev_doc
+
+    def _query_user_last_revision(self, user_text, rev_timestamp, ucprop):
         logger.debug("Requesting the last revision by {0} from the API"
                      .format(user_text))
         doc = self.session.get(action="query", list="usercontribs",
@@ -289,31 +587,99 @@ class Extractor(BaseExtractor):
             # It's OK to not find a revision here.
             return None
 
+    def get_user_last_revision_map(self, user_timestamps,
+                                   ucprop={'ids', 'timestamp', 'comment',
+                                           'size'}):
+        """
+        Looks up the last revisions saved by users before a set of timestamps
+        concurrently.  Returns a `dict` of (user_text, timestamp) --> rev_doc
+        (or `None`).  Lookups that fail are left out.
+        """
+        return self._map_concurrently(
+            lambda user_timestamp: self.get_user_last_revision(
+                user_timestamp[0], mwtypes.Timestamp(user_timestamp[1]),
+                ucprop=ucprop),
+            list(user_timestamps))
+
+    def get_page_creation_doc_map(self, page_ids,
+                                  rvprop={'ids', 'user', 'timestamp',
+                                          'userid', 'comment', 'flags',
+                                          'size'}):
+        """
+        Looks up the first revisions of a set of pages concurrently.  Returns
+        a `dict` of page_id --> rev_doc (or `None`).  Lookups that fail are
+        left out.
+        """
+        return self._map_concurrently(
+            lambda page_id: self.get_page_creation_doc(page_id,
+                                                       rvprop=rvprop),
+            list(page_ids))
+
+    def _map_concurrently(self, func, items):
+        def lookup(item):
+            try:
+                return func(item)
+            except LOOKUP_ERRORS as e:
+                logger.warning("Lookup of {0} failed: {1}".format(item, e))
+                return MISSING
+
+        # The API can only look these up one page/user at a time
+        if len(items) <= 1 or self.lookup_workers <= 1:
+            results = [lookup(item) for item in items]
+        else:
+            workers = min(self.lookup_workers, len(items))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lookup, items))
+
+        return {item: result for item, result in zip(items, results)
+                if result is not MISSING}
+
     def get_page_creation_doc(self, page_id,
                               rvprop={'ids', 'user', 'timestamp', 'userid',
                                       'comment', 'flags', 'size'}):
         if page_id is None:
             return None
 
+        docs, page_ids = self._recall_docs('page_creation', [page_id], rvprop)
+        if len(page_ids) == 0:
+            return docs.get(page_id)
+
+        rev_doc = self._query_page_creation_doc(page_id, rvprop)
+        self._remember_docs('page_creation', [page_id], rvprop,
+                            {page_id: rev_doc} if rev_doc is not None else {})
+        return rev_doc
+
+    def _query_page_creation_doc(self, page_id, rvprop):
         logger.debug("Requesting creation revision for ({0}) from the API"
                      .format(page_id))
         doc = self.session.get(action="query", prop="revisions",
                                pageids=page_id, rvdir="newer", rvlimit=1,
                                rvprop=rvprop)
 
-        page_doc = doc['query'].get('pages', {'revisions': []}).values()
-        rev_docs = page_doc['revisions']
+        for page_doc in doc['query'].get('pages', {}).values():
+            rev_docs = page_doc.get('revisions', [])
+            if len(rev_docs) == 1:
+                return rev_docs[0]
 
-        if len(rev_docs) == 1:
-            return rev_docs[0]
-        else:
-            # This is bad, but it should be handled by the calling funcion
-            return None
+        # This is bad, but it should be handled by the calling funcion
+        return None
 
     def get_property_suggestion_doc(self, entity_id):
         if entity_id is None:
             return None
 
+        docs, entity_ids = self._recall_docs(
+            'property_suggestion', [entity_id], ())
+        if len(entity_ids) == 0:
+            return docs.get(entity_id)
+
+        search_doc = self._query_property_suggestion_doc(entity_id)
+        self._remember_docs(
+            'property_suggestion', [entity_id], (),
+            {entity_id: search_doc} if search_doc is not None else {})
+        return search_doc
+
+    def _query_property_suggestion_doc(self, entity_id):
         logger.debug("Requesting property suggestions for ({0}) from the API"
                      .format(entity_id))
         doc = self.session.get(
@@ -333,8 +699,39 @@ class Extractor(BaseExtractor):
     def from_config(cls, config, name, section_key="extractors"):
         logger.info("Loading api.Extractor '{0}' from config.".format(name))
         section = config[section_key][name]
-        kwargs = {k: v for k, v in section.items() if k != "class"}
-        return cls(mwapi.Session(**kwargs))
+        kwargs = {k: v for k, v in section.items()
+                  if k not in ("class", "persistent_cache", "coalesce_window",
+                               "doc_cache", "lookup_workers", "cassette",
+                               "batcher", "rev_doc_window")}
+        if 'persistent_cache' in section:
+            persistent_cache = PersistentCache(**section['persistent_cache'])
+        else:
+            persistent_cache = None
+        if 'doc_cache' in section:
+            doc_cache = DocCache(**section['doc_cache'])
+        else:
+            doc_cache = None
+        if 'cassette' in section:
+            session = cassette.from_config(section['cassette'], kwargs)
+        else:
+            session = mwapi.Session(**kwargs)
+        return cls(session, persistent_cache=persistent_cache,
+                   coalesce_window=section.get('coalesce_window', 0.0),
+                   doc_cache=doc_cache,
+                   lookup_workers=section.get('lookup_workers', 10),
+                   batcher=AdaptiveBatcher(**section.get('batcher', {})),
+                   rev_doc_window=section.get('rev_doc_window', 100))
+
+    # Outstanding lookups can't be shared between processes
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_single_flights'] = {}
+        state['_single_flights_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._single_flights_lock = threading.Lock()
 
 
 def _normalize_revisions(page_doc):
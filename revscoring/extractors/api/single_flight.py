@@ -0,0 +1,190 @@
+"""
+.. autoclass:: revscoring.extractors.api.single_flight.SingleFlight
+    :members:
+
+.. autoclass:: revscoring.extractors.api.single_flight.AsyncSingleFlight
+    :members:
+"""
+import asyncio
+import threading
+import time
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent lookups of the same keys (e.g. rev_ids or user names)
+    into shared queries.  A thread that requests a key that is already being
+    queried by another thread waits for that query rather than sending its
+    own.  New keys that are requested while a query is gathering keys (see
+    `window`) are merged into it.
+
+    :Parameters:
+        query : `func`
+            A function that takes a `list` of keys and returns a `dict` of
+            key --> value.  Keys that are not found are left out.
+        window : `float`
+            How long (in seconds) a query waits for other threads' keys before
+            it is sent.  Use a few milliseconds to merge lookups from
+            concurrent threads into multi-key queries.
+
+    :Attributes:
+        requests : `int`
+            The number of keys that were requested
+        coalesced : `int`
+            The number of keys that were served by another thread's query
+        queries : `int`
+            The number of queries that were sent
+    """
+
+    def __init__(self, query, window=0.0):
+        self.query = query
+        self.window = float(window)
+        self.requests = 0
+        self.coalesced = 0
+        self.queries = 0
+        self._open()
+
+    def _open(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}  # key --> the _Flight that is looking it up
+        self.gathering = None  # a _Flight that still accepts keys
+
+    def get_many(self, keys):
+        """
+        Looks up values for an iterable of keys.  Returns a `dict` of
+        key --> value.
+        """
+        keys = set(keys)
+        with self.lock:
+            flights, leading = self._join(keys, _Flight)
+
+        if leading is not None:
+            self._send(leading)
+
+        for flight in flights:
+            flight.done.wait()
+        return _values(keys, flights)
+
+    def _join(self, keys, new_flight):
+        # Assigns each key to the flight that is looking it up (or a new one)
+        flights = set()
+        leading = None
+        self.requests += len(keys)
+        for key in keys:
+            flight = self.in_flight.get(key)
+            if flight is None:
+                if self.gathering is None:
+                    self.gathering = leading = new_flight()
+                flight = self.gathering
+                flight.keys.append(key)
+                self.in_flight[key] = flight
+            if flight is not leading:
+                self.coalesced += 1
+            flights.add(flight)
+        return flights, leading
+
+    def _depart(self, flight):
+        if self.gathering is flight:
+            self.gathering = None
+        self.queries += 1
+
+    def _land(self, flight):
+        for key in flight.keys:
+            if self.in_flight.get(key) is flight:
+                del self.in_flight[key]
+        flight.done.set()
+
+    def _send(self, flight):
+        if self.window > 0:
+            time.sleep(self.window)
+        with self.lock:
+            self._depart(flight)
+
+        try:
+            flight.values = self.query(flight.keys)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self.lock:
+                self._land(flight)
+
+    def stats(self):
+        """
+        Returns a `dict` of request/query statistics.
+        """
+        return {'requests': self.requests, 'coalesced': self.coalesced,
+                'queries': self.queries}
+
+    # Locks and outstanding queries can't be shared between processes
+    def __getstate__(self):
+        return {'query': self.query, 'window': self.window,
+                'requests': 0, 'coalesced': 0, 'queries': 0}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    Implements a :class:`~revscoring.extractors.api.single_flight.SingleFlight`
+    for coroutines that run in the same event loop.  `query` is a coroutine
+    function and :meth:`get_many` is awaited.
+    """
+
+    async def get_many(self, keys):
+        """
+        Looks up values for an iterable of keys.  Returns a `dict` of
+        key --> value.
+        """
+        keys = set(keys)
+        flights, leading = self._join(keys, _AsyncFlight)
+
+        if leading is not None:
+            await self._send(leading)
+
+        for flight in flights:
+            await flight.done.wait()
+        return _values(keys, flights)
+
+    async def _send(self, flight):
+        if self.window > 0:
+            await asyncio.sleep(self.window)
+        self._depart(flight)
+
+        try:
+            flight.values = await self.query(flight.keys)
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._land(flight)
+
+
+def _values(keys, flights):
+    values = {}
+    for flight in flights:
+        if flight.error is not None:
+            raise flight.error
+        values.update((key, flight.values[key]) for key in keys
+                      if key in flight.values)
+    return values
+
+
+class _Flight:
+    __slots__ = ('keys', 'values', 'error', 'done')
+
+    def __init__(self):
+        self.keys = []
+        self.values = {}
+        self.error = None
+        self.done = threading.Event()
+
+
+class _AsyncFlight(_Flight):
+    __slots__ = ()
+
+    def __init__(self):
+        self.keys = []
+        self.values = {}
+        self.error = None
+        self.done = asyncio.Event()
@@ -3,6 +3,48 @@ from ...datasources import Datasource
 REV_PROPS = {'ids', 'user', 'timestamp', 'userid', 'comment', 'size',
              'contentmodel'}
 USER_PROPS = {'groups', 'editcount', 'gender', 'registration'}
+CONTRIB_PROPS = {'ids', 'title', 'timestamp', 'comment', 'size', 'flags'}
+
+REV_PROP_DATASOURCES = [('timestamp_str', 'timestamp'),
+                        ('comment', 'comment'),
+                        ('byte_len', 'size'),
+                        ('minor', 'flags'),
+                        ('content_model', 'contentmodel'),
+                        ('text', 'content')]
+USER_PROP_DATASOURCES = [('id', 'userid'), ('text', 'user')]
+USER_INFO_PROP_DATASOURCES = [('editcount', 'editcount'),
+                              ('registration_str', 'registration'),
+                              ('groups', 'groups'),
+                              ('emailable', 'emailable'),
+                              ('gender', 'gender')]
+
+
+def rev_props(revision, dependents):
+    """
+    Returns the smallest `rvprop` that provides the datasources of a
+    :class:`~revscoring.datasources.revision_oriented.Revision` that are in
+    `dependents`.  `ids` is always included so that documents can be matched
+    to revisions and their parents.
+    """
+    props = {'ids'}
+    for attr, prop in REV_PROP_DATASOURCES:
+        if hasattr(revision, attr) and getattr(revision, attr) in dependents:
+            props.add(prop)
+    if hasattr(revision, 'user'):
+        for attr, prop in USER_PROP_DATASOURCES:
+            if getattr(revision.user, attr) in dependents:
+                props.add(prop)
+    return props
+
+
+def user_props(user_info, dependents):
+    """
+    Returns the smallest `usprop` that provides the datasources of a
+    :class:`~revscoring.datasources.revision_oriented.UserInfo` that are in
+    `dependents`.
+    """
+    return {prop for attr, prop in USER_INFO_PROP_DATASOURCES
+            if getattr(user_info, attr) in dependents}
 
 
 def identity(v):
@@ -0,0 +1,14 @@
+"""
+Implements :class:`~revscoring.Extractor` that stream revisions from
+MediaWiki XML dumps and entities from Wikibase JSON dumps.
+
+.. autoclass:: revscoring.extractors.dump.Extractor
+    :members:
+
+.. autoclass:: revscoring.extractors.dump.EntityExtractor
+    :members:
+"""
+from .entity_extractor import EntityExtractor
+from .extractor import Extractor
+
+__all__ = [Extractor, EntityExtractor]
@@ -0,0 +1,43 @@
+from ...datasources import Datasource
+from ...errors import PageNotFound, QueryNotSupported, RevisionNotFound
+
+
+class RevDocById(Datasource):
+    """
+    A revision document that can only be provided by the dump.  If the dump
+    didn't inject it into the cache, the revision is reported as not found.
+    """
+
+    def __init__(self, revision):
+        self.revision = revision
+        super().__init__(revision._name + ".doc", self.process,
+                         depends_on=[revision.id])
+
+    def process(self, rev_id):
+        if rev_id == 0:
+            return None
+        else:
+            raise RevisionNotFound(self.revision, rev_id=rev_id)
+
+
+class PageCreationRevDoc(Datasource):
+
+    def __init__(self, page):
+        self.page = page
+        super().__init__(page.creation._name + ".doc", self.process,
+                         depends_on=[page.id])
+
+    def process(self, page_id):
+        raise PageNotFound(self.page, page_id)
+
+
+class NotInDump(Datasource):
+    """
+    A document that XML dumps do not contain (e.g. user info).
+    """
+
+    def __init__(self, name):
+        super().__init__(name, self.process)
+
+    def process(self):
+        raise QueryNotSupported(self, "not available in XML dumps")
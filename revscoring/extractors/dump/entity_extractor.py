@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import re
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import mwtypes.files
+
+from ...features import wikibase
+from .extractor import Extractor
+
+logger = logging.getLogger(__name__)
+
+
+class EntityExtractor(Extractor):
+    """
+    Implements a context for extracting dependents for the current revisions
+    of entities in a Wikibase JSON dump (e.g. Wikidata's
+    latest-all.json.bz2).  The dump is read one line at a time and each
+    entity is injected into the cache as both `revision.text` and the
+    parsed `wikibase.revision.datasources.entity_doc`, so the JSON is only
+    parsed once.  Chunks of `batch_size` lines are parsed and solved in
+    worker processes.  At most two chunks per process are outstanding, so
+    memory use doesn't depend on the size of the dump.  A line that can't
+    be parsed is yielded as that entity's error.
+
+    Entity dumps only contain current revisions.  Extracting dependents of
+    the parent revision will raise a
+    :class:`~revscoring.errors.RevisionNotFound`.
+
+    :Parameters:
+        paths : `iterable` ( `str` )
+            Paths to JSON dump files.  Compressed files (.bz2, .gz and .7z)
+            are decompressed on the fly.
+        processes : `int`
+            The number of processes to parse entities and solve dependents
+            with.  Defaults to the number of CPUs.
+        batch_size : `int`
+            The number of entities to send to a process at once
+        context : `dict` | `iterable`
+            A set of dependents to be used in place of those already provided
+        cache : `dict`
+            A cache of computed values to use for every extraction
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of expensive dependents
+    """
+
+    def extract_all(self, dependents, rev_ids=None, context=None, caches=None,
+                    cache=None, profile=None):
+        """
+        Extracts values for a set of
+        :class:`~revscoring.dependents.dependent.Dependent` for every entity
+        in the dumps (or those whose last revision is in `rev_ids`) in the
+        order of the dumps.
+
+        See :meth:`~revscoring.extractors.dump.Extractor.extract_all` for call
+        signature.  `profile` is only recorded when `processes` is 1.
+        """
+        options = {'dependents': dependents, 'rev_ids': rev_ids,
+                   'context': context or {}, 'caches': caches or {},
+                   'cache': cache or {}}
+        return self._extract_chunks(self._read_chunks(), options, profile)
+
+    def _extract_located(self, locations, dependents, context, caches,
+                         cache, profile):
+        # Only the lines of the requested entities are read and parsed
+        options = {'dependents': dependents, 'rev_ids': set(locations),
+                   'context': context, 'caches': caches, 'cache': cache}
+        return self._extract_chunks(self._read_located_chunks(locations),
+                                    options, profile)
+
+    def _extract_chunks(self, chunks, options, profile):
+        if self.processes == 1:
+            for lines in chunks:
+                yield from self._process_lines(lines, profile=profile,
+                                               **options)
+        else:
+            # ProcessPoolExecutor only takes an initializer as of python 3.7
+            with Pool(self.processes, initializer=_start_worker,
+                      initargs=(self, options)) as pool:
+                max_pending = 2 * (self.processes or os.cpu_count())
+                pending = deque()
+                for lines in chunks:
+                    pending.append(pool.apply_async(_process_lines, (lines,)))
+                    if len(pending) >= max_pending:
+                        yield from pending.popleft().get()
+                while len(pending) > 0:
+                    yield from pending.popleft().get()
+
+    def _read_chunks(self):
+        for path in self.paths:
+            logger.info("Reading entities from {0}".format(path))
+            f = mwtypes.files.reader(path)
+            try:
+                lines = (line for line in f
+                         if line.strip() not in ("[", "]", ""))
+                yield from self._chunk(lines)
+            finally:
+                f.close()
+
+    def _read_located_chunks(self, locations):
+        offsets = {}
+        for file_number, offset in locations.values():
+            offsets.setdefault(file_number, set()).add(offset)
+
+        for file_number in sorted(offsets):
+            path = self.paths[file_number]
+            logger.info("Reading {0} entities from {1}"
+                        .format(len(offsets[file_number]), path))
+            f = mwtypes.files.reader(path)
+            try:
+                yield from self._chunk(
+                    _read_lines_at(f.buffer, sorted(offsets[file_number])))
+            finally:
+                f.close()
+
+    def _chunk(self, lines):
+        while True:
+            chunk = list(islice(lines, self.batch_size))
+            if len(chunk) == 0:
+                break
+            yield chunk
+
+    def _read_locations(self):
+        # Byte offsets are recorded so that entities can be read without
+        # parsing the lines that precede them
+        for file_number, path in enumerate(self.paths):
+            logger.info("Indexing entities in {0}".format(path))
+            f = mwtypes.files.reader(path)
+            try:
+                offset = 0
+                for line in f.buffer:
+                    rev_id = _find_rev_id(
+                        line.decode('utf-8', errors='replace'))
+                    if rev_id is not None:
+                        yield rev_id, file_number, offset
+                    offset += len(line)
+            finally:
+                f.close()
+
+    def _process_lines(self, lines, dependents, rev_ids, context, caches,
+                       cache, profile=None):
+        batch = []
+        errors = []
+        for line in lines:
+            text = line.strip().rstrip(",")
+            try:
+                entity_doc = json.loads(text)
+            except ValueError as e:
+                # A corrupt line only fails its own entity
+                rev_id = _find_rev_id(text)
+                logger.warning("Could not parse entity {0}: {1}"
+                               .format(rev_id, e))
+                if rev_ids is None or rev_id in rev_ids:
+                    errors.append((len(batch), (rev_id, e, None)))
+                continue
+            rev_id = entity_doc.get('lastrevid')
+            if rev_ids is not None and rev_id not in rev_ids:
+                continue
+
+            rev_cache = dict(cache)
+            rev_cache.update(caches.get(rev_id, {}))
+            rev_cache[self.revision.doc] = entity_to_doc(entity_doc, text)
+            rev_cache[wikibase.revision.datasources.entity_doc] = entity_doc
+            batch.append((rev_id, rev_cache))
+
+        extracted = list(
+            self._extract_batch(batch, dependents, context, profile))
+        # Put parse errors back in the order of the lines
+        for position, error in reversed(errors):
+            extracted.insert(position, error)
+        return extracted
+
+
+def entity_to_doc(entity_doc, text):
+    """
+    Converts an entity from a JSON dump into a revision document that is
+    shaped like one that the API returns (see
+    :class:`~revscoring.extractors.api.Extractor`).
+    """
+    rev_doc = {
+        'revid': entity_doc.get('lastrevid'),
+        'slots': {'main': {
+            'contentmodel': "wikibase-" + entity_doc.get('type', "item"),
+            '*': text
+        }}
+    }
+    if 'modified' in entity_doc:
+        rev_doc['timestamp'] = entity_doc['modified']
+    if 'pageid' in entity_doc:
+        rev_doc['page'] = {'pageid': entity_doc['pageid'],
+                           'ns': entity_doc.get('ns', 0),
+                           'title': entity_doc.get('title', entity_doc['id'])}
+    return rev_doc
+
+
+LASTREVID = re.compile(r'"lastrevid"\s*:\s*([0-9]+)')
+
+
+def _read_lines_at(f, offsets):
+    """
+    Reads the lines that start at (ascending) byte `offsets` of a binary
+    file.  Files that can't seek (e.g. 7z pipes) are read up to each offset.
+    """
+    position = 0
+    for offset in offsets:
+        if f.seekable():
+            f.seek(offset)
+        else:
+            while position < offset:
+                skipped = f.read(min(offset - position, 2 ** 20))
+                if len(skipped) == 0:
+                    return
+                position += len(skipped)
+        line = f.readline()
+        position = offset + len(line)
+        yield line.decode('utf-8', errors='replace')
+
+
+def _find_rev_id(text):
+    match = LASTREVID.search(text)
+    if match is not None:
+        return int(match.group(1))
+    else:
+        return None
+
+
+_worker = None
+
+
+def _start_worker(extractor, options):
+    global _worker
+    _worker = extractor, options
+
+
+def _process_lines(lines):
+    extractor, options = _worker
+    return extractor._process_lines(lines, **options)
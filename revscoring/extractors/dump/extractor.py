@@ -0,0 +1,405 @@
+import logging
+import threading
+from array import array
+from functools import partial
+
+import mwxml
+import numpy
+
+from ...datasources import revision_oriented
+from ...dependencies import PersistentCache
+from ...errors import RevisionNotFound
+from .. import Extractor as BaseExtractor
+from ..api.revision_oriented import Revision
+from . import datasources
+
+logger = logging.getLogger(__name__)
+
+
+class Extractor(BaseExtractor):
+    """
+    Implements a context for extracting dependents for revisions from
+    MediaWiki XML dumps (e.g. pages-meta-history).  Dumps are streamed one
+    page at a time and `revision.doc`, `revision.parent.doc` and
+    `revision.page.creation.doc` are injected into the cache of each revision,
+    so nothing is requested from the API and only the previous revision of
+    the current page is held in memory.  Each dump file is processed in its
+    own process.
+
+    User info, a user's last revision and property suggestions are not
+    available in XML dumps.  Extracting dependents that need them will
+    raise a :class:`~revscoring.errors.QueryNotSupported`.
+
+    :Parameters:
+        paths : `iterable` ( `str` )
+            Paths to XML dump files.  Compressed files (.bz2, .gz and .7z)
+            are decompressed on the fly.
+        processes : `int`
+            The number of dump files to process in parallel.  Defaults to the
+            number of CPUs.
+        batch_size : `int`
+            The number of revisions to solve at once
+        context : `dict` | `iterable`
+            A set of dependents to be used in place of those already provided
+        cache : `dict`
+            A cache of computed values to use for every extraction
+        persistent_cache : :class:`~revscoring.dependencies.PersistentCache`
+            A content-addressed cache of the values of expensive dependents
+    """
+
+    def __init__(self, paths, processes=None, batch_size=50, context=None,
+                 cache=None, persistent_cache=None):
+        super().__init__(context=context, cache=cache,
+                         persistent_cache=persistent_cache)
+        self.paths = list(paths)
+        self.processes = int(processes) if processes is not None else None
+        self.batch_size = int(batch_size)
+        self._rev_index = None
+        self._rev_index_lock = threading.Lock()
+
+        rev_doc = self.get_rev_doc_by_id(revision_oriented.revision)
+        self.revision = Revision(
+            revision_oriented.revision, self, rev_doc,
+            id_datasource=revision_oriented.revision.id
+        )
+
+        # Registers revision_oriented context
+        self.update(context=self.revision)
+
+    def get_rev_doc_by_id(self, revision):
+        return datasources.RevDocById(revision)
+
+    def get_page_creation_rev_doc(self, page):
+        return datasources.PageCreationRevDoc(page)
+
+    def get_user_info_doc(self, user):
+        return datasources.NotInDump(user.info._name + ".doc")
+
+    def get_last_user_rev_doc(self, revision):
+        return datasources.NotInDump(
+            revision.user.last_revision._name + ".doc")
+
+    def get_property_suggestion_search_doc(self, page):
+        return datasources.NotInDump(
+            page.suggested.properties.name + ".doc")
+
+    def extract(self, rev_ids, dependents, context=None, caches=None,
+                cache=None, profile=None):
+        """
+        Extracts values for a set of
+        :class:`~revscoring.dependents.dependent.Dependent` for a revision or
+        a set of revisions by scanning the dumps.  Values are yielded in the
+        order of `rev_ids`, so `rev_ids` that follow the order of the dumps
+        are streamed while others are held until their turn comes.  See
+        :meth:`~revscoring.extractors.dump.Extractor.extract_all` to extract
+        in the order of the dumps.
+
+        The first call reads the rev_ids of every dump once and keeps an
+        index of the file that holds each revision (20 bytes per revision).
+        Later calls only read the files that hold the requested `rev_ids`
+        and `rev_ids` that are not in the dumps fail without reading any.
+        The index is kept when the extractor is pickled.
+
+        :Parameters:
+            rev_ids : int | `iterable`
+                Either a single rev_id or an `iterable` of rev_ids
+            dependents : :class:`~revscoring.dependents.dependent.Dependent`
+                A list of dependents to extract values for
+            context : `dict` | `iterable`
+                A set of call-specific
+                :class:`~revscoring.Dependent` to inject
+            caches : `dict`
+                A rev_id-->cache pairs of call-specific pre-computed values to
+                inject
+            cache : `dict`
+                A set of call-specific pre-computed values to inject for every
+                rev_id
+            profile : `dict`
+                A mapping of :class:`revscoring.Dependent` to `list` of process
+                durations for generating the value.  Only durations from the
+                main process (i.e. when there is a single dump file) are
+                recorded.
+        :Returns:
+            The extracted values if a single rev_id was provided or
+            a generator of (error, values) pairs where error is `None` if no
+            error occured during extraction.
+        """
+        if hasattr(rev_ids, "__iter__"):
+            return self._extract_many(rev_ids, dependents, context=context,
+                                      caches=caches, cache=cache,
+                                      profile=profile)
+        else:
+            rev_id = rev_ids
+            (error, values), = self._extract_many(
+                [rev_id], dependents, context=context, caches=caches,
+                cache=cache, profile=profile)
+            if error is not None:
+                raise error
+            else:
+                return values
+
+    def _extract_many(self, rev_ids, dependents, context, caches, cache,
+                      profile):
+        rev_ids = list(rev_ids)
+        rev_index = self._get_rev_index()
+        locations = {}
+        for rev_id in rev_ids:
+            location = rev_index.get(rev_id)
+            if location is not None:
+                locations[rev_id] = location
+        if len(locations) > 0:
+            extractions = self._extract_located(
+                locations, dependents, context=context or {},
+                caches=caches or {}, cache=cache or {}, profile=profile)
+        else:
+            extractions = iter(())
+
+        done = {}
+        for rev_id in rev_ids:
+            while rev_id in locations and rev_id not in done:
+                try:
+                    extracted_id, error, values = next(extractions)
+                except StopIteration:
+                    break
+                done[extracted_id] = (error, values)
+
+            if rev_id in done:
+                yield done.pop(rev_id)
+            else:
+                yield RevisionNotFound(self.revision, rev_id), None
+
+    def _get_rev_index(self):
+        with self._rev_index_lock:
+            if self._rev_index is None:
+                logger.info("Indexing the rev_ids of {0} dumps"
+                            .format(len(self.paths)))
+                self._rev_index = RevIndex(self._read_locations())
+            return self._rev_index
+
+    def _read_locations(self):
+        file_numbers = {path: i for i, path in enumerate(self.paths)}
+        for rev_id, path in mwxml.map(_read_rev_ids, self.paths,
+                                      threads=self.processes):
+            # XML dumps can't be read from the middle
+            yield rev_id, file_numbers[path], -1
+
+    def _extract_located(self, locations, dependents, context, caches,
+                         cache, profile):
+        file_numbers = sorted({file_number
+                               for file_number, _ in locations.values()})
+        return self._extract_paths(
+            [self.paths[file_number] for file_number in file_numbers],
+            dependents, set(locations), context, caches, cache, profile)
+
+    def extract_all(self, dependents, rev_ids=None, context=None, caches=None,
+                    cache=None, profile=None):
+        """
+        Extracts values for a set of
+        :class:`~revscoring.dependents.dependent.Dependent` for every revision
+        in the dumps (or those in `rev_ids`) in the order that they are
+        processed.
+
+        :Parameters:
+            dependents : :class:`~revscoring.dependents.dependent.Dependent`
+                A list of dependents to extract values for
+            rev_ids : `set` ( `int` )
+                The revisions to extract values for.  If `None`, all
+                revisions are extracted.
+            context : `dict` | `iterable`
+                A set of call-specific
+                :class:`~revscoring.Dependent` to inject
+            caches : `dict`
+                A rev_id-->cache pairs of call-specific pre-computed values to
+                inject
+            cache : `dict`
+                A set of call-specific pre-computed values to inject for every
+                rev_id
+            profile : `dict`
+                A mapping of :class:`revscoring.Dependent` to `list` of process
+                durations for generating the value
+        :Returns:
+            A generator of (rev_id, error, values) triples
+        """
+        return self._extract_paths(self.paths, dependents, rev_ids,
+                                   context or {}, caches or {}, cache or {},
+                                   profile)
+
+    def _extract_paths(self, paths, dependents, rev_ids, context, caches,
+                       cache, profile):
+        process_dump = partial(
+            self._process_dump, dependents=dependents, rev_ids=rev_ids,
+            context=context, caches=caches, cache=cache, profile=profile)
+        return mwxml.map(process_dump, paths, threads=self.processes)
+
+    def _process_dump(self, dump, path, dependents, rev_ids, context, caches,
+                      cache, profile):
+        logger.info("Extracting {0} revisions from {1}"
+                    .format("all" if rev_ids is None else len(rev_ids), path))
+        namespace_names = {namespace.id: namespace.name
+                           for namespace in dump.site_info.namespaces or []}
+        batch = []
+        for page in dump:
+            parent_doc = None
+            creation_doc = None
+            for revision in page:
+                rev_doc = revision_to_doc(revision, page, namespace_names)
+                if revision.parent_id is None and parent_doc is not None:
+                    # Old dumps don't record parent ids
+                    rev_doc['parentid'] = parent_doc['revid']
+                if creation_doc is None:
+                    creation_doc = {k: v for k, v in rev_doc.items()
+                                    if k != 'slots'}
+
+                if rev_ids is None or revision.id in rev_ids:
+                    rev_cache = dict(cache)
+                    rev_cache.update(caches.get(revision.id, {}))
+                    rev_cache[self.revision.doc] = rev_doc
+                    rev_cache[self.revision.page.creation.doc] = creation_doc
+                    if rev_doc['parentid'] == 0:
+                        rev_cache[self.revision.parent.doc] = None
+                    elif parent_doc is not None and \
+                            parent_doc['revid'] == rev_doc['parentid']:
+                        rev_cache[self.revision.parent.doc] = parent_doc
+                    batch.append((revision.id, rev_cache))
+
+                    if len(batch) >= self.batch_size:
+                        yield from self._extract_batch(
+                            batch, dependents, context, profile)
+                        batch = []
+
+                # Only the previous revision of the page is remembered
+                parent_doc = rev_doc
+
+        if len(batch) > 0:
+            yield from self._extract_batch(batch, dependents, context, profile)
+
+    def _extract_batch(self, batch, dependents, context, profile):
+        rev_ids = [rev_id for rev_id, _ in batch]
+        for rev_id, rev_cache in batch:
+            rev_cache[self.revision.id] = rev_id
+        try:
+            error_values = self.solve_batch(
+                dependents, [rev_cache for _, rev_cache in batch],
+                context=context, profile=profile)
+        except Exception as e:
+            error_values = [(e, None) for _ in rev_ids]
+
+        for rev_id, (error, values) in zip(rev_ids, error_values):
+            yield rev_id, error, values
+
+    @classmethod
+    def from_config(cls, config, name, section_key="extractors"):
+        section = config[section_key][name]
+        if 'persistent_cache' in section:
+            persistent_cache = PersistentCache(**section['persistent_cache'])
+        else:
+            persistent_cache = None
+        return cls(
+            section['paths'],
+            processes=section.get('processes'),
+            batch_size=section.get('batch_size', 50),
+            persistent_cache=persistent_cache
+        )
+
+    # The rev_id index is kept so that copies don't read the dumps again
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['_rev_index_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rev_index_lock = threading.Lock()
+
+
+class RevIndex:
+    """
+    Implements a compact, sorted index of the location of revisions in a set
+    of dump files.
+
+    :Parameters:
+        locations : `iterable` ( (`int`, `int`, `int`) )
+            (rev_id, file number, offset) triples where offset is the byte
+            offset of the revision in the (decompressed) file or -1 if it
+            isn't known
+    """
+
+    def __init__(self, locations):
+        rev_ids, file_numbers, offsets = \
+            array('q'), array('l'), array('q')
+        for rev_id, file_number, offset in locations:
+            rev_ids.append(rev_id)
+            file_numbers.append(file_number)
+            offsets.append(offset)
+
+        order = numpy.argsort(numpy.array(rev_ids, dtype=numpy.int64),
+                              kind='stable')
+        self.rev_ids = numpy.array(rev_ids, dtype=numpy.int64)[order]
+        self.file_numbers = numpy.array(file_numbers, dtype=numpy.int32)[order]
+        self.offsets = numpy.array(offsets, dtype=numpy.int64)[order]
+
+    def get(self, rev_id):
+        """
+        Returns the (file number, offset) of a revision or `None` if it isn't
+        in the index.
+        """
+        position = int(numpy.searchsorted(self.rev_ids, rev_id))
+        if position < len(self.rev_ids) and \
+           self.rev_ids[position] == rev_id:
+            return (int(self.file_numbers[position]),
+                    int(self.offsets[position]))
+        else:
+            return None
+
+    def __len__(self):
+        return len(self.rev_ids)
+
+
+def _read_rev_ids(dump, path):
+    for page in dump:
+        for revision in page:
+            yield revision.id, path
+
+
+def revision_to_doc(revision, page, namespace_names):
+    """
+    Converts a :class:`mwxml.Revision` into a document that is shaped like
+    one that the API returns (see
+    :class:`~revscoring.extractors.api.Extractor`).
+    """
+    if revision.parent_id is not None:
+        parent_id = int(revision.parent_id)
+    else:
+        parent_id = 0
+
+    # Dumps without <ns> tags have the namespace stripped from titles
+    title = page.title
+    prefix = namespace_names.get(page.namespace)
+    if page.namespace != 0 and prefix and \
+       not title.startswith(prefix + ":"):
+        title = prefix + ":" + title
+
+    rev_doc = {
+        'revid': revision.id,
+        'parentid': parent_id,
+        'timestamp': revision.timestamp.long_format(),
+        'page': {'pageid': page.id, 'ns': page.namespace, 'title': title}
+    }
+    if not revision.deleted.user and revision.user is not None:
+        rev_doc['user'] = revision.user.text
+        rev_doc['userid'] = revision.user.id or 0
+    if not revision.deleted.comment and revision.comment is not None:
+        rev_doc['comment'] = revision.comment
+    if revision.minor:
+        rev_doc['minor'] = ""
+
+    if revision.slots is not None and 'main' in revision.slots.contents:
+        content = revision.slots.contents['main']
+        main = {'contentmodel': content.model}
+        if content.bytes is not None:
+            rev_doc['size'] = int(content.bytes)
+        if not content.deleted:
+            main['*'] = content.text or ""
+        rev_doc['slots'] = {'main': main}
+
+    return rev_doc
@@ -67,10 +67,16 @@ class OfflineExtractor(Extractor):
 
     def _extract_many(self, rev_ids, features, context=None, caches=None,
                       cache=None, profile=None):
+        rev_ids = list(rev_ids)
+        solve_caches = []
         for rev_id in rev_ids:
-            yield None, self._extract(rev_id, features, context=context,
-                                      cache=caches.get(rev_id, cache),
-                                      profile=profile)
+            solve_cache = caches.get(rev_id, cache)
+            solve_cache = solve_cache if solve_cache is not None else {}
+            solve_cache[revision_oriented.revision.id] = rev_id
+            solve_caches.append(solve_cache)
+
+        yield from self.solve_batch(features, solve_caches, context=context,
+                                    profile=profile)
 
     @classmethod
     def from_config(cls, config, name, section_key="extractors"):
@@ -0,0 +1,120 @@
+"""
+Reorders revisions so that edits to the same page are extracted in the same
+batch.  Batches of consecutive edits to a page can reuse parent revision
+documents (see :class:`~revscoring.extractors.api.Extractor`) and the values
+that were computed for them.
+
+.. autofunction:: revscoring.extractors.locality.reorder
+
+.. autofunction:: revscoring.extractors.locality.restore_order
+
+.. autofunction:: revscoring.extractors.locality.cached_page
+
+.. autofunction:: revscoring.extractors.locality.cached_parent_id
+"""
+from collections import OrderedDict
+
+from more_itertools import chunked
+
+from ..datasources import revision_oriented
+
+
+def reorder(items, window, rev_id=None, page=None, parent=None):
+    """
+    Reorders `items` within windows of `window` items so that revisions of the
+    same page (or of the same chain of parent revisions) are next to each other
+    and parents come before their children.  Groups are kept in the order of
+    their first item.  Yields (position, item) pairs where `position` is the
+    index of the item in `items` so that results can be put back in order with
+    :func:`~revscoring.extractors.locality.restore_order`.
+
+    :Parameters:
+        items : `iterable`
+            Revisions (e.g. rev_ids or observations)
+        window : `int`
+            The number of items to reorder at once
+        rev_id : `func`
+            Returns the rev_id of an item.  Defaults to the item itself.
+        page : `func`
+            Returns a page identifier (e.g. page_id or title) of an item or
+            `None` if it isn't known
+        parent : `func`
+            Returns the parent rev_id of an item or `None` if it isn't known
+    """
+    rev_id = rev_id or _identity
+    start = 0
+    for chunk in chunked(items, int(window)):
+        positioned = list(enumerate(chunk, start))
+        yield from _reorder_window(positioned, rev_id, page, parent)
+        start += len(chunk)
+
+
+def _reorder_window(positioned, rev_id, page, parent):
+    items_by_rev_id = {rev_id(item): item for _, item in positioned}
+
+    groups = OrderedDict()
+    for position, item in positioned:
+        group = _group_of(item, items_by_rev_id, rev_id, page, parent)
+        groups.setdefault(group, []).append((position, item))
+
+    for group_items in groups.values():
+        yield from sorted(group_items,
+                          key=lambda position_item: rev_id(position_item[1]))
+
+
+def _group_of(item, items_by_rev_id, rev_id, page, parent):
+    # Follow the chain of parents in the window until a page is known
+    for _ in range(len(items_by_rev_id)):
+        page_key = page(item) if page is not None else None
+        if page_key is not None:
+            return ('page', page_key)
+        parent_id = parent(item) if parent is not None else None
+        if parent_id is None or parent_id not in items_by_rev_id:
+            break
+        item = items_by_rev_id[parent_id]
+
+    # Otherwise, group by the earliest revision of the chain in the window
+    return ('chain', rev_id(item))
+
+
+def restore_order(positioned_results):
+    """
+    Yields results in the order of their positions.  Results that arrive
+    before those that precede them are held until they can be yielded.
+
+    :Parameters:
+        positioned_results : `iterable` ( (`int`, `mixed`) )
+            (position, result) pairs where positions start at 0
+    """
+    pending = {}
+    next_position = 0
+    for position, result in positioned_results:
+        pending[position] = result
+        while next_position in pending:
+            yield pending.pop(next_position)
+            next_position += 1
+
+
+def cached_page(cache):
+    """
+    Returns the page_id (or title) of a revision from a cache of
+    pre-computed values or `None` if the cache doesn't have either.
+    """
+    cache = cache or {}
+    page_id = cache.get(revision_oriented.revision.page.id)
+    if page_id is not None:
+        return page_id
+    else:
+        return cache.get(revision_oriented.revision.page.title)
+
+
+def cached_parent_id(cache):
+    """
+    Returns the parent rev_id of a revision from a cache of pre-computed
+    values or `None` if the cache doesn't have it.
+    """
+    return (cache or {}).get(revision_oriented.revision.parent.id)
+
+
+def _identity(item):
+    return item
@@ -9,6 +9,7 @@
     :members:
 """
 from math import log as math_log
+from random import random
 
 from revscoring.dependencies import Dependent
 
@@ -31,10 +32,15 @@ class Feature(Dependent):
         dependencies : `list`(`hashable`)
             An ordered list of dependencies that correspond
             to the `*args` of `process`
+        process_batch : `func`
+            An optional function that will generate a `list` of feature
+            values for a `list` of argument `tuple`.
     """
 
-    def __init__(self, name, process=None, *, returns=None, depends_on=None):
-        super().__init__(name, process, depends_on)
+    def __init__(self, name, process=None, *, returns=None, depends_on=None,
+                 process_batch=None):
+        super().__init__(name, process, depends_on,
+                         process_batch=process_batch)
         if returns is None:
             raise TypeError(
                 "__init__() missing required named argument 'returns'")
@@ -48,8 +54,27 @@ class Feature(Dependent):
         else:
             return value
 
-    def __hash__(self):
-        return hash('feature.' + self.name)
+    def call_trusted(self, args, validation_rate=0.0):
+        value = self.process(*args)
+
+        if validation_rate > 0 and random() < validation_rate:
+            return self.validate(value)
+        else:
+            return value
+
+    def call_batch(self, args_list):
+        if self.process_batch is None:
+            # __call__ will validate
+            return super().call_batch(args_list)
+
+        values = super().call_batch(args_list)
+        if __debug__:
+            return [self.validate(value) for value in values]
+        else:
+            return values
+
+    # Defining __eq__ would otherwise unset the inherited __hash__
+    __hash__ = Dependent.__hash__
 
     def __str__(self):
         return "feature." + self.name
@@ -309,25 +334,56 @@ class ne(Comparison):
 class and_(Comparison):
     """
     Generates a feature that represents the conjunction of two
-    :class:`revscoring.Feature` or constant values.
+    :class:`revscoring.Feature` or constant values.  `right` is only solved
+    if `left` is true.
     """
 
     CHAR = "and"
+    deferred = (1,)
 
     def operate(self, left, right):
-        return left and right
+        return left and right()
 
 
 class or_(Comparison):
     """
     Generates a feature that represents the disjunction of two
-    :class:`revscoring.Feature` or constant values.
+    :class:`revscoring.Feature` or constant values.  `right` is only solved
+    if `left` is false.
     """
 
     CHAR = "or"
+    deferred = (1,)
 
     def operate(self, left, right):
-        return left or right
+        return left or right()
+
+
+class if_(Modifier):
+    """
+    Generates a feature that represents the value of `then` if `condition` is
+    true and the value of `else_` otherwise.  Only the branch that is taken
+    is solved.
+    """
+    deferred = (1, 2)
+
+    def __init__(self, condition, then, else_, returns=None, name=None):
+        condition = Feature.or_constant(condition)
+        then = Feature.or_constant(then)
+        else_ = Feature.or_constant(else_)
+
+        if name is None:
+            name = "({0} if {1} else {2})".format(
+                then.name, condition.name, else_.name)
+
+        if returns is None:
+            returns = then.returns
+
+        super().__init__(name, self._process, returns=returns,
+                         depends_on=[condition, then, else_])
+
+    def _process(self, condition, then, else_):
+        return then() if condition else else_()
 
 
 class max(Modifier):
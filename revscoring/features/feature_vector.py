@@ -30,8 +30,5 @@ class FeatureVector(Feature):
 
         return vector
 
-    def __hash__(self):
-        return hash('feature_vector.' + self.name)
-
     def __str__(self):
         return "feature_vector." + self.name
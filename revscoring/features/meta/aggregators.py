@@ -40,6 +40,15 @@ class AggregatorsScalar(Feature):
         else:
             return self.returns(self.func(items))
 
+    def aggregate_items(self, items):
+        if self.func is len_builtin:
+            return self.returns(sum_builtin(1 for _ in items))
+        else:
+            return self.process(list(items))
+
+    def signature(self):
+        return (self.__class__, self.func, self.returns)
+
 
 class AggregatorsVector(FeatureVector):
     def __init__(self, items_datasource, func, name=None, returns=float):
@@ -26,9 +26,16 @@ Modifiers provide convenient mechanisms for modifying and combining
 .. autofunction:: revscoring.features.modifiers.ge
 .. autofunction:: revscoring.features.modifiers.le
 
+----
+
+.. autofunction:: revscoring.features.modifiers.and_
+.. autofunction:: revscoring.features.modifiers.or_
+.. autofunction:: revscoring.features.modifiers.not_
+.. autofunction:: revscoring.features.modifiers.if_
+
 """
-from .feature import (add, and_, div, eq, ge, gt, le, log, lt, max, min, mul,
-                      ne, not_, or_, sub)
+from .feature import (add, and_, div, eq, ge, gt, if_, le, log, lt, max, min,
+                      mul, ne, not_, or_, sub)
 
 __all__ = [add, div, eq, ge, gt, le, log, lt, max, min, mul, ne, sub, and_,
-           or_, not_]
+           or_, not_, if_]
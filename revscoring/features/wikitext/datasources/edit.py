@@ -24,7 +24,8 @@ class Diff(base.BaseDiff):
                 self.revision.parent.paragraphs_sentences_and_whitespace,
                 self.revision.paragraphs_sentences_and_whitespace,
                 self.revision.parent.tokens,
-                self.revision.tokens]
+                self.revision.tokens],
+            version=1
         )
         """
         Returns a tuple that describes the difference between the parent
@@ -16,7 +16,8 @@ class Revision(base.BaseRevision):
 
         self.wikicode = Datasource(
             self._name + ".wikicode",
-            _process_wikicode, depends_on=[revision_datasources.text]
+            _process_wikicode, depends_on=[revision_datasources.text],
+            version=1
         )
         """
         A :class:`mwparserfromhell.wikicode.Wikicode` abstract syntax
@@ -7,15 +7,16 @@ class Revision(parsed.Revision, sentences.Revision, tokenized.Revision):
         # Initializes all of the Revision datasources
         super().__init__(name, revision_datasources)
 
+        # The parent and diff trees are constructed on first access
         if hasattr(revision_datasources, "parent"):
-            self.parent = Revision(
+            self.lazy("parent", lambda: Revision(
                 name + ".parent",
                 revision_datasources.parent
-            )
+            ))
 
         # Initializes the diff using the Revision datasources
         if hasattr(revision_datasources, "diff"):
-            self.diff = Diff(name + ".diff", self)
+            self.lazy("diff", lambda: Diff(name + ".diff", self))
 
 
 class Diff(edit.Diff, sentences.Diff, tokenized.Diff):
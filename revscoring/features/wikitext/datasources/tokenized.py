@@ -18,7 +18,9 @@ class Revision(base.BaseRevision):
 
         if tokens_datasource is None:
             tokens_datasource = tokenized(revision_datasources.text)
-            self.cjk = Revision(self._name + ".cjk", revision_datasources, tokenized(revision_datasources.text, tok_strategy="CJK"))
+            self.lazy("cjk", lambda: Revision(
+                self._name + ".cjk", revision_datasources,
+                tokenized(revision_datasources.text, tok_strategy="CJK")))
         self.tokens = tokens_datasource
 
         """
@@ -28,7 +30,7 @@ class Revision(base.BaseRevision):
         self.paragraphs_sentences_and_whitespace = Datasource(
             self._name + ".paragraphs_sentences_and_whitespace",
             paragraphs_sentences_and_whitespace.segment,
-            depends_on=[self.tokens]
+            depends_on=[self.tokens], version=1
         )
         """
         A list of paragraphs, sentences, and whitespaces as segments.  See
@@ -441,6 +443,12 @@ class TokenIsInTypes:
     def filter(self, token):
         return token.type in self.types
 
+    def __eq__(self, other):
+        return isinstance(other, TokenIsInTypes) and self.types == other.types
+
+    def __hash__(self):
+        return hash(frozenset(self.types))
+
 
 def _process_tokens(text):
     return [t for t in wikitext_split.tokenize(text or "")]
@@ -459,11 +467,12 @@ def tokenized(text_datasource, name=None, tok_strategy="Latin"):
 
     if tok_strategy == "Latin":
         return Datasource(
-            name, _process_tokens, depends_on=[text_datasource]
+            name, _process_tokens, depends_on=[text_datasource], version=1
         )
     elif tok_strategy == "CJK":
         return Datasource(
-            name, _process_tokens_cjk, depends_on=[text_datasource]
+            name, _process_tokens_cjk, depends_on=[text_datasource],
+            version=1
         )
     else:
         raise NotImplementedError
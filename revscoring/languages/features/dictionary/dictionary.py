@@ -15,11 +15,11 @@ class Dictionary(DependentSet):
 
     def __init__(self, name, dictionary_check):
         super().__init__(name)
-        self.revision = features.Revision(
+        self.lazy("revision", lambda: features.Revision(
             name + ".revision",
             datasources.Revision(name + ".revision", dictionary_check,
                                  wikitext.revision.datasources)
-        )
+        ))
         """
         :class:`~revscoring.languages.features.dictionary.Revision` :
         The base revision feature set.
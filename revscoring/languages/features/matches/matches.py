@@ -9,14 +9,14 @@ class Matches(DependentSet):
         super().__init__(name)
         self._match_list = match_list
         self._exclusions = exclusions
-        self.revision = features.Revision(
+        self.lazy("revision", lambda: features.Revision(
             name + ".revision",
             datasources.Revision(
                 name + ".revision", matcher,
                 wikitext.revision.datasources,
                 text_preprocess=text_preprocess
             )
-        )
+        ))
         """
         :class:`~revscoring.languages.features.matches.Revision` :
         The base revision feature set.
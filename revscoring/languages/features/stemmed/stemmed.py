@@ -15,11 +15,11 @@ class Stemmed(DependentSet):
 
     def __init__(self, name, stem_word):
         super().__init__(name)
-        self.revision = features.Revision(
+        self.lazy("revision", lambda: features.Revision(
             name + ".revision",
             datasources.Revision(name + ".revision", stem_word,
                                  wikitext.revision.datasources)
-        )
+        ))
         """
         :class:`~revscoring.languages.features.stemmed.Revision` :
         The base revision feature set.
@@ -16,11 +16,11 @@ class Stopwords(DependentSet):
         super().__init__(name)
         word_is_stopword = WordIsInStopwordSet(stopword_set)
 
-        self.revision = features.Revision(
+        self.lazy("revision", lambda: features.Revision(
             name + ".revision",
             datasources.Revision(name + ".revision", word_is_stopword,
                                  wikitext.revision.datasources)
-        )
+        ))
         """
         :class:`~revscoring.languages.features.stopwords.Revision` :
         The base revision feature set.
@@ -3,6 +3,8 @@ Provides access to a set of utilities for working with revision scorer models.
 
 Utilities:
 
+* benchmark_trusted Compares the time it takes to solve features in normal
+                    and trusted (production) mode
 * check_model       Compares a models construction environment snapshot to the
                     current environment
 * cv_train          Cross-validates, and then trains a Model with extracted features
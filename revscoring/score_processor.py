@@ -1,11 +1,13 @@
 import logging
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from multiprocessing import cpu_count
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, cpu_count
 
 from more_itertools import chunked
 
 from . import dependencies
 from .datasources import Datasource
+from .extractors import locality
+from .extractors.api.extractor import LOOKUP_ERRORS
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +19,17 @@ class ScoreProcessor:
     MAX_IO_WORKERS = 10
 
     def __init__(self, scoring_model, extractor, cpu_workers=None,
-                 io_workers=None, batch_size=50):
+                 io_workers=None, batch_size=50, locality_window=None):
         self.scoring_model = scoring_model
         self.extractor = extractor
         self.cpu_workers = \
             int(cpu_workers) if cpu_workers is not None else cpu_count()
         self.batch_size = int(batch_size)
+        # Edits to the same page are batched together within this many
+        # rev_ids.  Page ids that aren't cached are looked up first.  See
+        # revscoring.extractors.locality.
+        self.locality_window = \
+            int(locality_window) if locality_window is not None else None
 
         if io_workers is not None:
             self.io_workers = int(io_workers)
@@ -32,15 +39,29 @@ class ScoreProcessor:
                                       int(self.cpu_workers *
                                           self.IO_WORKER_MULTIPLIER)))
 
+        # Roots are dug without the extractor's context so that the
+        # revision_oriented datasources are extracted in batch
+        roots = dependencies.dig(self.scoring_model.features)
+        self.root_datasources = [d for d in roots if isinstance(d, Datasource)]
+        # The plan is compiled without the extractor's context too.  Workers
+        # only get root values, so they never need the extractor (or its
+        # session).
+        self.feature_plan = dependencies.compile(
+            self.scoring_model.features, optimize=True, release=True,
+            trusted=getattr(self.extractor, 'trusted', None),
+            validation_rate=getattr(self.extractor, 'validation_rate', 0.0))
+
         logger.info("Starting up IO thread pool with {0} workers"
                     .format(self.io_workers))
         self.scores_ex = ThreadPoolExecutor(max_workers=self.io_workers)
         logger.info("Starting up CPU thread pool with {0} workers"
                     .format(self.cpu_workers))
-        self.process_ex = ProcessPoolExecutor(max_workers=self.cpu_workers)
-
-        roots = dependencies.dig(self.scoring_model.features)
-        self.root_datasources = [d for d in roots if isinstance(d, Datasource)]
+        # The model and plan are sent to each worker once rather than with
+        # every revision.  (ProcessPoolExecutor only takes an initializer as
+        # of python 3.7.)
+        self.process_ex = Pool(
+            processes=self.cpu_workers, initializer=_start_worker,
+            initargs=(self.scoring_model, self.feature_plan))
 
     def __enter__(self):
         return self
@@ -53,6 +74,10 @@ class ScoreProcessor:
         if isinstance(rev_ids, int):
             rev_ids = [rev_ids]
 
+        if self.locality_window is not None:
+            yield from self._score_by_locality(rev_ids, caches, cache)
+            return
+
         batches = batch_rev_caches(chunked(rev_ids, self.batch_size), caches,
                                    cache)
 
@@ -60,6 +85,64 @@ class ScoreProcessor:
             for score in batch_scores:
                 yield score
 
+    def _score_by_locality(self, rev_ids, caches, cache):
+        rev_ids = list(rev_ids)
+        pages, parent_ids = self._get_localities(rev_ids, caches)
+        positioned_batches = list(chunked(
+            locality.reorder(rev_ids, self.locality_window,
+                             page=pages.get, parent=parent_ids.get),
+            self.batch_size))
+        batches = batch_rev_caches(
+            ([rev_id for _, rev_id in positioned_batch]
+             for positioned_batch in positioned_batches),
+            caches, cache)
+
+        batch_scores = self.scores_ex.map(self._score_batch, batches)
+        # Scores are yielded in the order of `rev_ids`
+        yield from locality.restore_order(
+            (position, score)
+            for positioned_batch, scores in zip(positioned_batches,
+                                                batch_scores)
+            for (position, _), score in zip(positioned_batch, scores))
+
+    def _get_localities(self, rev_ids, caches):
+        # Page and parent ids come from `caches`.  Those that aren't cached
+        # are looked up in batches if the extractor can.
+        rev_caches = caches or {}
+        pages = {rev_id: locality.cached_page(rev_caches.get(rev_id))
+                 for rev_id in rev_ids}
+        parent_ids = {
+            rev_id: locality.cached_parent_id(rev_caches.get(rev_id))
+            for rev_id in rev_ids}
+        missing_ids = [rev_id for rev_id in rev_ids
+                       if pages[rev_id] is None and parent_ids[rev_id] is None]
+        if len(missing_ids) == 0:
+            return pages, parent_ids
+
+        if not hasattr(self.extractor, 'get_rev_doc_map'):
+            logger.warning(
+                "Can't group {0} revisions by page without cached page or "
+                "parent ids.  The locality window has no effect on them."
+                .format(len(missing_ids)))
+            return pages, parent_ids
+
+        logger.info("Batch requesting {0} page ids from the API"
+                    .format(len(missing_ids)))
+        try:
+            rev_docs = self.extractor.get_rev_doc_map(
+                missing_ids, rvprop={'ids'})
+        except LOOKUP_ERRORS as e:
+            logger.warning("Failed to look up page ids for locality: {0}"
+                           .format(e))
+            return pages, parent_ids
+
+        for rev_id in missing_ids:
+            rev_doc = rev_docs.get(rev_id)
+            if rev_doc is not None:
+                pages[rev_id] = rev_doc.get('page', {}).get('pageid')
+                parent_ids[rev_id] = rev_doc.get('parentid')
+        return pages, parent_ids
+
     def _score_batch(self, batch_rev_cache):
         id_batch, caches, cache = batch_rev_cache
         logger.debug("running _score_batch() on {0} rev_ids"
@@ -76,29 +159,26 @@ class ScoreProcessor:
         for rev_id, (error, vals) in zip(id_batch, error_values):
             if error:
                 score_cache = {}
-                scoring_model = None
-                extractor = None
             else:
                 score_cache = {}
                 score_cache.update(cache or {})
                 score_cache.update((caches or {}).get(rev_id, {}))
                 score_cache.update({rd: rv for rd, rv in
                                     zip(self.root_datasources, vals)})
-                scoring_model = self.scoring_model
-                extractor = self.extractor
 
-            yield (rev_id, scoring_model, extractor, score_cache, error)
+            yield (rev_id, score_cache, error)
 
     @classmethod
     def _process_score(cls, e_r_caches):
-        rev_id, scoring_model, extractor, cache, error = e_r_caches
+        rev_id, cache, error = e_r_caches
+        scoring_model, feature_plan = _worker
         logger.debug("running _process_score() on {0}".format(rev_id))
 
         if error is None:
 
             try:
-                feature_values = list(extractor.solve(
-                    scoring_model.features, cache=cache))
+                feature_values = list(feature_plan.solve(
+                    cache=dependencies.ValueStore(cache)))
             except Exception as error:
                 logger.debug("An error occured during feature extraction")
                 raise error
@@ -114,6 +194,14 @@ class ScoreProcessor:
             return rev_id, error_score(error)
 
 
+_worker = None
+
+
+def _start_worker(scoring_model, feature_plan):
+    global _worker
+    _worker = scoring_model, feature_plan
+
+
 def error_score(error):
     error_type = error.__class__.__name__
     message = str(error)
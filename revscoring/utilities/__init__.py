@@ -5,6 +5,10 @@ revscoring python package is installed, a `revscoring` utility should be
 available from the commandline.  Run `revscoring -h` for more
 information:
 
+benchmark_trusted
++++++++++++++++++
+.. automodule:: revscoring.utilities.benchmark_trusted
+
 check_model
 +++++++++++
 .. automodule:: revscoring.utilities.check_model
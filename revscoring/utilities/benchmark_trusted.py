@@ -0,0 +1,109 @@
+"""
+``revscoring benchmark_trusted -h``
+::
+
+    Compares the time it takes to solve a list of features per revision in
+    normal and trusted (production) mode.  The values of expensive
+    (versioned) datasources like tokens and diffs are pre-computed so that
+    the benchmark measures per-call overhead.  By default, every wikitext
+    feature of a revision, its parent and their diff (an editquality-style
+    feature list) is solved for a sample of wikitext.
+
+    Usage:
+        benchmark_trusted -h | --help
+        benchmark_trusted [<features>]
+                          [--observations=<num>]
+                          [--rounds=<num>]
+                          [--debug]
+
+    Options:
+        -h --help              Prints this documentation
+        <features>             The classpath to a list of features to solve
+        --observations=<num>   The number of revisions to solve per round
+                               [default: 20]
+        --rounds=<num>         The number of rounds to alternate normal and
+                               trusted mode for [default: 5]
+        --debug                Print debug logging
+"""
+import logging
+import sys
+import time
+
+import docopt
+import yamlconf
+from tabulate import tabulate
+
+from ..datasources import revision_oriented
+from ..dependencies import compile
+from ..features import Feature, wikitext
+
+logger = logging.getLogger(__name__)
+
+TEXT = ("This is some [[wikitext]] with a {{template|arg}}, a " +
+        "<ref>reference</ref> and a https://example.com URL.  " +
+        "SHOUTING and numbers like 1234.\n\n== Heading ==\n") * 20
+
+
+def main(argv=None):
+    args = docopt.docopt(__doc__, argv=argv)
+
+    logging.basicConfig(
+        level=logging.INFO if not args['--debug'] else logging.DEBUG,
+        format='%(asctime)s %(levelname)s:%(name)s -- %(message)s'
+    )
+
+    if args['<features>'] is not None:
+        features = yamlconf.import_path(args['<features>'])
+    else:
+        features = get_features(wikitext.revision, wikitext.revision.parent,
+                                wikitext.revision.diff)
+    observations = int(args['--observations'])
+    rounds = int(args['--rounds'])
+
+    run(features, observations, rounds, sys.stdout)
+
+
+def run(features, observations, rounds, output):
+    cache = get_cache(features)
+    normal_plan = compile(features, trusted=False)
+    trusted_plan = compile(features, trusted=True)
+
+    logger.info("Solving {0} features for {1} revisions in {2} rounds"
+                .format(len(features), observations, rounds))
+    normal = trusted = 0
+    for _ in range(rounds):
+        normal += benchmark(normal_plan, cache, observations) / rounds
+        trusted += benchmark(trusted_plan, cache, observations) / rounds
+
+    output.write(tabulate(
+        [["normal", normal * 1000, ""],
+         ["trusted", trusted * 1000, "{0:.1%}".format(1 - trusted / normal)]],
+        headers=["mode", "ms per revision", "savings"], floatfmt=".2f"))
+    output.write("\n")
+    return normal, trusted
+
+
+def get_features(*feature_sets):
+    features = []
+    for feature_set in feature_sets:
+        features.extend(getattr(feature_set, name)
+                        for name in dir(feature_set)
+                        if isinstance(getattr(feature_set, name), Feature))
+    return features
+
+
+def get_cache(features):
+    cache = {revision_oriented.revision.text: TEXT + "New words. ",
+             revision_oriented.revision.parent.text: TEXT}
+    values = dict(cache)
+    list(compile(features).solve(cache=values))
+    cache.update((dependent, value) for dependent, value in values.items()
+                 if getattr(dependent, "version", None) is not None)
+    return cache
+
+
+def benchmark(plan, cache, observations):
+    start = time.perf_counter()
+    for _ in range(observations):
+        list(plan.solve(cache=dict(cache)))
+    return (time.perf_counter() - start) / observations
@@ -69,7 +69,7 @@ import sys
 import docopt
 import yamlconf
 
-from ..dependencies import solve
+from ..dependencies import ValueStore, compile
 from .util import read_labels_and_population_rates, read_observations
 from .. import errors
 
@@ -148,9 +148,11 @@ def cv_train(model, value_labels, folds, workers):
 
 
 def read_value_labels(features, label_name, observations):
+    feature_plan = compile(features, optimize=True, release=True)
     for i, ob in enumerate(observations):
         try:
-            yield (list(solve(features, cache=ob['cache'])), ob[label_name])
+            values = feature_plan.solve(cache=ValueStore(ob['cache']))
+            yield (list(values), ob[label_name])
         except errors.DependencyError as e:
             logger.warn("Failed to extract dependencies (line:{0}): {1}"
                         .format(i + 1, e))
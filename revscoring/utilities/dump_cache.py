@@ -29,7 +29,7 @@ import docopt
 import mysqltsv
 import yamlconf
 from revscoring import Model
-from revscoring.dependencies import solve
+from revscoring.dependencies import ValueStore, compile
 from revscoring.utilities.util import read_observations
 
 
@@ -75,9 +75,11 @@ def run(observations, output, features, label_name, model, additional_fields,
     headers.extend(additional_fields)
     writer = mysqltsv.Writer(output, headers=headers)
 
+    feature_plan = compile(features, optimize=True, release=True)
     for ob in observations:
         try:
-            feature_values = list(solve(features, cache=ob['cache']))
+            feature_values = list(
+                feature_plan.solve(cache=ValueStore(ob['cache'])))
             row = feature_values + [ob[label_name]]
             if model is not None:
                 score_doc = model.score(feature_values)
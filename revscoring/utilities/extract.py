@@ -14,8 +14,10 @@
                                             [--output=<path>]
                                             [--extractors=<num>]
                                             [--batch-size=<num>]
+                                            [--locality-window=<num>]
                                             [--login]
                                             [--profile=<path>]
+                                            [--flamegraph=<path>]
                                             [--verbose] [--debug]
 
     Options:
@@ -32,15 +34,24 @@
                                 [default: <cpu count>]
         --batch-size=<num>      The number of rev_ids to batch together per
                                 request to the API [default: 50]
+        --locality-window=<num>  If set, observations of the same page (by
+                                "page_id", "page_title" or a cached page or
+                                parent rev_id) within this many observations
+                                are extracted in the same batch.  Output
+                                stays in input order.
         --login                 If set, prompt for username and password
         --profile=<path>        Path to a file to write extraction profiling
                                 output
+        --flamegraph=<path>     Path to a file to write collapsed stacks of
+                                extraction profiling to (for flamegraph.pl or
+                                speedscope)
         --verbose               Print dots and stuff
         --debug                 Print debug logging
 """
 import logging
 import sys
 import time
+from collections import defaultdict
 from itertools import islice, tee
 from multiprocessing import Pool, cpu_count
 from statistics import mean, median
@@ -52,9 +63,9 @@ import yamlconf
 from tabulate import tabulate
 from tqdm import tqdm
 
-from ..dependencies import Dependent
+from ..dependencies import Dependent, Profiler
 from ..errors import CommentDeleted, RevisionNotFound, TextDeleted, UserDeleted
-from ..extractors import api
+from ..extractors import api, locality
 from .util import dump_observation, read_observations
 
 logger = logging.getLogger(__name__)
@@ -99,31 +110,43 @@ def main(argv=None):
 
     batch_size = int(args['--batch-size'])
 
+    if args['--locality-window'] is not None:
+        locality_window = int(args['--locality-window'])
+    else:
+        locality_window = None
+
     if args['--profile'] is not None:
         profile_f = open(args['--profile'], 'w')
     else:
         profile_f = None
 
+    if args['--flamegraph'] is not None:
+        flamegraph_f = open(args['--flamegraph'], 'w')
+    else:
+        flamegraph_f = None
+
     verbose = args['--verbose']
     debug = args['--debug']
 
     run(observations, output, dependents, extractor, extractors, batch_size,
-        profile_f, verbose, debug)
+        profile_f, verbose, debug, flamegraph_f=flamegraph_f,
+        locality_window=locality_window)
 
 
 def run(observations, output, dependents, extractor, extractors, batch_size,
-        profile_f, verbose, debug):
+        profile_f, verbose, debug, flamegraph_f=None, locality_window=None):
     logging.basicConfig(
         level=logging.WARNING if not debug else logging.DEBUG,
         format='%(asctime)s %(levelname)s:%(name)s -- %(message)s'
     )
 
-    profile = {}
+    profile = Profiler()
     observations, observations2 = tee(observations)
     number_of_observations = sum(1 for line in observations2)
     results = extract(dependents, observations, extractor,
                       extractors=extractors,
-                      batch_size=batch_size, profile=profile)
+                      batch_size=batch_size, profile=profile,
+                      locality_window=locality_window)
 
     tq = tqdm(results, file=sys.stderr, total=number_of_observations)
     verbose_result = ''
@@ -151,29 +174,60 @@ def run(observations, output, dependents, extractor, extractors, batch_size,
     if profile_f is not None:
         write_profile(profile_f, dependents, profile, batch_size)
 
+    if flamegraph_f is not None:
+        profile.write_collapsed_stacks(flamegraph_f)
 
-def extract(dependents, observations, extractor, extractors="<cpu count>",
-            batch_size=50, profile=None):
 
+def extract(dependents, observations, extractor, extractors="<cpu count>",
+            batch_size=50, profile=None, locality_window=None):
+    """
+    Extracts dependents for observations in batches using a pool of
+    `extractors` worker processes.  If a
+    :class:`~revscoring.dependencies.Profiler` is provided as `profile`, the
+    profiles of all workers will be merged into it.  If `locality_window` is
+    set, observations of the same page within that many observations are
+    extracted in the same batch (see
+    :func:`~revscoring.extractors.locality.reorder`).  Results are yielded in
+    the order of `observations` either way.
+    """
     extractor_context = ConfiguredExtractor(extractor, dependents)
     extractor_pool = Pool(processes=extractors)
 
-    observation_batches = batch(observations, batch_size)
+    if locality_window is None:
+        positioned = enumerate(observations)
+    else:
+        positioned = locality.reorder(
+            observations, locality_window, rev_id=observation_rev_id,
+            page=observation_page, parent=observation_parent_id)
+    positioned_batches = batch(positioned, batch_size)
 
     result_batches = extractor_pool.imap(
-        extractor_context.extract, observation_batches)
+        extractor_context.extract_positioned, positioned_batches)
 
-    combined_profile = profile if profile is not None else {}
-    combined_profile['per_batch_duration'] = []
+    def positioned_results():
+        for results, batch_profile in result_batches:
+            if profile is not None:
+                profile.merge(batch_profile)
+            yield from results
+
+    yield from locality.restore_order(positioned_results())
+
+
+def observation_rev_id(observation):
+    return observation['rev_id']
+
+
+def observation_page(observation):
+    if observation.get('page_id') is not None:
+        return observation['page_id']
+    elif observation.get('page_title') is not None:
+        return observation['page_title']
+    else:
+        return locality.cached_page(observation.get('cache'))
 
-    for results, batch_profile, batch_duration in result_batches:
-        if len(results) == batch_size:
-            combined_profile['per_batch_duration'].append(batch_duration)
-        else:
-            combined_profile['per_batch_duration'].append(
-                batch_duration / (len(results) / batch_size))
-        combine_profiles(combined_profile, batch_profile)
-        yield from results
+
+def observation_parent_id(observation):
+    return locality.cached_parent_id(observation.get('cache'))
 
 
 def batch(iterable, size):
@@ -185,14 +239,6 @@ def batch(iterable, size):
             break
 
 
-def combine_profiles(profile, new_profile):
-    for stat, vals in new_profile.items():
-        if stat in profile:
-            profile[stat].extend(vals)
-        else:
-            profile[stat] = vals
-
-
 class ConfiguredExtractor:
 
     def __init__(self, extractor, dependents):
@@ -201,10 +247,10 @@ class ConfiguredExtractor:
 
     def extract(self, observations):
         rev_ids = [ob['rev_id'] for ob in observations]
-        profile = {}
+        profile = Profiler()
         caches = {ob['rev_id']: ob['cache'] for ob in observations
                   if 'cache' in ob}
-        start = time.time()
+        start = time.perf_counter()
         extractions = self.extractor.extract(
             rev_ids, self.dependents, caches=caches, profile=profile)
         results = []
@@ -217,9 +263,14 @@ class ConfiguredExtractor:
 
             results.append((e, observation))
 
-        duration = time.time() - start
-        profile = {str(d): s for d, s in profile.items()}
-        return results, profile, duration
+        profile.record_batch(len(observations), time.perf_counter() - start)
+        return results, profile
+
+    def extract_positioned(self, positioned_observations):
+        positions = [position for position, _ in positioned_observations]
+        results, profile = self.extract(
+            [observation for _, observation in positioned_observations])
+        return list(zip(positions, results)), profile
 
 
 def write_profile(profile_f, dependents, profile, batch_size):
@@ -230,29 +281,30 @@ def write_profile(profile_f, dependents, profile, batch_size):
     profile_f.write("\n")
     profile_f.write("Batch size: {0}\n\n".format(batch_size))
 
+    # Scale partial batches to the duration of a full batch
+    per_batch_duration = [duration * batch_size / size
+                          for size, duration in profile.batches]
     table = tabulate(
-        [('batch_extractions', len(profile['per_batch_duration'])),
-         ('total_time', round(sum(profile['per_batch_duration']), 3)),
-         ('min_time', round(min(profile['per_batch_duration']), 3)),
-         ('max_time', round(max(profile['per_batch_duration']), 3)),
-         ('mean_time', round(mean(profile['per_batch_duration']), 3)),
-         ('median_time', round(median(profile['per_batch_duration']), 3))],
+        [('batch_extractions', len(per_batch_duration)),
+         ('total_time', round(sum(per_batch_duration), 3)),
+         ('min_time', round(min(per_batch_duration), 3)),
+         ('max_time', round(max(per_batch_duration), 3)),
+         ('mean_time', round(mean(per_batch_duration), 3)),
+         ('median_time', round(median(per_batch_duration), 3))],
         headers=["stat", "value"],
         tablefmt="pipe"
     )
     profile_f.write(table + "\n\n")
-    del profile['per_batch_duration']
+
+    if len(profile.requests) > 0:
+        write_request_profiles(profile_f, profile.requests)
 
     feature_profiles = []
     datasource_profiles = []
     misc_profiles = []
-    for dependent_name, durations in profile.items():
-        row = (dependent_name.replace("<", "\\<").replace(">", "\\>"),
-               len(durations),
-               round(min(durations), 3),
-               round(max(durations), 3),
-               round(mean(durations), 3),
-               round(median(durations), 3))
+    for dependent_name, stats in profile.stats.items():
+        row = (dependent_name.replace("<", "\\<").replace(">", "\\>"),) + \
+            tuple(round(val, 3) for val in stats.row())
         if "feature." in dependent_name:
             feature_profiles.append(row)
         elif "datasource." in dependent_name:
@@ -273,12 +325,34 @@ def write_profile(profile_f, dependents, profile, batch_size):
         write_dependent_profiles(profile_f, misc_profiles)
 
 
+def write_request_profiles(profile_f, requests):
+    sizes = defaultdict(list)
+    durations = defaultdict(list)
+    for kind, size, _, duration in requests:
+        sizes[kind].append(size)
+        durations[kind].append(duration)
+
+    profile_f.write("# Requests\n")
+    table = tabulate(
+        [(kind, len(sizes[kind]), min(sizes[kind]), max(sizes[kind]),
+          round(mean(sizes[kind]), 1), round(mean(durations[kind]), 3),
+          round(max(durations[kind]), 3))
+         for kind in sorted(sizes)],
+        headers=["kind", "requests", "min_size", "max_size", "mean_size",
+                 "mean_time", "max_time"],
+        tablefmt="pipe"
+    )
+    profile_f.write(table + "\n\n")
+
+
 def write_dependent_profiles(profile_f, dependent_profiles):
     if len(dependent_profiles) > 0:
-        dependent_profiles.sort(key=lambda row: row[4], reverse=True)
+        # Sort by total exclusive time
+        dependent_profiles.sort(key=lambda row: row[3], reverse=True)
         table = tabulate(
             dependent_profiles[0:25],
-            headers=["name", "executions", "min", "max", "mean", "median"],
+            headers=["name", "executions", "cache_hits", "exclusive",
+                     "inclusive", "min", "max", "mean", "median"],
             tablefmt="pipe"
         )
         profile_f.write(table + "\n")
@@ -31,7 +31,7 @@ import sys
 import docopt
 import yamlconf
 
-from ..dependencies import solve
+from ..dependencies import ValueStore, compile
 from .util import read_observations
 
 logger = logging.getLogger(__name__)
@@ -55,8 +55,10 @@ def main(argv=None):
         observations = read_observations(open(args['--input']))
 
     logger.info("Reading observations...")
+    dependency_plan = compile(dependent.dependencies, optimize=True,
+                              release=True)
     value_labels = [
-        (list(solve(dependent.dependencies, cache=ob['cache'])),
+        (list(dependency_plan.solve(cache=ValueStore(ob['cache']))),
          ob[label_name])
         for ob in observations]
     logger.debug(" -- {0} observations gathered".format(len(value_labels)))
@@ -26,7 +26,7 @@ import sys
 
 import docopt
 
-from ..dependencies import solve
+from ..dependencies import ValueStore, compile
 from ..scoring import Model, models
 from .util import read_observations
 
@@ -49,8 +49,11 @@ def main(argv=None):
         observations = read_observations(open(args['--observations']))
 
     label_name = args['<label>']
+    feature_plan = compile(scoring_model.features, optimize=True,
+                           release=True)
     value_labels = \
-        [(solve(scoring_model.features, cache=ob['cache']), ob[label_name])
+        [(feature_plan.solve(cache=ValueStore(ob['cache'])),
+          ob[label_name])
          for ob in observations]
 
     if args['--model-file'] is None:
@@ -82,7 +82,7 @@ from tabulate import tabulate
 
 from . import util
 from ..about import __version__
-from ..dependencies import solve
+from ..dependencies import ValueStore, compile
 from ..scoring.models import util as model_util
 from .util import Timeout, read_observations
 
@@ -110,8 +110,10 @@ def main(argv=None):
 
     logger.info("Reading feature values & labels...")
     label_name = args['<label>']
+    feature_plan = compile(features, optimize=True, release=True)
     value_labels = \
-        [(list(solve(features, cache=ob['cache'])), ob[label_name])
+        [(list(feature_plan.solve(cache=ValueStore(ob['cache']))),
+          ob[label_name])
          for ob in observations]
 
     statistic_path = args['<statistic>']
@@ -0,0 +1,24 @@
+import socketserver
+import threading
+from http.server import HTTPServer
+
+from pytest import fixture
+
+from .extractors.api.tests.stand_in_api import API
+
+
+# http.server.ThreadingHTTPServer was added in python 3.7
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@fixture
+def host():
+    API.requests = []
+    API.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), API)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}".format(server.server_port)
+    server.shutdown()
+    server.server_close()
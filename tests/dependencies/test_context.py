@@ -36,9 +36,92 @@ def test_context():
 
     assert set(context.expand([foobar])) == {foo, bar, foobar}
 
+    plan = context.compile([foobar])
+    assert list(plan.solve()) == ["foobuzz"]
+    assert list(plan.solve(cache={foo: "fuzz"})) == ["fuzzbuzz"]
+
     context.update(context={bar: bar})
     assert set(context.dig([foobar])) == {foo, bar}
 
     assert (context.draw(foobar) == " - <dependent.foobar>\n" +
             "\t - <dependent.foo>\n" +
             "\t - <dependent.bar>\n")
+
+
+def test_layered_context():
+    foo = Dependent("foo", lambda: "foo")
+    bar = Dependent("bar", lambda: "bar")
+    foobar = Dependent("foobar", lambda foo, bar: foo + bar,
+                       depends_on=[foo, bar])
+    context = Context(context={bar: lambda: "baz"}, cache={foo: "fuzz"})
+
+    # A call-specific context overlays the context without modifying it
+    assert context.solve(foobar, context={foo: lambda: "buzz"}) == "fuzzbaz"
+    assert context.solve(foobar, context={bar: lambda: "buzz"}) == \
+        "fuzzbuzz"
+    assert context.context == {bar: context.context[bar]}
+
+    # The context's cache is read through and new values go to the call's
+    # cache
+    cache = {}
+    assert context.solve(foobar, cache=cache) == "fuzzbaz"
+    assert cache[foobar] == "fuzzbaz"
+    assert foo not in cache
+    assert context.cache == {foo: "fuzz"}
+
+
+def test_expansion():
+    foo = Dependent("foo")
+    bar = Dependent("bar")
+    foobar = Dependent("foobar", lambda foo, bar: foo + bar,
+                       depends_on=[foo, bar])
+    context = Context()
+
+    expansion = context.expansion([foobar])
+    assert expansion.dependents == {foo, bar, foobar}
+    assert set(expansion.roots) == {foo, bar}
+    assert sorted(expansion.names) == \
+        ["dependent.bar", "dependent.foo", "dependent.foobar"]
+    assert context.expansion([foobar]) is expansion
+
+    # A call-specific context isn't memoized
+    baz = Dependent("baz")
+    expansion = context.expansion([foobar], context={bar: baz})
+    assert set(expansion.roots) == {foo, baz}
+    assert context.expansion([foobar], context={bar: baz}) is not expansion
+
+    # Updating the context invalidates the memo
+    context.update(context={bar: baz})
+    assert set(context.expansion([foobar]).roots) == {foo, baz}
+
+
+def test_expansion_memo():
+    context = Context()
+    context.MAX_EXPANSIONS = 2
+    foo = Dependent("foo")
+    bar = Dependent("bar")
+    baz = Dependent("baz")
+
+    for dependent in [foo, bar, foo, baz]:
+        context.expansion([dependent])
+    # The least recently used expansion is dropped
+    assert list(context._expansions) == [(foo,), (baz,)]
+
+
+def test_plan_memo():
+    context = Context()
+    context.MAX_PLANS = 2
+    foo = Dependent("foo", lambda: "foo")
+    bar = Dependent("bar", lambda: "bar")
+    baz = Dependent("baz", lambda: "baz")
+
+    for dependent in [foo, bar, foo, baz]:
+        context.solve([dependent])
+    # The least recently used plan is dropped
+    assert list(context._plans) == [(foo,), (baz,)]
+
+    # Fully cached requests don't compile a plan
+    context = Context()
+    assert list(context.solve([foo, bar], cache={foo: 1, bar: 2})) == [1, 2]
+    assert context.solve(foo, cache={foo: 1}) == 1
+    assert len(context._plans) == 0
@@ -63,11 +63,71 @@ def test_dependent_set():
     assert my_dependents | {e} == {c, d, e, f}
     assert my_dependents - {f} == {c, d}
 
+    # Registering with a sub-set updates its parents
+    g = Dependent('g')
+    my_sub_dependents.g = g
+    assert g in my_dependents
+    assert len(my_dependents) == 4
+
     assert pickle.loads(pickle.dumps(my_dependents)) == my_dependents
 
 
+def test_lazy_dependent_set():
+    constructed = []
+
+    def construct_sub_dependents():
+        constructed.append(True)
+        sub_dependents = DependentSet("my_dependents.sub")
+        sub_dependents.d = Dependent("d")
+        return sub_dependents
+
+    my_dependents = DependentSet("my_dependents")
+    my_dependents.c = Dependent("c")
+    my_dependents.lazy("sub", construct_sub_dependents)
+    assert constructed == []
+    assert my_dependents.has_member("sub")
+    assert "sub" in dir(my_dependents)
+
+    # Members are constructed once on first access
+    assert my_dependents.sub.d == Dependent("d")
+    assert my_dependents.sub.d == Dependent("d")
+    assert constructed == [True]
+
+    # ... or when the set is used as a set
+    my_dependents.lazy("sub2", construct_sub_dependents)
+    assert Dependent("d") in my_dependents
+    assert constructed == [True, True]
+    assert not my_dependents.has_member("sub3")
+
+    my_dependents.lazy("sub3", construct_sub_dependents)
+    my_dependents = pickle.loads(pickle.dumps(my_dependents))
+    assert len(constructed) == 3
+    assert len(my_dependents) == 2
+
+    # State that was pickled without lazy members or an index
+    old_dependents = DependentSet.__new__(DependentSet)
+    old_dependents.__setstate__({'_name': "old_dependents",
+                                 '_dependents': {Dependent("c")},
+                                 '_dependent_sets': set()})
+    assert Dependent("c") in old_dependents
+    assert len(old_dependents) == 1
+
+
 def test_duplicate_feature_warning():
     my_dependents = DependentSet("my_dependents")
     my_dependents.c = Dependent('c')  # Same!
     my_dependents.d = Dependent('d')
     my_dependents.e = Dependent('c')  # Same!
+
+
+def test_pickle():
+    foobar = Dependent("foobar")
+    my_foobar = pickle.loads(pickle.dumps(foobar))
+    assert my_foobar == foobar
+    assert hash(my_foobar) == hash(foobar)
+    assert my_foobar._id == foobar._id
+
+    # A dependent can be hashed while a cyclic graph is unpickled
+    foobar.consumers = {foobar: 1}
+    my_foobar = pickle.loads(pickle.dumps(foobar))
+    assert my_foobar.consumers == {foobar: 1}
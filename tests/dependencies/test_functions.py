@@ -1,8 +1,9 @@
 from pytest import raises
 
 from revscoring.dependencies.dependent import Dependent
-from revscoring.dependencies.functions import (dig, draw, expand,
-                                               normalize_context, solve)
+from revscoring.dependencies.functions import (compile, dig, draw, expand,
+                                               normalize_context, solve,
+                                               solve_batch)
 from revscoring.errors import DependencyError, DependencyLoop
 
 
@@ -153,3 +154,41 @@ def test_not_implemented_error():
 def test_normalize_context_fail():
     with raises(TypeError):
         normalize_context(15)
+
+
+def test_compile():
+    foo = Dependent("foo", lambda: "foo")
+    bar = Dependent("bar", lambda: "bar")
+    foobar = Dependent("foobar", lambda foo, bar: foo + bar,
+                       depends_on=[foo, bar])
+
+    plan = compile(foobar)
+    assert plan.solve() == "foobar"
+    assert plan.solve(cache={bar: "baz"}) == "foobaz"
+    assert plan.solve(cache={"dependent.foobar": "foobaz"}) == "foobaz"
+
+    plan = compile([foo, foobar, foobar])
+    assert list(plan.solve()) == ["foo", "foobar", "foobar"]
+    assert len(plan) == 3
+
+    mybar = Dependent("bar", lambda: "baz")
+    plan = compile([foobar], context={mybar})
+    assert list(plan.solve()) == ["foobaz"]
+
+
+def test_solve_batch():
+    foo = Dependent("foo")
+    bar = Dependent("bar", lambda foo: foo + "bar", depends_on=[foo],
+                    process_batch=lambda args_list: [foo + "BAR"
+                                                     for foo, in args_list])
+    barbaz = Dependent("barbaz", lambda bar: bar + "baz", depends_on=[bar])
+
+    caches = [{foo: "foo"}, {}, {foo: "fu"}, {bar: "bar"}]
+    error_values = solve_batch([barbaz, foo], caches)
+    assert error_values[0] == (None, ["fooBARbaz", "foo"])
+    assert isinstance(error_values[1][0], DependencyError)
+    assert error_values[2] == (None, ["fuBARbaz", "fu"])
+    assert isinstance(error_values[3][0], DependencyError)
+    assert caches[0][bar] == "fooBAR"
+
+    assert solve_batch(barbaz, [{foo: "foo"}]) == [(None, "fooBARbaz")]
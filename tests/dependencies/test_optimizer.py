@@ -0,0 +1,90 @@
+import pickle
+
+from revscoring.datasources.datasource import Datasource
+from revscoring.datasources.meta import filters, mappers
+from revscoring.dependencies.functions import compile
+from revscoring.dependencies.optimizer import Fused
+from revscoring.features.meta import aggregators
+
+words = Datasource("words")
+
+
+def is_short(word):
+    return len(word) < 4
+
+
+def test_merge():
+    short_words = filters.filter(is_short, words, name="short_words")
+    little_words = filters.filter(is_short, words, name="little_words")
+    lower_words = mappers.lower_case(words, name="lower_words")
+    lowered_words = mappers.lower_case(words, name="lowered_words")
+
+    features = [aggregators.len(short_words), aggregators.len(little_words),
+                aggregators.len(lower_words), aggregators.len(lowered_words)]
+    plan = compile(features, optimize=True)
+    assert len(plan) < len(compile(features))
+    assert sum(rewrite.startswith("merged") for rewrite in plan.rewrites) == 4
+
+    cache = {words: ["Foo", "Barbaz", "a"]}
+    assert list(plan.solve(cache=cache)) == [2, 2, 3, 3]
+    assert list(pickle.loads(pickle.dumps(plan)).solve(cache=cache)) == \
+        [2, 2, 3, 3]
+
+
+class longer_than(filters.filter):
+    def __init__(self, length, words, name=None):
+        self.length = length
+        super().__init__(self.is_longer, words, name=name)
+
+    def is_longer(self, word):
+        return len(word) > self.length
+
+
+class longer_than_any(longer_than):
+    def __init__(self, lengths, words, name=None):
+        super().__init__(max(lengths), words, name=name)
+        self.lengths = lengths
+
+
+def test_merge_bound_methods():
+    # Methods bound to a dependent read its state
+    long_words = longer_than(3, words, name="long_words")
+    longer_words = longer_than(5, words, name="longer_words")
+    lengthy_words = longer_than(5, words, name="lengthy_words")
+    features = [aggregators.len(long_words), aggregators.len(longer_words),
+                aggregators.len(lengthy_words)]
+    plan = compile(features, optimize=True)
+    assert sum(rewrite.startswith("merged") for rewrite in plan.rewrites) == 2
+    cache = {words: ["Foo", "Barbaz", "Quux"]}
+    assert list(plan.solve(cache=cache)) == [2, 1, 1]
+
+    # Unhashable state isn't merged
+    features = [aggregators.len(longer_than_any([3], words, name="a")),
+                aggregators.len(longer_than_any([3], words, name="b"))]
+    plan = compile(features, optimize=True)
+    assert not any(rewrite.startswith("merged") for rewrite in plan.rewrites)
+
+
+def test_fuse():
+    lower_words = mappers.lower_case(words)
+    short_words = filters.filter(is_short, lower_words)
+    short_words_count = aggregators.len(short_words)
+    lower_words_count = aggregators.len(lower_words)
+
+    plan = compile([short_words_count, lower_words_count], optimize=True)
+    # lower_words is used by two dependents, so it isn't fused away
+    assert len(plan) == 4
+    assert isinstance(plan.steps[2][1], Fused)
+    assert plan.rewrites == [
+        "fused {0} into {1}".format(short_words, short_words_count)]
+
+    cache = {words: ["Foo", "Barbaz", "a"]}
+    assert list(plan.solve(cache=cache)) == [2, 3]
+    assert cache[short_words_count] == 2
+    assert short_words not in cache
+
+    plan = compile(aggregators.len(filters.filter(is_short, words)),
+                   optimize=True)
+    assert len(plan) == 2
+    assert plan.solve(cache={words: []}) == 0
+    assert plan.solve(cache={words: ["a", "b", "cdefg"]}) == 2
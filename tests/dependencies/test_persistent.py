@@ -0,0 +1,106 @@
+import os
+import pickle
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from revscoring.dependencies.dependent import Dependent
+from revscoring.dependencies.functions import compile, solve
+from revscoring.dependencies.persistent import PersistentCache
+from revscoring.dependencies.store import MISSING
+
+
+def test_persistent_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite")
+        cache = PersistentCache(path, memory_size=100)
+        assert cache.get(b"foo") is MISSING
+        cache.set(b"foo", ["f", "o", "o"])
+        assert cache.get(b"foo") == ["f", "o", "o"]
+        assert cache.memory_hits == 1
+
+        # Too big for the memory tier.  Read from disk.
+        cache.set(b"bar", "bar" * 100)
+        assert cache.get(b"bar") == "bar" * 100
+        assert cache.hits == 1
+
+        stats = cache.stats()
+        assert stats['misses'] == 1
+        assert stats['writes'] == 2
+        assert stats['hit_rate'] == 2 / 3
+
+        # Values persist across processes
+        cache = pickle.loads(pickle.dumps(cache))
+        assert cache.get(b"foo") == ["f", "o", "o"]
+        assert cache.hits == 1
+        cache.close()
+
+        # Least recently used values are evicted
+        cache = PersistentCache(path, max_size=400, memory_size=0)
+        cache.get(b"foo")
+        cache.set(b"baz", "baz" * 100)
+        assert cache.evictions > 0
+        assert cache.get(b"bar") is MISSING
+        assert cache.get(b"foo") == ["f", "o", "o"]
+        cache.close()
+
+
+def test_plan_persistent_cache():
+    processed = []
+
+    def count_words(text):
+        processed.append(text)
+        return len(text.split())
+
+    text = Dependent("text")
+    words = Dependent("words", count_words, depends_on=[text], version=1)
+    double_words = Dependent("double_words", lambda n: n * 2,
+                             depends_on=[words])
+    persistent_cache = PersistentCache()
+
+    assert solve(double_words, cache={text: "foo bar"},
+                 persistent_cache=persistent_cache) == 4
+    assert solve(double_words, cache={text: "foo bar"},
+                 persistent_cache=persistent_cache) == 4
+    assert solve(double_words, cache={text: "foo bar baz"},
+                 persistent_cache=persistent_cache) == 6
+    assert processed == ["foo bar", "foo bar baz"]
+
+    plan = compile(double_words)
+    assert plan.solve_batch([{text: "foo bar"}, {text: "foo"}],
+                            persistent_cache=persistent_cache) == \
+        [(None, 4), (None, 2)]
+    assert processed == ["foo bar", "foo bar baz", "foo"]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert plan.solve(cache={text: "foo"}, executor=executor,
+                          persistent_cache=persistent_cache) == 2
+    assert processed == ["foo bar", "foo bar baz", "foo"]
+
+    # A new version isn't confused with the old one
+    words.version = 2
+    assert solve(double_words, cache={text: "foo"},
+                 persistent_cache=persistent_cache) == 2
+    assert processed == ["foo bar", "foo bar baz", "foo", "foo"]
+
+
+def test_persistent_cache_writes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite")
+        cache = PersistentCache(path, memory_size=0)
+
+        # Replacing a value doesn't count its old size
+        cache.set(b"foo", "foo" * 100)
+        cache.set(b"foo", "foo" * 10)
+        assert cache.disk_used == cache._query_disk_used()
+
+        # Reads don't write access times until a batch is full
+        keys = [str(i).encode() for i in range(cache.TOUCH_BATCH)]
+        for key in keys:
+            cache.set(key, key)
+        changes = cache.db.total_changes
+        for key in keys[:-1]:
+            assert cache.get(key) == key
+        assert cache.db.total_changes == changes
+        assert cache.get(keys[-1]) == keys[-1]
+        assert cache.db.total_changes == changes + len(keys)
+        cache.close()
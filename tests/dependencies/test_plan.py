@@ -0,0 +1,191 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest import raises
+
+from revscoring.dependencies.dependent import Dependent
+from revscoring.dependencies.functions import compile
+from revscoring.errors import DependencyError, DependencyLoop
+
+
+def fooify(value):
+    return value + "foo"
+
+
+def test_plan():
+    foo = Dependent("foo")
+    foofoo = Dependent("foofoo", fooify, depends_on=[foo])
+    foofoofoo = Dependent("foofoofoo", fooify, depends_on=[foofoo])
+
+    plan = compile([foofoofoo, foofoo])
+    assert len(plan) == 3
+
+    # The plan can be solved against many caches
+    for value in ["a", "b", "c"]:
+        cache = {foo: value}
+        assert list(plan.solve(cache=cache)) == \
+            [value + "foofoo", value + "foo"]
+        assert cache[foofoo] == value + "foo"
+
+    # Dependencies of cached values are not solved
+    assert list(plan.solve(cache={foofoo: "bar"})) == ["barfoo", "bar"]
+
+    profile = {}
+    list(plan.solve(cache={foo: "a"}, profile=profile))
+    assert set(profile.keys()) == {foofoo, foofoofoo}
+
+    plan = pickle.loads(pickle.dumps(plan))
+    assert list(plan.solve(cache={foo: "a"})) == ["afoofoo", "afoo"]
+
+
+def test_plan_loop():
+    foo = Dependent("foo")
+    bar = Dependent("bar", depends_on=[foo])
+    my_foo = Dependent("foo", depends_on=[bar])
+
+    with raises(DependencyLoop):
+        compile(bar, context={my_foo})
+
+
+def test_plan_executor():
+    foo = Dependent("foo")
+    foofoo = Dependent("foofoo", fooify, depends_on=[foo])
+    barfoo = Dependent("barfoo", fooify, depends_on=[Dependent("bar")])
+    foofoobarfoo = Dependent("foofoobarfoo", lambda a, b: a + b,
+                             depends_on=[foofoo, barfoo])
+
+    plan = compile([foofoobarfoo, foofoo, barfoo])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cache = {"dependent.foo": "foo", "dependent.bar": "bar"}
+        assert list(plan.solve(cache=cache, executor=executor)) == \
+            ["foofoobarfoo", "foofoo", "barfoo"]
+        assert cache[foofoobarfoo] == "foofoobarfoo"
+
+        cache = {"dependent.foo": "foo", barfoo: "baz"}
+        assert list(plan.solve(cache=cache, executor=executor)) == \
+            ["foofoobaz", "foofoo", "baz"]
+
+        with raises(DependencyError):
+            list(plan.solve(cache={"dependent.foo": "foo"},
+                            executor=executor))
+
+
+def test_plan_deferred():
+    solved = []
+
+    def record(value):
+        solved.append(value)
+        return value
+
+    foo = Dependent("foo", record, depends_on=[Dependent("bar")])
+    baz = Dependent("baz", record, depends_on=[Dependent("qux")])
+    choose = Dependent("choose", lambda cond, a, b: a() if cond else b(),
+                       depends_on=[Dependent("cond"), foo, baz])
+    choose.deferred = (1, 2)
+
+    plan = compile([choose, foo])
+    cache = {"dependent.cond": False, "dependent.bar": "bar",
+             "dependent.qux": "qux"}
+    assert list(plan.solve(cache=cache)) == ["qux", "bar"]
+    assert sorted(solved) == ["bar", "qux"]
+
+    # The untaken branch is never solved
+    solved.clear()
+    cache = {"dependent.cond": True, "dependent.bar": "bar"}
+    assert plan.solve(cache=cache).__next__() == "bar"
+    assert solved == ["bar"]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        solved.clear()
+        cache = {"dependent.cond": False, "dependent.bar": "bar",
+                 "dependent.qux": "qux"}
+        assert list(plan.solve(cache=cache, executor=executor)) == \
+            ["qux", "bar"]
+        assert sorted(solved) == ["bar", "qux"]
+
+    caches = [{"dependent.cond": True, "dependent.bar": "bar"},
+              {"dependent.cond": False, "dependent.qux": "qux"}]
+    errors_values = plan.solve_batch(caches)
+    assert errors_values[0] == (None, ["bar", "bar"])
+    assert isinstance(errors_values[1][0], DependencyError)
+
+
+def test_plan_release():
+    released = []
+
+    class Watched(str):
+        def __del__(self):
+            released.append(str(self))
+
+    foo = Dependent("foo")
+    foofoo = Dependent("foofoo", lambda v: Watched(v + "foo"),
+                       depends_on=[foo])
+    foofoofoo = Dependent("foofoofoo", fooify, depends_on=[foofoo])
+    barfoofoo = Dependent("barfoofoo", lambda v: "bar" + v,
+                          depends_on=[foofoo])
+    both = Dependent("both", lambda a, b: a + b,
+                     depends_on=[foofoofoo, barfoofoo])
+    # Checks that foofoo was released before it is called
+    released_both = Dependent("released_both",
+                              lambda v: (v, list(released)),
+                              depends_on=[both])
+
+    plan = compile(released_both, release=True)
+    assert plan.solve(cache={foo: "foo"}) == \
+        ("foofoofoobarfoofoo", ["foofoo"])
+
+    plan = compile(both, release=True)
+    cache = {foo: "foo"}
+    assert plan.solve(cache=cache) == "foofoofoobarfoofoo"
+    assert cache == {foo: "foo", both: "foofoofoobarfoofoo"}
+
+    # Pinned and requested values are kept
+    plan = compile([both, foofoofoo], release=True, pin=[foofoo])
+    cache = {foo: "foo"}
+    assert list(plan.solve(cache=cache)) == \
+        ["foofoofoobarfoofoo", "foofoofoo"]
+    assert cache[foofoo] == "foofoo"
+    assert cache[foofoofoo] == "foofoofoo"
+    assert barfoofoo not in cache
+
+    # Releasing works with batches and executors too
+    plan = compile(both, release=True)
+    assert plan.solve_batch([{foo: "a"}, {foo: "b"}]) == \
+        [(None, "afoofoobarafoo"), (None, "bfoofoobarbfoo")]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert plan.solve(cache={foo: "a"}, executor=executor) == \
+            "afoofoobarafoo"
+
+
+def test_plan_trusted():
+    from revscoring.dependencies import set_trusted
+    from revscoring.features.feature import Feature
+
+    foo = Dependent("foo")
+    foofoo = Dependent("foofoo", fooify, depends_on=[foo])
+    # Returns a str even though it claims to return an int
+    lazy_int = Feature("lazy_int", lambda v: v, returns=int,
+                       depends_on=[foofoo])
+
+    plan = compile(lazy_int, trusted=True)
+    assert plan.solve(cache={foo: "1"}) == "1foo"
+    assert foofoo.calls == 0
+
+    # Values are validated at the sampling rate
+    plan = compile(lazy_int, trusted=True, validation_rate=1.0)
+    with raises(DependencyError):
+        plan.solve(cache={foo: "1"})
+
+    plan = compile(lazy_int)
+    with raises(DependencyError):
+        plan.solve(cache={foo: "1"})
+    assert foofoo.calls == 1
+
+    set_trusted(True)
+    try:
+        assert plan.solve(cache={foo: "1"}) == "1foo"
+        assert plan.solve_batch([{foo: "1"}]) == [(None, "1foo")]
+        assert compile(lazy_int, trusted=False).solve_batch(
+            [{foo: "1"}])[0][0] is not None
+    finally:
+        set_trusted(False)
@@ -0,0 +1,52 @@
+import io
+import pickle
+
+from revscoring.dependencies.dependent import Dependent
+from revscoring.dependencies.functions import solve, solve_batch
+from revscoring.dependencies.profiler import Profiler
+
+
+def test_profiler():
+    foo = Dependent("foo", lambda: "foo")
+    bar = Dependent("bar", lambda: "bar")
+    foobar = Dependent("foobar", lambda foo, bar: foo + bar,
+                       depends_on=[foo, bar])
+    foobarbaz = Dependent("foobarbaz", lambda foobar, foo: foobar + "baz",
+                          depends_on=[foobar, foo])
+
+    profiler = Profiler()
+    solve(foobarbaz, profile=profiler)
+    solve(foobarbaz, cache={foo: "foo"}, profile=profiler)
+
+    assert profiler.stats[str(foo)].calls == 1
+    assert profiler.stats[str(foo)].hits == 1
+    assert profiler.stats[str(foobarbaz)].calls == 2
+
+    stats = profiler.stats[str(foobarbaz)]
+    assert stats.inclusive >= stats.exclusive
+    assert stats.inclusive >= profiler.stats[str(foobar)].inclusive
+
+    # foo is attributed to the first dependent that consumes it
+    assert (str(foobarbaz), str(foobar), str(foo)) in profiler.stacks
+    assert (str(foobarbaz), str(foobar), str(bar)) in profiler.stacks
+    assert (str(foobarbaz),) in profiler.stacks
+
+    other_profiler = Profiler()
+    solve_batch([foobar], [{}, {bar: "baz"}], profile=other_profiler)
+    other_profiler.record_batch(2, 0.5)
+    other_profiler.record_request("revisions", 50, None, 0.25)
+    other_profiler = pickle.loads(pickle.dumps(other_profiler))
+
+    profiler.merge(other_profiler)
+    assert profiler.stats[str(foobar)].calls == 4
+    assert profiler.stats[str(bar)].hits == 1
+    assert profiler.batches == [(2, 0.5)]
+    assert profiler.requests == [("revisions", 50, None, 0.25)]
+
+    f = io.StringIO()
+    profiler.write_collapsed_stacks(f)
+    lines = f.getvalue().strip().split("\n")
+    assert len(lines) == len(profiler.stacks)
+    assert any(line.startswith("dependent.foobarbaz;dependent.foobar;")
+               for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
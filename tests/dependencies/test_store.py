@@ -0,0 +1,43 @@
+import pickle
+
+from pytest import raises
+
+from revscoring.dependencies.dependent import Dependent
+from revscoring.dependencies.functions import compile
+from revscoring.dependencies.store import ValueStore, key_id
+
+
+def test_key_id():
+    foo = Dependent("foo")
+    assert key_id(foo) == key_id(Dependent("foo"))
+    assert key_id(foo) == key_id("dependent.foo")
+    assert key_id(foo) != key_id(Dependent("bar"))
+
+
+def test_value_store():
+    foo = Dependent("foo")
+    bar = Dependent("bar", lambda foo: foo + "bar", depends_on=[foo])
+
+    store = ValueStore({"dependent.foo": "foo"})
+    assert foo in store
+    assert bar not in store
+    assert store[foo] == "foo"
+    assert store.get(bar) is None
+    assert len(store) == 1
+    with raises(KeyError):
+        store[bar]
+
+    assert compile(bar).solve(cache=store) == "foobar"
+    assert store[bar] == "foobar"
+    assert store.to_dict() == {foo: "foo", bar: "foobar"}
+
+    del store[bar]
+    assert bar not in store
+
+    store = pickle.loads(pickle.dumps(store))
+    assert store.to_dict() == {foo: "foo"}
+
+    # Stores only hold the ids that have values
+    for i in range(100):
+        key_id(Dependent("baz{0}".format(i)))
+    assert len(store.values) == 1
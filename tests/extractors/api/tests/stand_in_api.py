@@ -0,0 +1,73 @@
+"""
+A local stand-in for the MediaWiki API that serves a small page history.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+USERS = {"Alice": 1, "Bob": 2}
+
+
+def rev_doc(rev_id):
+    return {'revid': rev_id, 'parentid': rev_id - 1,
+            'user': "Alice" if rev_id % 2 else "Bob",
+            'userid': 1 if rev_id % 2 else 2,
+            'timestamp': "2020-01-01T00:00:{0:02d}Z".format(rev_id),
+            'comment': "Edit {0}".format(rev_id), 'size': rev_id * 10}
+
+
+def page_doc(rev_ids):
+    return {'pageid': 1, 'ns': 0, 'title': "Foo",
+            'revisions': [rev_doc(rev_id) for rev_id in rev_ids]}
+
+
+class API(BaseHTTPRequestHandler):
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            API.in_flight += 1
+            API.max_in_flight = max(API.max_in_flight, API.in_flight)
+        time.sleep(0.05)
+        params = {k: v[0] for k, v in
+                  parse_qs(urlparse(self.path).query).items()}
+        API.requests.append(params)
+
+        if params.get('action') == "wbsgetsuggestions":
+            if params['entity'] == "Q1":
+                doc = {'search': [{'id': "P31"}]}
+            elif params['entity'] == "Q2":
+                doc = {'error': {'code': "no-such-entity",
+                                 'info': "Could not find an entity"}}
+            else:
+                doc = {'error': {'code': "unknown_action",
+                                 'info': "Unrecognized value for action"}}
+        elif params.get('list') == "users":
+            doc = {'query': {'users': [
+                {'name': name, 'userid': USERS[name], 'editcount': 10,
+                 'registration': "2019-01-01T00:00:00Z", 'groups': []}
+                for name in params['ususers'].split("|")]}}
+        elif params.get('list') == "usercontribs":
+            doc = {'query': {'usercontribs': [rev_doc(1)]}}
+        elif 'pageids' in params:
+            doc = {'query': {'pages': {"1": page_doc([1])}}}
+        else:
+            rev_ids = [int(rev_id) for rev_id in params['revids'].split("|")
+                       if 0 < int(rev_id) < 100]
+            doc = {'query': {'pages': {"1": page_doc(rev_ids)}}}
+
+        body = json.dumps(doc).encode('utf-8')
+        with self.lock:
+            API.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
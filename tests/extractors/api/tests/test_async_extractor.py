@@ -0,0 +1,127 @@
+import pickle
+
+from pytest import raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.errors import QueryNotSupported, RevisionNotFound
+from revscoring.extractors.api import AsyncExtractor, async_extractor
+from revscoring.extractors.api.batcher import AdaptiveBatcher
+from revscoring.extractors.api.doc_cache import DocCache
+
+from .stand_in_api import API
+
+
+def test_extract(host):
+    extractor = AsyncExtractor(host, user_agent="revscoring tests",
+                               batch_size=2)
+    dependents = [revision_oriented.revision.comment,
+                  revision_oriented.revision.parent.comment,
+                  revision_oriented.revision.user.info.editcount,
+                  revision_oriented.revision.page.creation.id,
+                  revision_oriented.revision.user.last_revision.id]
+
+    error_values = list(extractor.extract([2, 3, 4, 200], dependents))
+    assert error_values[:3] == [(None, ["Edit 2", "Edit 1", 10, 1, 1]),
+                                (None, ["Edit 3", "Edit 2", 10, 1, 1]),
+                                (None, ["Edit 4", "Edit 3", 10, 1, 1])]
+    assert isinstance(error_values[3][0], RevisionNotFound)
+
+    # Parent, user, page creation and last revision docs are requested
+    # concurrently
+    assert API.max_in_flight > 1
+
+    assert list(extractor.extract(2, dependents)) == \
+        ["Edit 2", "Edit 1", 10, 1, 1]
+    extractor.close()
+
+    extractor = pickle.loads(pickle.dumps(extractor))
+    assert list(extractor.extract(3, dependents)) == \
+        ["Edit 3", "Edit 2", 10, 1, 1]
+    extractor.close()
+
+
+def test_doc_cache(host):
+    extractor = AsyncExtractor(host, user_agent="revscoring tests",
+                               doc_cache=DocCache())
+    dependents = [revision_oriented.revision.user.info.editcount,
+                  revision_oriented.revision.page.creation.id]
+
+    assert list(extractor.extract([2, 3], dependents)) == \
+        [(None, [10, 1]), (None, [10, 1])]
+    assert list(extractor.extract([4, 5], dependents)) == \
+        [(None, [10, 1]), (None, [10, 1])]
+    # Only the revisions were requested the second time
+    assert [params.get('list', params.get('prop'))
+            for params in API.requests[-1:]] == ["revisions"]
+    assert len(API.requests) == 4
+    assert extractor.doc_cache.stats()['hits'] == \
+        {'user': 2, 'page_creation': 1}
+    extractor.close()
+
+
+def test_from_config():
+    config = {
+        'extractors': {
+            'enwiki': {
+                'class': "revscoring.extractors.api.AsyncExtractor",
+                'host': "https://en.wikipedia.org",
+                'timeout': 20,
+                'user_agent': "revscoring tests",
+                'pipeline': 3
+            }
+        }
+    }
+
+    extractor = AsyncExtractor.from_config(config, 'enwiki')
+    assert extractor.pipeline == 3
+
+
+def test_reuse_parent_docs(host):
+    extractor = AsyncExtractor(host, user_agent="revscoring tests",
+                               batch_size=2, rev_doc_window=0)
+    dependents = [revision_oriented.revision.comment,
+                  revision_oriented.revision.parent.comment]
+
+    assert list(extractor.extract([3, 4, 5, 6], dependents)) == \
+        [(None, ["Edit {0}".format(rev_id), "Edit {0}".format(rev_id - 1)])
+         for rev_id in [3, 4, 5, 6]]
+    # Only the parents that aren't in the same batch are requested.  The
+    # parent of 5 is only requested if the next batch's lookup of 4 didn't
+    # join the one that is in flight.
+    assert sorted(params['revids'] for params in API.requests) in \
+        (["2", "3|4", "4", "5|6"], ["2", "3|4", "5|6"])
+    extractor.close()
+
+
+def test_batcher(host):
+    extractor = AsyncExtractor(
+        host, user_agent="revscoring tests", batch_size=10,
+        batcher=AdaptiveBatcher(max_size=2), rev_doc_window=0)
+
+    assert list(extractor.extract([2, 3, 4, 5], [
+        revision_oriented.revision.comment,
+        revision_oriented.revision.user.info.editcount])) == \
+        [(None, ["Edit {0}".format(rev_id), 10]) for rev_id in [2, 3, 4, 5]]
+    # Revisions are requested in batches that the batcher chooses and the
+    # lookups go through single flights
+    assert sorted(params['revids'] for params in API.requests
+                  if 'revids' in params) == ["2|3", "4|5"]
+    assert extractor.single_flight_stats()['requests'] == 6
+    extractor.close()
+
+
+def test_property_suggestion_doc(host):
+    extractor = AsyncExtractor(host, user_agent="revscoring tests")
+
+    assert extractor.get_property_suggestion_doc("Q1") == [{'id': "P31"}]
+    # Any other API error is a missing entity
+    assert extractor.get_property_suggestion_doc("Q2") is None
+    with raises(QueryNotSupported):
+        extractor.get_property_suggestion_doc("Q3")
+    extractor.close()
+
+
+def test_requires_aiohttp(monkeypatch):
+    monkeypatch.setattr(async_extractor, "aiohttp", None)
+    with raises(ImportError):
+        AsyncExtractor("http://localhost")
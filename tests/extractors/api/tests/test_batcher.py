@@ -0,0 +1,154 @@
+import asyncio
+import pickle
+import threading
+
+import mwapi
+import mwapi.errors
+from pytest import raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.dependencies import Profiler
+from revscoring.extractors.api import Extractor
+from revscoring.extractors.api.batcher import AdaptiveBatcher
+
+from .stand_in_api import API
+
+
+def test_batches():
+    batcher = AdaptiveBatcher(max_size=3, max_bytes=100)
+
+    assert list(batcher.batches("revisions", range(7))) == \
+        [[0, 1, 2], [3, 4, 5], [6]]
+    sizes = {0: 10, 1: 80, 2: 20, 3: 200, 4: 10}
+    assert list(batcher.batches("revisions", range(5), sizes=sizes)) == \
+        [[0, 1], [2], [3], [4]]
+
+
+def test_latency():
+    batcher = AdaptiveBatcher(max_size=8, target_latency=1.0)
+    batcher._observe("revisions", list(range(8)), 2.0, None)
+    assert batcher.size("revisions") == 4
+    batcher._observe("revisions", list(range(4)), 0.1, None)
+    assert batcher.size("revisions") == 5
+    # Other kinds of requests aren't affected
+    assert batcher.size("users") == 8
+    assert [size for _, size, _, _ in batcher.drain()] == [8, 4]
+    assert batcher.drain() == []
+
+    # Each thread only drains the requests that it made
+    thread = threading.Thread(
+        target=batcher._observe, args=("users", [1, 2], 0.1, None))
+    thread.start()
+    thread.join()
+    batcher._observe("revisions", [1], 0.1, None)
+    assert batcher.drain() == [("revisions", 1, None, 0.1)]
+
+
+def test_timeout():
+    batcher = AdaptiveBatcher(max_size=4)
+    queries = []
+
+    def query(batch):
+        queries.append(batch)
+        if len(batch) > 1:
+            raise mwapi.errors.TimeoutError("Timed out")
+        return batch
+
+    assert list(batcher.request("revisions", range(4), query)) == \
+        [0, 1, 2, 3]
+    # Batches that time out are split in half
+    assert queries == [[0, 1, 2, 3], [0, 1], [0], [1], [2, 3], [2], [3]]
+    assert batcher.size("revisions") < 4
+
+    def slow_query(batch):
+        raise mwapi.errors.TimeoutError("Timed out")
+
+    # A single item that times out can't be split
+    with raises(mwapi.errors.TimeoutError):
+        list(batcher.request("revisions", [1], slow_query))
+
+
+def test_backoff():
+    batcher = AdaptiveBatcher(max_size=4, backoff=0.0, max_retries=2)
+    errors = ["maxlag", "ratelimited"]
+
+    def query(batch):
+        if len(errors) > 0:
+            raise mwapi.errors.APIError(errors.pop(0), "Slow down", None)
+        return batch
+
+    assert list(batcher.request("users", range(4), query)) == [0, 1, 2, 3]
+    assert batcher.size("users") < 4
+
+    def bad_query(batch):
+        raise mwapi.errors.APIError("badvalue", "Bad value", None)
+
+    with raises(mwapi.errors.APIError):
+        list(batcher.request("users", range(4), bad_query))
+
+    batcher = pickle.loads(pickle.dumps(batcher))
+    assert batcher.size("users") == 4
+    assert batcher.backoff == 0.0
+
+
+def test_request_async():
+    batcher = AdaptiveBatcher(max_size=4, backoff=0.0)
+    queries = []
+    errors = ["maxlag"]
+
+    async def query(batch):
+        queries.append(batch)
+        if len(batch) > 2:
+            raise mwapi.errors.TimeoutError("Timed out")
+        elif len(errors) > 0:
+            # mwapi.AsyncSession wraps the errors that the API returns
+            try:
+                raise mwapi.errors.APIError(errors.pop(0), "Slow down", None)
+            except mwapi.errors.APIError as e:
+                raise mwapi.errors.RequestError(str(e)) from e
+        return batch
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(batcher.request_async(
+            "revisions", range(4), query)) == [0, 1, 2, 3]
+        # Timed out batches are split and a maxlag is retried
+        assert queries == [[0, 1, 2, 3], [0, 1], [0, 1], [2, 3]]
+
+        async def bad_query(batch):
+            raise mwapi.errors.RequestError("Failed")
+
+        with raises(mwapi.errors.RequestError):
+            loop.run_until_complete(batcher.request_async(
+                "revisions", [1], bad_query))
+    finally:
+        loop.close()
+    # Requests made from an event loop aren't drained by the caller
+    assert batcher.drain() == []
+
+
+def test_extractor(host):
+    extractor = Extractor(mwapi.Session(host, user_agent="revscoring tests"),
+                          batcher=AdaptiveBatcher(max_bytes=50))
+
+    rev_docs = extractor.get_rev_doc_map([2, 3, 4, 5],
+                                         rvprop={'ids', 'size', 'content'})
+    assert sorted(rev_docs) == [2, 3, 4, 5]
+    # Sizes are requested first and content is requested in batches of no
+    # more than 50 bytes (size = rev_id * 10)
+    assert [params['revids'] for params in API.requests] == \
+        ["2|3|4|5", "2|3", "4", "5"]
+    assert len(extractor.batcher.drain()) == 4
+
+    # Sizes that are already known aren't requested again
+    del API.requests[:]
+    extractor.get_rev_doc_map([6, 7], rvprop={'ids', 'size'})
+    extractor.get_rev_doc_map([2, 3, 6, 7], rvprop={'ids', 'content'})
+    assert [params['revids'] for params in API.requests] == \
+        ["6|7", "2|3", "6", "7"]
+    extractor.batcher.drain()
+
+    profile = Profiler()
+    list(extractor.extract([6, 7], [revision_oriented.revision.comment],
+                           profile=profile))
+    assert profile.requests[0][:3] == ("revisions", 2, None)
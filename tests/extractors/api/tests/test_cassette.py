@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import time
+
+import mwapi
+from pytest import raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.extractors.api import Extractor
+from revscoring.extractors.api.cassette import (RecordingSession,
+                                                ReplaySession,
+                                                RequestNotRecorded)
+
+from .stand_in_api import API
+
+DEPENDENTS = [revision_oriented.revision.comment,
+              revision_oriented.revision.parent.comment,
+              revision_oriented.revision.user.info.editcount]
+
+
+def test_record_and_replay(host, tmp_path):
+    path = str(tmp_path / "enwiki.cassette")
+
+    with RecordingSession(mwapi.Session(host, user_agent="revscoring tests"),
+                          path) as session:
+        extractor = Extractor(session)
+        recorded = list(extractor.extract([2, 3], DEPENDENTS))
+        assert list(extractor.extract(4, DEPENDENTS)) == \
+            ["Edit 4", "Edit 3", 10]
+    assert session.requests == len(API.requests)
+
+    session = ReplaySession(path)
+    extractor = Extractor(session)
+    assert list(extractor.extract([2, 3], DEPENDENTS)) == recorded
+    assert list(extractor.extract(4, DEPENDENTS)) == ["Edit 4", "Edit 3", 10]
+    # Nothing was sent to the API
+    assert session.requests == len(API.requests)
+
+    with raises(RequestNotRecorded):
+        session.get(action='query', prop='revisions', revids=[5])
+
+
+def test_latency(host, tmp_path):
+    path = str(tmp_path / "enwiki.cassette")
+    with RecordingSession(mwapi.Session(host, user_agent="revscoring tests"),
+                          path) as session:
+        session.get(action='query', prop='revisions', revids=[2],
+                    rvprop={'ids', 'comment'})
+
+    session = ReplaySession(path, latency=0.1)
+    start = time.perf_counter()
+    doc = session.get(action='query', prop='revisions', revids=[2],
+                      rvprop={'comment', 'ids'})
+    assert time.perf_counter() - start >= 0.1
+    assert doc['query']['pages']
+
+
+def test_from_config(host, tmp_path):
+    path = str(tmp_path / "enwiki.cassette")
+    config = {
+        'extractors': {
+            'enwiki': {
+                'class': "revscoring.extractors.api.Extractor",
+                'host': host,
+                'user_agent': "revscoring tests",
+                'cassette': {'path': path, 'mode': "record"}
+            }
+        }
+    }
+    extractor = Extractor.from_config(config, 'enwiki')
+    assert isinstance(extractor.session, RecordingSession)
+    list(extractor.extract(2, DEPENDENTS))
+    extractor.session.close()
+
+    config['extractors']['enwiki']['cassette']['mode'] = "replay"
+    extractor = Extractor.from_config(config, 'enwiki')
+    assert isinstance(extractor.session, ReplaySession)
+    assert list(extractor.extract(2, DEPENDENTS)) == ["Edit 2", "Edit 1", 10]
+
+
+RECORD_OR_REPLAY = """
+import sys
+import mwapi
+from revscoring.datasources import revision_oriented
+from revscoring.extractors.api import Extractor
+from revscoring.extractors.api.cassette import RecordingSession, ReplaySession
+
+mode, path, host = sys.argv[1:]
+if mode == "record":
+    session = RecordingSession(
+        mwapi.Session(host, user_agent="revscoring tests"), path)
+else:
+    session = ReplaySession(path)
+extractor = Extractor(session)
+print(list(extractor.extract(
+    [2, 3, 4, 5], [revision_oriented.revision.user.info.editcount])))
+if mode == "record":
+    session.close()
+"""
+
+
+def test_hash_order(host, tmp_path):
+    path = str(tmp_path / "enwiki.cassette")
+
+    def run(mode, seed):
+        env = dict(os.environ, PYTHONHASHSEED=str(seed))
+        return subprocess.run(
+            [sys.executable, "-c", RECORD_OR_REPLAY, mode, path, host],
+            env=env, check=True, stdout=subprocess.PIPE).stdout
+
+    recorded = run("record", 1)
+    # Sets of user names are iterated in a different order with each seed
+    for seed in [2, 3, 4, 5]:
+        assert run("replay", seed) == recorded
@@ -0,0 +1,48 @@
+import pickle
+import time
+
+from revscoring.dependencies.store import MISSING
+from revscoring.extractors.api.doc_cache import NOT_FOUND, DocCache
+
+
+def test_doc_cache():
+    doc_cache = DocCache(max_size=2, ttl=0.1, negative_ttl=0.05)
+    assert doc_cache.get('user', "Alice") is MISSING
+    doc_cache.set('user', "Alice", {'name': "Alice"})
+    doc_cache.set('user', "Bob", NOT_FOUND)
+    assert doc_cache.get('user', "Alice") == {'name': "Alice"}
+    assert doc_cache.get('user', "Bob") is NOT_FOUND
+    # Kinds don't collide
+    assert doc_cache.get('page_creation', "Alice") is MISSING
+
+    # Failed lookups expire first
+    time.sleep(0.06)
+    assert doc_cache.get('user', "Bob") is MISSING
+    assert doc_cache.get('user', "Alice") == {'name': "Alice"}
+    time.sleep(0.05)
+    assert doc_cache.get('user', "Alice") is MISSING
+
+    stats = doc_cache.stats()
+    assert stats['hits'] == {'user': 3}
+    assert stats['misses'] == {'user': 3, 'page_creation': 1}
+    assert stats['hit_rate'] == 3 / 7
+
+    # Least recently used documents are evicted
+    doc_cache.set('user', "Alice", {'name': "Alice"})
+    doc_cache.set('user', "Bob", {'name': "Bob"})
+    doc_cache.get('user', "Alice")
+    doc_cache.set('user', "Carol", {'name': "Carol"})
+    assert len(doc_cache) == 2
+    assert doc_cache.evictions == 1
+    assert doc_cache.get('user', "Bob") is MISSING
+
+    doc_cache = pickle.loads(pickle.dumps(doc_cache))
+    assert len(doc_cache) == 0
+    assert doc_cache.max_size == 2
+    assert pickle.loads(pickle.dumps(NOT_FOUND)) is NOT_FOUND
+
+
+def test_disabled():
+    doc_cache = DocCache(max_size=0)
+    doc_cache.set('user', "Alice", {'name': "Alice"})
+    assert doc_cache.get('user', "Alice") is MISSING
@@ -1,5 +1,13 @@
+import mwapi
+import mwapi.errors
+from pytest import raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.errors import CaughtDependencyError, PageNotFound
 from revscoring.extractors.api.extractor import Extractor
 
+from .stand_in_api import API
+
 
 def test_from_config():
     config = {
@@ -8,9 +16,116 @@ def test_from_config():
                 'host': "https://en.wikipedia.org",
                 'api_path': "/w/api.php",
                 'timeout': 20,
-                'user_agent': "revscoring tests"
+                'user_agent': "revscoring tests",
+                'coalesce_window': 0.01,
+                'doc_cache': {'max_size': 100, 'ttl': 60}
             }
         }
     }
 
-    Extractor.from_config(config, 'enwiki')  # Doesn't error
+    extractor = Extractor.from_config(config, 'enwiki')
+    assert extractor.coalesce_window == 0.01
+    assert extractor.doc_cache.max_size == 100
+
+
+def test_extract_many(host):
+    extractor = Extractor(mwapi.Session(host, user_agent="revscoring tests"))
+    dependents = [revision_oriented.revision.comment,
+                  revision_oriented.revision.page.creation.id,
+                  revision_oriented.revision.user.last_revision.id]
+
+    assert list(extractor.extract([2, 3, 4, 5], dependents)) == \
+        [(None, ["Edit {0}".format(rev_id), 1, 1]) for rev_id in [2, 3, 4, 5]]
+
+    # Page creation is requested once for the page and last revisions are
+    # requested once per revision -- all before solving.
+    assert sum('pageids' in params for params in API.requests) == 1
+    assert sum(params.get('list') == "usercontribs"
+               for params in API.requests) == 4
+    assert API.max_in_flight > 1
+
+
+def test_minimal_props(host):
+    extractor = Extractor(mwapi.Session(host, user_agent="revscoring tests"))
+    dependents = [revision_oriented.revision.comment,
+                  revision_oriented.revision.parent.id]
+
+    list(extractor.extract([2, 3], dependents))
+
+    # Only the props that the dependents read are requested
+    rvprops = [set(params['rvprop'].split("|"))
+               for params in API.requests if 'rvprop' in params]
+    assert rvprops[0] == {'ids', 'comment'}
+    assert all('content' not in rvprop and 'user' not in rvprop
+               for rvprop in rvprops)
+
+
+def test_reuse_parent_docs(host):
+    extractor = Extractor(mwapi.Session(host, user_agent="revscoring tests"))
+    dependents = [revision_oriented.revision.text,
+                  revision_oriented.revision.parent.text]
+
+    list(extractor.extract([2, 3, 4], dependents))
+    # 2 and 3 are the parents of 3 and 4, so only 1 is requested
+    assert [params['revids'] for params in API.requests
+            if 'revids' in params and 'content' in params['rvprop']][-1] == \
+        "1"
+
+    # 4 is still in the window when 5 is extracted
+    API.requests.clear()
+    list(extractor.extract([5], dependents))
+    assert [params['revids'] for params in API.requests] == ["5"]
+
+
+class FlakySession:
+    """
+    Fails user contribution lookups and finds no page creations.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, **params):
+        if params.get('list') == "usercontribs":
+            raise mwapi.errors.APIError("internal_api_error", "Oops", None)
+        doc = self.session.get(**params)
+        if 'pageids' in params:
+            for page_doc in doc['query']['pages'].values():
+                page_doc.pop('revisions', None)
+        return doc
+
+
+def test_prefetch_errors(host):
+    extractor = Extractor(FlakySession(
+        mwapi.Session(host, user_agent="revscoring tests")))
+
+    # Failed lookups are reported per revision
+    error_values = list(extractor.extract(
+        [2, 3], [revision_oriented.revision.user.last_revision.id]))
+    assert [type(e) for e, _ in error_values] == [CaughtDependencyError] * 2
+
+    # Missing pages aren't looked up again when solving
+    error_values = list(extractor.extract(
+        [2, 3], [revision_oriented.revision.page.creation.id]))
+    assert [type(e) for e, _ in error_values] == [PageNotFound] * 2
+    assert sum('pageids' in params for params in API.requests) == 1
+
+
+def test_batch_errors(host):
+    extractor = Extractor(mwapi.Session(host, user_agent="revscoring tests"))
+    dependents = [revision_oriented.revision.comment]
+
+    def fail_lookup(*args, **kwargs):
+        raise mwapi.errors.TimeoutError("Too slow")
+    extractor.solve_batch = fail_lookup
+    # A failed lookup is reported for every revision in the batch
+    error_values = list(extractor.extract([2, 3], dependents))
+    assert [type(e) for e, _ in error_values] == \
+        [mwapi.errors.TimeoutError] * 2
+
+    def fail_bug(*args, **kwargs):
+        raise KeyError("bug")
+    extractor.solve_batch = fail_bug
+    # Anything else is a bug and propagates
+    with raises(KeyError):
+        list(extractor.extract([2, 3], dependents))
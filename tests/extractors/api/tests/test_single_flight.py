@@ -0,0 +1,129 @@
+import asyncio
+import pickle
+import threading
+import time
+
+from pytest import raises
+
+from revscoring.extractors.api.single_flight import (AsyncSingleFlight,
+                                                     SingleFlight)
+
+
+class Query:
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, keys):
+        self.queries.append(sorted(keys))
+        time.sleep(0.05)
+        if "error" in keys:
+            raise RuntimeError("Failed")
+        return {key: key.upper() for key in keys if key != "missing"}
+
+
+def get_concurrently(single_flight, key_sets):
+    results = [None] * len(key_sets)
+
+    def get_many(i, keys):
+        results[i] = single_flight.get_many(keys)
+
+    threads = [threading.Thread(target=get_many, args=(i, keys))
+               for i, keys in enumerate(key_sets)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight():
+    query = Query()
+    single_flight = SingleFlight(query)
+
+    results = get_concurrently(
+        single_flight, [["foo", "bar"], ["foo"], ["foo", "baz", "missing"]])
+    assert results == [{'foo': "FOO", 'bar': "BAR"}, {'foo': "FOO"},
+                       {'foo': "FOO", 'baz': "BAZ"}]
+    # "foo" was only looked up once
+    assert sorted(key for keys in query.queries for key in keys) == \
+        ["bar", "baz", "foo", "missing"]
+    assert single_flight.stats() == \
+        {'requests': 6, 'coalesced': 2, 'queries': 2}
+
+    # Nothing is remembered once a query is done
+    assert single_flight.get_many(["foo"]) == {'foo': "FOO"}
+    assert len(query.queries) == 3
+
+
+def test_window():
+    query = Query()
+    single_flight = SingleFlight(query, window=0.05)
+
+    results = get_concurrently(single_flight, [["foo"], ["bar"], ["baz"]])
+    assert results == [{'foo': "FOO"}, {'bar': "BAR"}, {'baz': "BAZ"}]
+    assert query.queries == [["bar", "baz", "foo"]]
+
+    single_flight = pickle.loads(pickle.dumps(single_flight))
+    assert single_flight.window == 0.05
+    assert single_flight.get_many(["foo"]) == {'foo': "FOO"}
+
+
+def test_error():
+    single_flight = SingleFlight(Query())
+
+    results = []
+
+    def get_many(keys):
+        try:
+            single_flight.get_many(keys)
+        except RuntimeError as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=get_many, args=(["error", "foo"],)),
+               threading.Thread(target=get_many, args=(["foo"],))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    # The second thread waited on the first thread's failed query
+    assert len(results) == 2
+
+    with raises(RuntimeError):
+        single_flight.get_many(["error"])
+    assert single_flight.get_many(["foo"]) == {'foo': "FOO"}
+
+
+def test_async_single_flight():
+    queries = []
+
+    async def query(keys):
+        queries.append(sorted(keys))
+        await asyncio.sleep(0.05)
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    async def get_concurrently(single_flight, key_sets):
+        return await asyncio.gather(*(single_flight.get_many(keys)
+                                      for keys in key_sets))
+
+    loop = asyncio.new_event_loop()
+    try:
+        single_flight = AsyncSingleFlight(query)
+        results = loop.run_until_complete(get_concurrently(
+            single_flight, [["foo", "bar"], ["foo"], ["baz", "missing"]]))
+        assert results == [{'foo': "FOO", 'bar': "BAR"}, {'foo': "FOO"},
+                           {'baz': "BAZ"}]
+        assert queries == [["bar", "foo"], ["baz", "missing"]]
+        assert single_flight.stats() == \
+            {'requests': 5, 'coalesced': 1, 'queries': 2}
+
+        # Keys from concurrent lookups are merged within the window
+        del queries[:]
+        single_flight = AsyncSingleFlight(query, window=0.01)
+        loop.run_until_complete(get_concurrently(
+            single_flight, [["foo"], ["bar"]]))
+        assert queries == [["bar", "foo"]]
+    finally:
+        loop.close()
@@ -0,0 +1,112 @@
+import bz2
+import io
+import json
+
+from pytest import fixture, raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.errors import RevisionNotFound
+from revscoring.extractors.dump import EntityExtractor
+from revscoring.extractors.dump.entity_extractor import _read_lines_at
+from revscoring.features import wikibase
+
+
+def entity(qid, rev_id, labels, properties):
+    return {
+        'type': "item", 'id': qid, 'pageid': rev_id * 10, 'ns': 0,
+        'title': qid, 'lastrevid': rev_id,
+        'modified': "2020-01-01T00:00:00Z",
+        'labels': {lang: {'language': lang, 'value': value}
+                   for lang, value in labels.items()},
+        'descriptions': {}, 'aliases': {}, 'sitelinks': {},
+        'claims': {pid: [{
+            'mainsnak': {'snaktype': "value", 'property': pid,
+                         'datavalue': {'value': "foo", 'type': "string"},
+                         'datatype': "string"},
+            'type': "statement", 'id': qid + "$" + pid, 'rank': "normal"
+        }] for pid in properties}
+    }
+
+
+@fixture
+def paths(tmp_path):
+    entities = [entity("Q1", 1, {'en': "Universe"}, ["P31"]),
+                entity("Q2", 2, {'en': "Earth", 'de': "Erde"}, []),
+                entity("Q3", 3, {}, ["P31", "P279"])]
+    lines = ["["] + [json.dumps(e) + "," for e in entities[:-1]] + \
+            [json.dumps(entities[-1]), "]"]
+    path = tmp_path / "latest-all.json.bz2"
+    path.write_bytes(bz2.compress("\n".join(lines).encode('utf-8')))
+    return [str(path)]
+
+
+def test_extract(paths):
+    extractor = EntityExtractor(paths, processes=1, batch_size=2)
+    dependents = [revision_oriented.revision.page.title,
+                  wikibase.revision.labels,
+                  wikibase.revision.properties]
+
+    error_values = list(extractor.extract([3, 1, 100], dependents))
+    assert error_values[:2] == [(None, ["Q3", 0, 2]), (None, ["Q1", 1, 1])]
+    assert isinstance(error_values[2][0], RevisionNotFound)
+
+    assert extractor.extract(2, wikibase.revision.labels) == 2
+
+    with raises(RevisionNotFound):
+        extractor.extract(2, wikibase.revision.parent.labels)
+
+
+def test_extract_all(paths):
+    extractor = EntityExtractor(paths, processes=2, batch_size=1)
+
+    assert list(extractor.extract_all(wikibase.revision.properties)) == \
+        [(1, None, 1), (2, None, 0), (3, None, 2)]
+
+
+def test_extract_corrupt(tmp_path):
+    lines = ["[",
+             json.dumps(entity("Q1", 1, {}, ["P31"])) + ",",
+             json.dumps(entity("Q2", 2, {}, []))[:100] + ",",
+             "{not json,",
+             json.dumps(entity("Q3", 3, {}, ["P31", "P279"])),
+             "]"]
+    path = tmp_path / "latest-all.json"
+    path.write_text("\n".join(lines))
+    extractor = EntityExtractor([str(path)], processes=1, batch_size=10)
+
+    extractions = list(extractor.extract_all(wikibase.revision.properties))
+    assert [(rev_id, values) for rev_id, _, values in extractions] == \
+        [(1, 1), (2, None), (None, None), (3, 2)]
+    assert isinstance(extractions[1][1], ValueError)
+    assert isinstance(extractions[2][1], ValueError)
+
+    error_values = list(extractor.extract([3, 2], wikibase.revision.properties))
+    assert error_values[0] == (None, 2)
+    assert isinstance(error_values[1][0], ValueError)
+
+
+def test_located_entities(paths):
+    extractor = EntityExtractor(paths, processes=1)
+    assert extractor.extract(3, wikibase.revision.properties) == 2
+
+    # Entities are read at their offsets without parsing the others
+    file_number, offset = extractor._rev_index.get(2)
+    assert (file_number, offset) == (0, len(json.dumps(
+        entity("Q1", 1, {'en': "Universe"}, ["P31"])).encode()) + 4)
+    chunks = list(extractor._read_located_chunks({2: (file_number, offset)}))
+    assert len(chunks) == 1 and len(chunks[0]) == 1
+    assert json.loads(chunks[0][0].strip().rstrip(","))['id'] == "Q2"
+
+
+class Unseekable(io.BytesIO):
+
+    def seekable(self):
+        return False
+
+
+def test_read_lines_at():
+    data = b"a\nbb\nccc\n"
+    assert list(_read_lines_at(io.BytesIO(data), [2, 5])) == \
+        ["bb\n", "ccc\n"]
+    assert list(_read_lines_at(Unseekable(data), [2, 5])) == \
+        ["bb\n", "ccc\n"]
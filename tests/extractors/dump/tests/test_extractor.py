@@ -0,0 +1,168 @@
+import bz2
+import pickle
+
+from pytest import fixture, raises
+
+from revscoring.datasources import revision_oriented
+from revscoring.errors import QueryNotSupported, RevisionNotFound
+from revscoring.extractors.dump import Extractor
+
+HEADER = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/"
+           version="0.10" xml:lang="en">
+  <siteinfo>
+    <sitename>Wikipedia</sitename>
+    <dbname>enwiki</dbname>
+    <base>https://en.wikipedia.org/wiki/Main_Page</base>
+    <generator>MediaWiki 1.35.0</generator>
+    <case>first-letter</case>
+    <namespaces>
+      <namespace key="0" case="first-letter" />
+      <namespace key="1" case="first-letter">Talk</namespace>
+    </namespaces>
+  </siteinfo>
+"""
+
+PAGE = """  <page>
+    <title>{title}</title>
+    <ns>{ns}</ns>
+    <id>{page_id}</id>
+{revisions}
+  </page>
+"""
+
+REVISION = """    <revision>
+      <id>{rev_id}</id>
+      {parent}
+      <timestamp>2020-01-0{rev_id}T00:00:00Z</timestamp>
+      <contributor>
+        <username>Foo</username>
+        <id>10</id>
+      </contributor>
+      <comment>Edit {rev_id}</comment>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text bytes="{bytes}" xml:space="preserve">{text}</text>
+      <sha1>abc</sha1>
+    </revision>"""
+
+
+def format_page(title, ns, page_id, rev_ids):
+    revisions = []
+    parent_id = None
+    for rev_id in rev_ids:
+        text = "Text {0}".format(rev_id)
+        revisions.append(REVISION.format(
+            rev_id=rev_id, bytes=len(text), text=text,
+            parent="" if parent_id is None else
+                   "<parentid>{0}</parentid>".format(parent_id)))
+        parent_id = rev_id
+    return PAGE.format(title=title, ns=ns, page_id=page_id,
+                       revisions="\n".join(revisions))
+
+
+@fixture
+def paths(tmp_path):
+    first = tmp_path / "dump-1.xml"
+    first.write_text(HEADER + format_page("Foo", 0, 1, [1, 2, 3]) +
+                     format_page("Talk:Bar", 1, 2, [4, 5]) + "</mediawiki>")
+    second = tmp_path / "dump-2.xml.bz2"
+    second.write_bytes(bz2.compress(
+        (HEADER + format_page("Baz", 0, 3, [6, 7]) + "</mediawiki>")
+        .encode('utf-8')))
+    return [str(first), str(second)]
+
+
+def test_extract(paths):
+    extractor = Extractor(paths[:1], batch_size=2)
+    dependents = [revision_oriented.revision.comment,
+                  revision_oriented.revision.text,
+                  revision_oriented.revision.parent.id,
+                  revision_oriented.revision.parent.text,
+                  revision_oriented.revision.page.title,
+                  revision_oriented.revision.page.namespace.name,
+                  revision_oriented.revision.page.creation.id]
+
+    error_values = list(extractor.extract([5, 1, 2, 100], dependents))
+    assert error_values[:3] == [
+        (None, ["Edit 5", "Text 5", 4, "Text 4", "Bar", "Talk", 4]),
+        (None, ["Edit 1", "Text 1", 0, None, "Foo", "", 1]),
+        (None, ["Edit 2", "Text 2", 1, "Text 1", "Foo", "", 1])
+    ]
+    assert isinstance(error_values[3][0], RevisionNotFound)
+
+    assert extractor.extract(3, revision_oriented.revision.parent.comment) \
+        == "Edit 2"
+
+    with raises(RevisionNotFound):
+        extractor.extract(100, dependents)
+
+    # rev_ids that aren't in the dumps fail without scanning them
+    assert list(extractor._rev_index.rev_ids) == [1, 2, 3, 4, 5]
+    scanned = []
+    extractor._extract_paths = lambda *args: scanned.append(args)
+    with raises(RevisionNotFound):
+        extractor.extract(100, dependents)
+    assert scanned == []
+    del extractor._extract_paths
+
+    with raises(QueryNotSupported):
+        extractor.extract(3, revision_oriented.revision.user.info.editcount)
+
+
+def test_rev_index(paths):
+    extractor = Extractor(paths, processes=2)
+    assert extractor.extract(6, revision_oriented.revision.comment) == \
+        "Edit 6"
+    assert extractor._rev_index.get(2) == (0, -1)
+    assert extractor._rev_index.get(6) == (1, -1)
+    assert extractor._rev_index.get(8) is None
+
+    # Only the files that hold the requested revisions are read
+    extractor = pickle.loads(pickle.dumps(extractor))
+    assert len(extractor._rev_index) == 7
+    scanned = []
+    extract_paths = extractor._extract_paths
+
+    def record_paths(paths, *args):
+        scanned.append(paths)
+        return extract_paths(paths, *args)
+
+    extractor._extract_paths = record_paths
+    assert extractor.extract(7, revision_oriented.revision.comment) == \
+        "Edit 7"
+    assert scanned == [paths[1:]]
+
+
+def test_extract_all(paths):
+    extractor = Extractor(paths, processes=2)
+
+    extractions = extractor.extract_all(
+        [revision_oriented.revision.comment,
+         revision_oriented.revision.parent.text])
+    assert sorted(extractions) == [
+        (1, None, ["Edit 1", None]),
+        (2, None, ["Edit 2", "Text 1"]),
+        (3, None, ["Edit 3", "Text 2"]),
+        (4, None, ["Edit 4", None]),
+        (5, None, ["Edit 5", "Text 4"]),
+        (6, None, ["Edit 6", None]),
+        (7, None, ["Edit 7", "Text 6"])
+    ]
+
+
+def test_from_config():
+    config = {
+        'extractors': {
+            'enwiki_dumps': {
+                'class': "revscoring.extractors.dump.Extractor",
+                'paths': ["enwiki-pages-meta-history1.xml.bz2"],
+                'processes': 4,
+                'persistent_cache': {'memory_size': 1000}
+            }
+        }
+    }
+
+    extractor = Extractor.from_config(config, 'enwiki_dumps')
+    assert extractor.processes == 4
+    assert extractor.paths == ["enwiki-pages-meta-history1.xml.bz2"]
+    assert extractor.persistent_cache.memory_size == 1000
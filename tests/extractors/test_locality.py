@@ -0,0 +1,45 @@
+from revscoring.datasources import revision_oriented
+from revscoring.extractors.locality import (cached_page, cached_parent_id,
+                                            reorder, restore_order)
+
+
+def test_reorder():
+    # rev_id --> page
+    pages = {1: "A", 2: "B", 3: "A", 4: "C", 5: "B", 6: "A"}
+
+    positioned = list(reorder([6, 2, 4, 3, 5, 1], 6, page=pages.get))
+    assert [rev_id for _, rev_id in positioned] == [1, 3, 6, 2, 5, 4]
+    assert sorted(positioned) == list(enumerate([6, 2, 4, 3, 5, 1]))
+
+    # Revisions aren't moved between windows
+    positioned = list(reorder([6, 2, 4, 3, 5, 1], 3, page=pages.get))
+    assert [rev_id for _, rev_id in positioned] == [6, 2, 4, 1, 3, 5]
+
+    # Without pages, items stay in order
+    assert [rev_id for _, rev_id in reorder([3, 1, 2], 3)] == [3, 1, 2]
+
+
+def test_reorder_parents():
+    observations = [{'rev_id': 12, 'parent_id': 11},
+                    {'rev_id': 20, 'parent_id': 19},
+                    {'rev_id': 13, 'parent_id': 12},
+                    {'rev_id': 11, 'parent_id': 10}]
+
+    positioned = reorder(observations, 10,
+                         rev_id=lambda ob: ob['rev_id'],
+                         parent=lambda ob: ob['parent_id'])
+    assert [ob['rev_id'] for _, ob in positioned] == [11, 12, 13, 20]
+
+
+def test_restore_order():
+    assert list(restore_order([(2, "c"), (0, "a"), (1, "b"), (3, "d")])) == \
+        ["a", "b", "c", "d"]
+
+
+def test_cached():
+    cache = {str(revision_oriented.revision.page.title): "Foo",
+             str(revision_oriented.revision.parent.id): 10}
+    assert cached_page(cache) == "Foo"
+    assert cached_parent_id(cache) == 10
+    assert cached_page(None) is None
+    assert cached_parent_id({}) is None
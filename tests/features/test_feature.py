@@ -21,6 +21,9 @@ def return_true():
 true = Feature("true", return_true, returns=bool, depends_on=[])
 
 
+unsolvable = Feature("unsolvable", returns=bool)
+
+
 def identity_process(value):
     return value
 
@@ -152,6 +155,10 @@ def test_and():
     true_and_not_true = true.and_(not_(true))
     check_feature(true_and_not_true, False)
 
+    # The right side is never solved
+    not_true_and_unsolvable = not_(true).and_(unsolvable)
+    check_feature(not_true_and_unsolvable, False)
+
 
 def test_or():
     true_or_true = true.or_(true)
@@ -160,6 +167,10 @@ def test_or():
     true_or_not_true = true.or_(not_(true))
     check_feature(true_or_not_true, True)
 
+    # The right side is never solved
+    true_or_unsolvable = true.or_(unsolvable)
+    check_feature(true_or_unsolvable, True)
+
 
 def test_not():
     not_true = not_(true)
@@ -175,3 +186,15 @@ def test_complex():
 
     grouped_five_plus_five_times_two_is_twenty = (five + five) * 2 == 20
     check_feature(grouped_five_plus_five_times_two_is_twenty, True)
+
+
+def test_call_batch():
+    assert int_identity.call_batch([(1,), (2.0,)]) == [1, 2]
+
+    int_batch_identity = Feature(
+        "int_batch_identity", identity_process, returns=int,
+        depends_on=["value"],
+        process_batch=lambda args_list: [value for value, in args_list])
+    values = int_batch_identity.call_batch([(1,), (2.0,)])
+    assert values == [1, 2]
+    assert isinstance(values[1], int)
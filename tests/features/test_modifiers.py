@@ -1,8 +1,12 @@
 import pickle
 from math import log as math_log
 
+from pytest import raises
+
 from revscoring.dependencies import solve
+from revscoring.errors import DependencyError
 from revscoring.features import modifiers
+from revscoring.features.feature import Feature
 
 
 def test_log():
@@ -35,3 +39,19 @@ def test_min():
     assert pickle.loads(pickle.dumps(min_five_six_seven)) == min_five_six_seven
 
     assert repr(min_five_six_seven) == "<feature.min(5, 6, 7)>"
+
+
+def test_if():
+    unsolvable = Feature("unsolvable", returns=int)
+    five_if_true = modifiers.if_(True, 5, unsolvable)
+
+    assert solve(five_if_true) == 5
+    assert solve(pickle.loads(pickle.dumps(five_if_true))) == 5
+    assert repr(five_if_true) == \
+        "<feature.(5 if True else unsolvable)>"
+
+    five_unless_false = modifiers.if_(False, unsolvable, 5)
+    assert solve(five_unless_false) == 5
+
+    with raises(DependencyError):
+        solve(modifiers.if_(True, unsolvable, 5))
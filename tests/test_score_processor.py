@@ -1,8 +1,13 @@
-from revscoring import Model
-from revscoring.extractors import OfflineExtractor
+import mwapi
+
+from revscoring import Feature, Model
+from revscoring.datasources import revision_oriented
+from revscoring.extractors import OfflineExtractor, api
 from revscoring.features import Constant
 from revscoring.score_processor import ScoreProcessor
 
+from .extractors.api.tests.stand_in_api import API
+
 
 class FakeModel(Model):
 
@@ -19,3 +24,73 @@ def test_score_processor():
 
     for score in scores:
         assert score
+
+
+def test_score_processor_locality():
+
+    model = FakeModel([Constant(False)])
+
+    sp = ScoreProcessor(model, OfflineExtractor(), batch_size=2,
+                        locality_window=4)
+    caches = {rev_id: {revision_oriented.revision.page.id: page_id}
+              for rev_id, page_id in [(1, 1), (2, 2), (3, 1), (4, 2)]}
+    scores = list(sp.score([1, 2, 3, 4], caches=caches))
+
+    assert [rev_id for rev_id, _ in scores] == [1, 2, 3, 4]
+
+
+def test_score_processor_locality_uncached(caplog):
+
+    model = FakeModel([Constant(False)])
+
+    sp = ScoreProcessor(model, OfflineExtractor(), locality_window=4)
+    scores = list(sp.score([1, 2, 3]))
+
+    assert [rev_id for rev_id, _ in scores] == [1, 2, 3]
+    # The extractor can't look up page ids, so the user is told
+    assert "locality window has no effect" in caplog.text
+
+
+class CommentLengthModel(Model):
+
+    def score(self, feature_values):
+        return feature_values[0]
+
+
+def test_score_processor_api(host):
+    model = CommentLengthModel(
+        [Feature("comment_length", len, returns=int,
+                 depends_on=[revision_oriented.revision.comment])])
+    extractor = api.Extractor(
+        mwapi.Session(host, user_agent="revscoring tests"))
+
+    sp = ScoreProcessor(model, extractor, cpu_workers=2)
+    # Root datasources are extracted in the main process
+    assert sp.root_datasources == [revision_oriented.revision.comment]
+
+    scores = list(sp.score([2, 3, 4, 5, 200]))
+    assert scores[:4] == [(rev_id, len("Edit {0}".format(rev_id)))
+                          for rev_id in [2, 3, 4, 5]]
+    assert scores[4][1]['type'] == "RevisionNotFound"
+
+
+def test_score_processor_locality_api(host):
+    model = CommentLengthModel(
+        [Feature("comment_length", len, returns=int,
+                 depends_on=[revision_oriented.revision.comment])])
+    extractor = api.Extractor(
+        mwapi.Session(host, user_agent="revscoring tests"))
+
+    sp = ScoreProcessor(model, extractor, cpu_workers=2, batch_size=2,
+                        locality_window=4)
+    scores = list(sp.score([5, 2, 4, 3]))
+    assert scores == [(rev_id, len("Edit {0}".format(rev_id)))
+                      for rev_id in [5, 2, 4, 3]]
+
+    # Page ids are looked up in one request before extracting
+    assert API.requests[0]['rvprop'] == "ids"
+    assert sorted(API.requests[0]['revids'].split("|")) == \
+        ["2", "3", "4", "5"]
+    # Revisions of the page are extracted in order
+    assert [params['revids'] for params in API.requests[1:]
+            if 'revids' in params][:1] == ["2|3"]
@@ -0,0 +1,14 @@
+import io
+
+from revscoring.features import wikitext
+from revscoring.utilities.benchmark_trusted import get_features, run
+
+
+def test_run():
+    features = get_features(wikitext.revision)
+    assert wikitext.revision.chars in features
+
+    output = io.StringIO()
+    normal, trusted = run(features, 2, 1, output)
+    assert normal > 0 and trusted > 0
+    assert "trusted" in output.getvalue()